@@ -30,6 +30,8 @@ Script which installs packages on ARGO mon boxes.
 %install
 %{py3_install "--record=INSTALLED_FILES" }
 install --directory %{buildroot}/%{_localstatedir}/log/argo-poem-tools/
+install --directory %{buildroot}/%{_localstatedir}/cache/argo-poem-tools/
+install --directory %{buildroot}/%{_localstatedir}/lib/argo-poem-tools/
 
 
 %clean
@@ -43,3 +45,5 @@ rm -rf $RPM_BUILD_ROOT
 %{python3_sitelib}/%{underscore %{name}}/*.py
 
 %attr(0755,root,root) %dir %{_localstatedir}/log/argo-poem-tools/
+%attr(0750,root,root) %dir %{_localstatedir}/cache/argo-poem-tools/
+%attr(0700,root,root) %dir %{_localstatedir}/lib/argo-poem-tools/
@@ -2,16 +2,22 @@
 import argparse
 import logging
 import logging.handlers
+import os
 import subprocess
 import sys
 
 import requests
+from argo_poem_tools.cache import ResponseCache
 from argo_poem_tools.config import Config
 from argo_poem_tools.exceptions import ConfigException, PackageException, \
     POEMException, MergingException
+from argo_poem_tools.fingerprint import Fingerprint
 from argo_poem_tools.packages import Packages
-from argo_poem_tools.poem import POEM, merge_tenants_data
-from argo_poem_tools.repos import YUMRepos
+from argo_poem_tools.poem import POEM, fetch_tenants_data, \
+    merge_tenants_data
+from argo_poem_tools.repos import YUMRepos, get_repo_ids, \
+    restore_backup
+from argo_poem_tools.sessions import HTTPSessions
 
 LOGFILE = "/var/log/argo-poem-tools/argo-poem-tools.log"
 
@@ -26,6 +32,20 @@ def main():
         '--backup-repos', action='store_true', dest='backup',
         help='backup/restore yum repos instead overriding them'
     )
+    parser.add_argument(
+        '--force', action='store_true', dest='force',
+        help='run even if nothing has changed since the last successful run'
+    )
+    parser.add_argument(
+        '--clean-all', action='store_true', dest='clean_all',
+        help='clean whole YUM cache, instead of expiring metadata of changed '
+             'repos only'
+    )
+    parser.add_argument(
+        '--os', dest='os_name',
+        help='distro name used when fetching data from POEM (e.g. rocky9); '
+             'by default it is determined from /etc/os-release'
+    )
     args = parser.parse_args()
     noop = args.noop
     backup_repos = args.backup
@@ -56,50 +76,133 @@ def main():
     logger.addHandler(logfile)
 
     try:
-        subprocess.call(['yum', 'clean', 'all'])
-
         config = Config()
+        general = config.get_general()
         tenants_configurations = config.get_configuration()
 
-        tenant_repos = dict()
+        # finish restore of backed up repo files, if previous run crashed
+        backup_dir = os.path.join(general["state_dir"], "backup")
+        restored = restore_backup(backup_dir)
+        if restored:
+            logger.warning(
+                f"Restored repo files backed up by interrupted run: "
+                f"{'; '.join(restored)}"
+            )
+            restored_repo_ids = []
+            for filename in restored:
+                with open(filename) as f:
+                    restored_repo_ids.extend(get_repo_ids(f.read()))
+
+            YUMRepos.expire_cache(restored_repo_ids)
+
+        sessions = HTTPSessions(pool_size=general["pool_size"])
+        cache = ResponseCache(
+            path=general["cache_dir"],
+            max_staleness=general["max_staleness"],
+            latency_budget=general["latency_budget"]
+        )
+
+        poems = dict()
         for tenant, configuration in tenants_configurations.items():
             logger.info(
                 f"{tenant}: Sending request for profile(s): "
                 f"{', '.join(configuration['metricprofiles'])}"
             )
 
-            poem = POEM(
-                hostname=configuration["host"],
-                token=configuration["token"],
-                profiles=configuration["metricprofiles"]
+            poems.update({
+                tenant: POEM(
+                    hostname=configuration["host"],
+                    token=configuration["token"],
+                    profiles=configuration["metricprofiles"],
+                    sessions=sessions,
+                    cache=cache,
+                    os_name=args.os_name
+                )
+            })
+
+        try:
+            tenant_repos = fetch_tenants_data(
+                poems, concurrency=general["concurrency"]
             )
 
-            tenant_repos.update({tenant: poem.get_data()})
+        finally:
+            sessions.close()
+
+        logger.info(
+            f"POEM response cache: {cache.hits} hit(s), "
+            f"{cache.misses} miss(es), {cache.stale} stale"
+        )
+
+        for tenant, poem in poems.items():
+            if poem.stale:
+                logger.warning(
+                    f"{tenant}: Using cached POEM data, POEM not available: "
+                    f"{poem.stale}"
+                )
 
         data = merge_tenants_data(tenant_repos)
 
+        fingerprint = Fingerprint(
+            os.path.join(general["cache_dir"], "fingerprint.json"),
+            max_age=general["fingerprint_max_age"]
+        )
+        if not noop and not args.force and not args.clean_all and \
+                fingerprint.matches(data):
+            logger.info(
+                "Nothing changed since the last successful run, skipping. "
+                "Use --force to run anyway."
+            )
+            sys.exit(0)
+
+        if args.clean_all:
+            subprocess.call(['yum', 'clean', 'all'])
+
         if backup_repos:
-            repos = YUMRepos(data=data, override=False)
+            repos = YUMRepos(
+                data=data, override=False, backup_dir=backup_dir
+            )
 
         else:
-            repos = YUMRepos(data=data)
+            repos = YUMRepos(
+                data=data,
+                manifest=os.path.join(general["state_dir"], "repos.json")
+            )
 
         logger.info("Creating YUM repo files...")
 
         files = repos.create_file()
 
-        logger.info(f"Created files: {'; '.join(files)}")
+        for status in ['created', 'changed', 'unchanged']:
+            if files[status]:
+                logger.info(
+                    f"{status.capitalize()} files: {'; '.join(files[status])}"
+                )
 
-        pkg = Packages(data)
+        pruned = repos.prune(dry_run=noop)
+        if pruned:
+            if noop:
+                logger.info(f"Repo files to be pruned: {'; '.join(pruned)}")
 
-        if noop:
-            info_msg, warn_msg = pkg.no_op()
+            else:
+                logger.info(f"Pruned repo files: {'; '.join(pruned)}")
 
-        else:
-            info_msg, warn_msg = pkg.install()
+        if not args.clean_all:
+            repos.expire_cache(repos.changed_repo_ids)
+
+        pkg = Packages(data, batch=general["batch_transaction"])
+
+        try:
+            if noop:
+                info_msg, warn_msg = pkg.no_op()
+
+            else:
+                info_msg, warn_msg = pkg.install()
+
+        finally:
+            pkg.close()
 
         # if there were repo files backed up, now they are restored
-        repos.clean()
+        repos.clean(clean_all=args.clean_all)
 
         if info_msg:
             for msg in info_msg:
@@ -124,6 +227,8 @@ def main():
                 if missing_packages_msg:
                     print(f"WARNING: {missing_packages_msg}")
 
+                fingerprint.record(data)
+
             logger.info("The run finished successfully.")
             sys.exit(0)
 
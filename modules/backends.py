@@ -0,0 +1,530 @@
+import glob
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+
+from argo_poem_tools.exceptions import MetadataException
+from argo_poem_tools.osrelease import uses_dnf
+from argo_poem_tools.repodata import DEFAULT_PRIORITY, find_repomd, \
+    metadata_age, read_available, read_repo_options
+from argo_poem_tools.repos import get_repo_ids
+
+_RPM_QUERYFORMAT = \
+    '%{NAME}\\t%{EPOCHNUM}\\t%{VERSION}\\t%{RELEASE}\\t%{ARCH}\\n'
+
+_REPOQUERY_FORMAT = '%{name}\t%{epoch}\t%{version}\t%{release}\t%{arch}'
+
+# yum's default metadata_expire, used if it is not set in config
+METADATA_EXPIRE = 6 * 60 * 60
+
+
+def split_command(command, args):
+    """
+    Splits arguments in as few chunks as possible, so that the command with
+    each chunk of arguments stays within the system's ARG_MAX.
+    :param command: list with the command and its fixed arguments
+    :param args: list of arguments which may be split
+    :return: generator of commands with chunks of arguments appended
+    """
+    try:
+        # leave room for the environment, which counts towards the same limit
+        limit = os.sysconf('SC_ARG_MAX') // 2
+
+    except (ValueError, OSError):
+        limit = 65536
+
+    # every argument takes its length, NUL terminator and argv pointer
+    base = sum(len(arg) + 1 + 8 for arg in command)
+
+    chunk = []
+    size = base
+    for arg in args:
+        arg_size = len(arg) + 1 + 8
+        if chunk and size + arg_size > limit:
+            yield command + chunk
+            chunk = []
+            size = base
+
+        chunk.append(arg)
+        size += arg_size
+
+    if chunk:
+        yield command + chunk
+
+
+def _repoquery_command():
+    """
+    Get repoquery command suitable for the distro: `dnf repoquery` on
+    distros using DNF, `repoquery` from yum-utils if it is installed.
+    :return: command as list, or None if repoquery is not available
+    """
+    if uses_dnf():
+        return [
+            'dnf', 'repoquery', '--quiet', '--available',
+            '--disableplugin=versionlock'
+        ]
+
+    if shutil.which('repoquery'):
+        return ['repoquery', '--show-duplicates']
+
+    return None
+
+
+def _pop_arch(pkg_string):
+    """
+    Pop arch info from RPM package string.
+    :param pkg_string: string with arch info
+    :return: RPM package string without arch info
+    """
+    pkg_string_split = pkg_string.split('.')
+    pkg = '.'.join(pkg_string_split[:-1])
+    return pkg
+
+
+def _parse_yum_list(lines):
+    """
+    Parses `yum list` output line by line. Lines before the list header are
+    skipped. Yum wraps lines with long package names, so columns are
+    collected across lines until all three of them are read.
+    :param lines: iterable of output lines
+    :return: generator of dicts with keys name, version and release
+    """
+    listing = False
+    columns = []
+    for line in lines:
+        if not listing:
+            listing = line.strip() == 'Available Packages'
+            continue
+
+        columns.extend(line.split())
+        while len(columns) >= 3:
+            name, version_release = columns[0:2]
+            del columns[0:3]
+            version, release = version_release.rsplit('-', 1)
+            yield dict(name=_pop_arch(name), version=version, release=release)
+
+
+def _parse_repoquery(lines):
+    """
+    Parses repoquery output in _REPOQUERY_FORMAT. Non-zero epoch is kept in
+    the version, the same way `yum list` shows it.
+    :param lines: iterable of output lines
+    :return: generator of dicts with keys name, version and release
+    """
+    for line in lines:
+        fields = line.rstrip('\n').split('\t')
+        if len(fields) != 5 or fields[4] == 'src':
+            continue
+
+        name, epoch, version, release, arch = fields
+        if epoch not in ('', '0', '(none)'):
+            version = f'{epoch}:{version}'
+
+        yield dict(name=name, version=version, release=release)
+
+
+def _to_str(value):
+    if isinstance(value, bytes):
+        return value.decode('utf-8')
+
+    return value
+
+
+class SubprocessBackend:
+    """
+    Package queries done by running rpm and yum (or repoquery) commands.
+    """
+    def __init__(self):
+        self.repoquery = _repoquery_command()
+
+    def installed(self, names=None):
+        """
+        Get installed packages, using RPM query with machine-readable format.
+        Non-zero epoch is kept in the version, as epoch:version.
+        :param names: if given, only packages with these names are queried;
+        names which are not installed are skipped
+        :return: list of dicts with keys name, version and release
+        """
+        if names is None:
+            commands = [['rpm', '-qa', '--queryformat', _RPM_QUERYFORMAT]]
+
+        elif not names:
+            return []
+
+        else:
+            commands = split_command(
+                ['rpm', '-q', '--queryformat', _RPM_QUERYFORMAT], names
+            )
+
+        pkg_list = []
+        for command in commands:
+            process = subprocess.run(
+                command, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+            )
+
+            not_installed = 0
+            for line in process.stdout.decode('utf-8').split('\n'):
+                fields = line.split('\t')
+                if len(fields) == 5:
+                    n, e, v, r, a = fields
+                    if e not in ('', '0', '(none)'):
+                        v = f'{e}:{v}'
+
+                    pkg_list.append(dict(name=n, version=v, release=r))
+
+                elif line.endswith(' is not installed'):
+                    not_installed += 1
+
+            # rpm exit code is the number of packages not installed
+            if process.returncode != 0 and not_installed == 0:
+                raise subprocess.CalledProcessError(
+                    process.returncode, command, process.stdout, process.stderr
+                )
+
+        return pkg_list
+
+    def available(self, names, repo_ids=None):
+        """
+        Lists available versions of the given packages. Version lock plugin
+        is disabled for this command only. Output is parsed while it is being
+        read, and packages are yielded one at a time. Machine-readable
+        repoquery output is used if repoquery is available, `yum list` output
+        otherwise.
+        :param names: list of package names
+        :param repo_ids: if given, only these repositories are enabled
+        :return: generator of dicts with keys name, version and release
+        """
+        if repo_ids:
+            repo_options = [
+                '--disablerepo=*', '--enablerepo={}'.format(','.join(repo_ids))
+            ]
+
+        else:
+            repo_options = []
+
+        if self.repoquery:
+            command = self.repoquery + repo_options + [
+                '--queryformat', _REPOQUERY_FORMAT
+            ]
+            parser = _parse_repoquery
+
+        else:
+            command = [
+                'yum', 'list', 'available', '--showduplicates',
+                '--disableplugin=versionlock'
+            ] + repo_options
+            parser = _parse_yum_list
+
+        for cmd in split_command(command, names):
+            with tempfile.TemporaryFile() as errors:
+                proc = subprocess.Popen(
+                    cmd, stdout=subprocess.PIPE, stderr=errors
+                )
+                try:
+                    for pkg in parser(
+                            line.decode('utf-8') for line in proc.stdout
+                    ):
+                        yield pkg
+
+                finally:
+                    proc.stdout.close()
+                    returncode = proc.wait()
+
+                if returncode != 0:
+                    errors.seek(0)
+                    error = errors.read()
+                    # yum exits with error if none of the names is available
+                    if b'No matching Packages' in error:
+                        continue
+
+                    raise subprocess.CalledProcessError(
+                        returncode, cmd, stderr=error
+                    )
+
+    def close(self):
+        pass
+
+
+class DNFBackend:
+    """
+    Package queries done in-process, using rpm and dnf Python bindings. RPM
+    database is queried directly, and repositories' metadata is loaded into
+    the sack only once, when available packages are first listed.
+    """
+    def __init__(self):
+        import dnf
+        import rpm
+
+        self.dnf = dnf
+        self.rpm = rpm
+        self._base = None
+        self._repo_ids = None
+
+    def installed(self, names=None):
+        """
+        Get installed packages from RPM database. Non-zero epoch is kept in
+        the version, as epoch:version.
+        :param names: if given, only packages with these names are queried;
+        names which are not installed are skipped
+        :return: list of dicts with keys name, version and release
+        """
+        if names is not None and not names:
+            return []
+
+        ts = self.rpm.TransactionSet()
+        try:
+            if names is None:
+                headers = list(ts.dbMatch())
+
+            else:
+                headers = []
+                for name in names:
+                    headers.extend(ts.dbMatch('name', name))
+
+            pkgs = []
+            for hdr in headers:
+                name = _to_str(hdr['name'])
+                if name == 'gpg-pubkey':
+                    continue
+
+                version = _to_str(hdr['version'])
+                if hdr['epoch']:
+                    version = f"{hdr['epoch']}:{version}"
+
+                pkgs.append(dict(
+                    name=name, version=version,
+                    release=_to_str(hdr['release'])
+                ))
+
+            return pkgs
+
+        finally:
+            # database is reopened on next query, to see the changes made
+            # by yum in the meantime
+            ts.closeDB()
+
+    def _get_base(self, repo_ids):
+        repo_ids = tuple(sorted(repo_ids)) if repo_ids else None
+        if self._base is None or repo_ids != self._repo_ids:
+            self.close()
+
+            base = self.dnf.Base()
+            base.conf.read()
+            base.read_all_repos()
+            if repo_ids:
+                for repo in base.repos.all():
+                    if repo.id in repo_ids:
+                        repo.enable()
+
+                    else:
+                        repo.disable()
+
+            # plugins are not loaded, so version locks do not apply
+            base.fill_sack(load_system_repo=False)
+
+            self._base = base
+            self._repo_ids = repo_ids
+
+        return self._base
+
+    def available(self, names, repo_ids=None):
+        """
+        Lists available versions of the given packages from the sack.
+        :param names: list of package names
+        :param repo_ids: if given, only these repositories are enabled
+        :return: generator of dicts with keys name, version and release
+        """
+        base = self._get_base(repo_ids)
+        query = base.sack.query().available().filter(
+            name=list(names), arch__neq='src'
+        )
+        for pkg in query:
+            if pkg.epoch:
+                version = f'{pkg.epoch}:{pkg.version}'
+
+            else:
+                version = pkg.version
+
+            yield dict(name=pkg.name, version=version, release=pkg.release)
+
+    def close(self):
+        if self._base is not None:
+            self._base.close()
+            self._base = None
+            self._repo_ids = None
+
+
+class MetadataBackend:
+    """
+    Available packages read directly from repositories' metadata which yum
+    keeps in its cache. Repositories whose metadata is not cached, has
+    expired according to their metadata_expire, or is older than their repo
+    file, are queried with the fallback backend, as are repositories with
+    package filters (exclude, includepkgs), since only yum applies them.
+    Installed packages are always queried with the fallback backend.
+    """
+    def __init__(
+            self, fallback, max_age=METADATA_EXPIRE,
+            repos_path='/etc/yum.repos.d', cache_dirs=None,
+            yum_conf='/etc/yum.conf'
+    ):
+        """
+        :param fallback: backend used for queries which cannot be answered
+        from the cache
+        :param max_age: metadata expire time used if it is set neither in
+        yum config file nor in repo file
+        :param repos_path: directory with repo files
+        :param cache_dirs: list of glob patterns with {repo_id} placeholder
+        :param yum_conf: yum config file, whose main section sets the
+        default metadata expire time and global package filters
+        """
+        self.fallback = fallback
+        self.max_age, self.filtered = self._read_main(yum_conf, max_age)
+        self.repos_path = repos_path
+        self.cache_dirs = cache_dirs
+
+    @staticmethod
+    def _read_main(yum_conf, default):
+        """
+        :return: tuple of default metadata expire time and flag telling if
+        global package filters are set
+        """
+        try:
+            with open(yum_conf) as f:
+                content = f.read()
+
+        except (IOError, OSError):
+            return default, False
+
+        options = read_repo_options(content, default)
+        if options is None:
+            return default, True
+
+        main = options.get(
+            'main', dict(expire=default, priority=None, filtered=False)
+        )
+
+        return main['expire'], main['filtered']
+
+    def installed(self, names=None):
+        return self.fallback.installed(names)
+
+    def _repo_files(self):
+        """
+        :return: dict with repo IDs as keys and dicts with keys mtime (of
+        their repo file), expire, priority and filtered as values
+        """
+        repos = dict()
+        for path in glob.glob(os.path.join(self.repos_path, '*.repo')):
+            try:
+                with open(path) as f:
+                    content = f.read()
+
+                mtime = os.path.getmtime(path)
+
+            except (IOError, OSError):
+                continue
+
+            options = read_repo_options(content, self.max_age)
+            for repo_id in get_repo_ids(content):
+                if options is None or repo_id not in options:
+                    # what yum makes of the file is not known
+                    repo = dict(
+                        expire=self.max_age, priority=DEFAULT_PRIORITY,
+                        filtered=True
+                    )
+
+                else:
+                    repo = dict(options[repo_id])
+
+                repo.update({'mtime': mtime})
+                repos.update({repo_id: repo})
+
+        return repos
+
+    def _repo(self, repo_id, repo_files):
+        return repo_files.get(repo_id, dict(
+            mtime=0, expire=self.max_age, priority=DEFAULT_PRIORITY,
+            filtered=False
+        ))
+
+    def _find_fresh(self, repo_id, repo_files):
+        repo = self._repo(repo_id, repo_files)
+        if repo['filtered']:
+            return None
+
+        repomd = find_repomd(repo_id, self.cache_dirs)
+        if not repomd:
+            return None
+
+        age = metadata_age(repomd)
+        if repo['expire'] is not None and age > repo['expire']:
+            return None
+
+        # repo file changed since the metadata was downloaded, e.g. baseurl
+        if repo['mtime'] > time.time() - age:
+            return None
+
+        return repomd
+
+    def available(self, names, repo_ids=None):
+        """
+        Lists available versions of the given packages.
+        :param names: list of package names
+        :param repo_ids: repositories to query; if not given, fallback
+        backend is used
+        :return: generator of dicts with keys name, version and release
+        """
+        repo_files = self._repo_files() if repo_ids else dict()
+
+        # packages of repositories with different priorities hide each other,
+        # and global package filters apply to all of them
+        if not repo_ids or self.filtered or len(set(
+                self._repo(repo_id, repo_files)['priority']
+                for repo_id in repo_ids
+        )) > 1:
+            for pkg in self.fallback.available(names, repo_ids):
+                yield pkg
+
+            return
+
+        names_set = set(names)
+
+        not_cached = []
+        for repo_id in repo_ids:
+            repomd = self._find_fresh(repo_id, repo_files)
+            if not repomd:
+                not_cached.append(repo_id)
+                continue
+
+            try:
+                pkgs = read_available(repomd, names_set)
+
+            except MetadataException:
+                not_cached.append(repo_id)
+                continue
+
+            for pkg in pkgs:
+                yield pkg
+
+        if not_cached:
+            for pkg in self.fallback.available(names, not_cached):
+                yield pkg
+
+    def close(self):
+        self.fallback.close()
+
+
+def get_backend():
+    """
+    Get package backend: in-process DNFBackend if rpm and dnf Python bindings
+    are available, SubprocessBackend otherwise, with available packages read
+    from cached repo metadata when possible.
+    """
+    try:
+        return DNFBackend()
+
+    except ImportError:
+        return MetadataBackend(SubprocessBackend())
@@ -0,0 +1,108 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+
+class ResponseCache:
+    """
+    On-disk cache of POEM responses, used for conditional requests. Each entry
+    holds the response body together with its ETag and Last-Modified headers.
+    """
+    def __init__(
+            self, path="/var/cache/argo-poem-tools", max_staleness=0,
+            latency_budget=10
+    ):
+        self.path = path
+        self.max_staleness = max_staleness
+        self.latency_budget = latency_budget
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(hostname, os_name, profiles):
+        string = json.dumps([hostname, os_name, sorted(profiles)])
+        return hashlib.sha256(string.encode("utf-8")).hexdigest()
+
+    def _filename(self, key):
+        return os.path.join(self.path, f"{key}.json")
+
+    def get(self, key):
+        """
+        Returns cached entry for the given key.
+        :param key: cache key
+        :return: dict with keys body, etag, last_modified and timestamp, or
+        None if there is no (readable) entry
+        """
+        try:
+            with open(self._filename(key)) as f:
+                entry = json.load(f)
+
+        except (IOError, ValueError):
+            return None
+
+        if not isinstance(entry, dict) or "body" not in entry:
+            return None
+
+        return entry
+
+    def usable_if_stale(self, entry):
+        """
+        Checks if entry may be served in place of fresh data when POEM is slow
+        or unavailable.
+        :param entry: cache entry, as returned by get()
+        :return: True if the entry is younger than max_staleness seconds
+        """
+        if not entry or self.max_staleness <= 0:
+            return False
+
+        try:
+            age = time.time() - float(entry["timestamp"])
+
+        except (KeyError, TypeError, ValueError):
+            return False
+
+        return age <= self.max_staleness
+
+    def store(self, key, body, etag=None, last_modified=None):
+        """
+        Stores response to the cache. Cache is only an optimisation, so the
+        entry is silently skipped if it cannot be written.
+        """
+        entry = {
+            "etag": etag,
+            "last_modified": last_modified,
+            "timestamp": time.time(),
+            "body": body
+        }
+        try:
+            os.makedirs(self.path, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=self.path, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w") as f:
+                    json.dump(entry, f)
+
+                os.replace(tmp, self._filename(key))
+
+            except Exception:
+                os.remove(tmp)
+                raise
+
+        except (IOError, OSError, TypeError, ValueError):
+            pass
+
+    def hit(self):
+        with self._lock:
+            self.hits += 1
+
+    def miss(self):
+        with self._lock:
+            self.misses += 1
+
+    def stale_hit(self):
+        with self._lock:
+            self.stale += 1
@@ -31,6 +31,60 @@ class Config:
 
         return tenants
 
+    def _get_general_int(self, entry, default, minimum=None):
+        try:
+            value = self.conf.getint("GENERAL", entry, fallback=default)
+
+        except ValueError:
+            raise ConfigException(
+                f"Entry '{entry}' in section 'GENERAL' must be an integer"
+            )
+
+        if minimum is not None and value < minimum:
+            raise ConfigException(
+                f"Entry '{entry}' in section 'GENERAL' must be at least "
+                f"{minimum}"
+            )
+
+        return value
+
+    def _get_general_bool(self, entry, default):
+        try:
+            return self.conf.getboolean("GENERAL", entry, fallback=default)
+
+        except ValueError:
+            raise ConfigException(
+                f"Entry '{entry}' in section 'GENERAL' must be a boolean"
+            )
+
+    def get_general(self):
+        return {
+            "concurrency": self._get_general_int(
+                "concurrency", default=4, minimum=1
+            ),
+            "pool_size": self._get_general_int(
+                "poolsize", default=10, minimum=1
+            ),
+            "cache_dir": self.conf.get(
+                "GENERAL", "cachedir", fallback="/var/cache/argo-poem-tools"
+            ),
+            "state_dir": self.conf.get(
+                "GENERAL", "statedir", fallback="/var/lib/argo-poem-tools"
+            ),
+            "max_staleness": self._get_general_int(
+                "maxstaleness", default=0, minimum=0
+            ),
+            "latency_budget": self._get_general_int(
+                "latencybudget", default=10, minimum=1
+            ),
+            "fingerprint_max_age": self._get_general_int(
+                "fingerprintmaxage", default=21600, minimum=0
+            ),
+            "batch_transaction": self._get_general_bool(
+                "batchtransaction", default=False
+            )
+        }
+
     def get_configuration(self):
         configuration = dict()
         for tenant in self.tenants:
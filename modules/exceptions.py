@@ -23,3 +23,8 @@ class POEMException(MyException):
 class MergingException(MyException):
     def __str__(self):
         return f"Error merging POEM data: {str(self.msg)}"
+
+
+class MetadataException(MyException):
+    def __str__(self):
+        return f"Error reading repo metadata: {str(self.msg)}"
@@ -0,0 +1,144 @@
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+from argo_poem_tools.rpmdb import RPMDB_PATH, rpmdb_cookie
+from argo_poem_tools.versionlock import list_signature
+
+
+class Fingerprint:
+    """
+    Fingerprint of the state reached by the last successful run: hash of the
+    merged POEM data, RPM database cookie, version lock list signature and
+    hashes of the repo files created from the data. If none of them has
+    changed since, there is nothing to be done. Recorded fingerprint is
+    honoured only for a limited time, since new builds published in the
+    repos do not change any of these.
+    """
+    def __init__(
+            self, path, rpmdb_path=RPMDB_PATH, versionlock_paths=None,
+            repos_path="/etc/yum.repos.d", max_age=None
+    ):
+        """
+        :param path: file in which fingerprint is stored
+        :param rpmdb_path: RPM database directory
+        :param versionlock_paths: candidate version lock list files
+        :param repos_path: directory with repo files
+        :param max_age: time in seconds after which recorded fingerprint is
+        no longer honoured; if None, it does not expire
+        """
+        self.path = path
+        self.rpmdb_path = rpmdb_path
+        self.versionlock_paths = versionlock_paths
+        self.repos_path = repos_path
+        self.max_age = max_age
+
+    def _repo_files(self, data):
+        """
+        Hashes repo files created from the data as they are on disk, so that
+        a file which was deleted or edited since is written again.
+        :param data: merged POEM data
+        :return: dict with repo file names as keys and hashes of their
+        content, or None if the file is missing, as values
+        """
+        hashes = dict()
+        for title in data:
+            filename = os.path.join(self.repos_path, title + ".repo")
+            try:
+                with open(filename, "rb") as f:
+                    digest = hashlib.sha256(f.read()).hexdigest()
+
+            except (IOError, OSError):
+                digest = None
+
+            hashes.update({filename: digest})
+
+        return hashes
+
+    def compute(self, data):
+        """
+        :param data: merged POEM data
+        :return: dict with keys data, rpmdb, versionlock and repos, or None
+        if the state of the system cannot be fingerprinted
+        """
+        rpmdb = rpmdb_cookie(self.rpmdb_path)
+        versionlock = list_signature(self.versionlock_paths)
+        if rpmdb is None or versionlock is None:
+            return None
+
+        data_hash = hashlib.sha256(
+            json.dumps(data, sort_keys=True).encode("utf-8")
+        ).hexdigest()
+
+        # round trip through JSON, so that it compares equal to stored one
+        return json.loads(json.dumps({
+            "data": data_hash,
+            "rpmdb": rpmdb,
+            "versionlock": versionlock,
+            "repos": self._repo_files(data)
+        }))
+
+    def _read(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+
+        except (IOError, ValueError):
+            return None
+
+    def matches(self, data):
+        """
+        Checks if the system is still in the state recorded after the last
+        successful run, with the same POEM data, and if the run was recent
+        enough.
+        :param data: merged POEM data
+        :return: True if nothing has changed
+        """
+        fingerprint = self.compute(data)
+        stored = self._read()
+        if fingerprint is None or not isinstance(stored, dict):
+            return False
+
+        recorded = stored.pop("recorded", None)
+        if self.max_age is not None:
+            if not isinstance(recorded, (int, float)):
+                return False
+
+            age = time.time() - recorded
+            if age < 0 or age >= self.max_age:
+                return False
+
+        return fingerprint == stored
+
+    def record(self, data):
+        """
+        Stores fingerprint of the current state. Fingerprint is only an
+        optimisation, so it is silently skipped if it cannot be written.
+        :param data: merged POEM data
+        """
+        fingerprint = self.compute(data)
+        try:
+            if fingerprint is None:
+                if os.path.exists(self.path):
+                    os.remove(self.path)
+
+                return
+
+            fingerprint.update({"recorded": time.time()})
+            directory = os.path.dirname(self.path)
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w") as f:
+                    json.dump(fingerprint, f)
+
+                os.replace(tmp, self.path)
+
+            except Exception:
+                os.remove(tmp)
+                raise
+
+        except (IOError, OSError):
+            pass
@@ -0,0 +1,87 @@
+import functools
+import shlex
+
+from argo_poem_tools.exceptions import POEMException
+
+OS_RELEASE = "/etc/os-release"
+
+
+@functools.lru_cache(maxsize=None)
+def read_os_release(path=OS_RELEASE):
+    """
+    Parses os-release file. The result is memoized, since it does not change
+    while the tool is running.
+    :param path: path to os-release file
+    :return: dict with os-release keys and their unquoted values
+    """
+    values = dict()
+    try:
+        with open(path) as f:
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith("#") or "=" not in line:
+                    continue
+
+                key, value = line.split("=", 1)
+                try:
+                    value = " ".join(shlex.split(value))
+
+                except ValueError:
+                    value = value.strip("\"'")
+
+                values.update({key.strip(): value})
+
+    except IOError as e:
+        raise POEMException(f"Unable to read {path}: {e.strerror}")
+
+    return values
+
+
+@functools.lru_cache(maxsize=None)
+def get_os(path=OS_RELEASE):
+    """
+    Builds distro name the way POEM expects it, e.g. centos7 or rocky9.
+    :param path: path to os-release file
+    :return: lowercase first word of NAME followed by major VERSION_ID
+    """
+    os_release = read_os_release(path)
+
+    for key in ["NAME", "VERSION_ID"]:
+        if not os_release.get(key):
+            raise POEMException(
+                f"Unable to determine distro: missing {key} in {path}"
+            )
+
+    name = os_release["NAME"].lower().split(" ")[0]
+    version = os_release["VERSION_ID"].split(".")[0]
+
+    return f"{name}{version}"
+
+
+def uses_dnf(path=OS_RELEASE):
+    """
+    Checks if distro's package manager is DNF, i.e. if it is Fedora or
+    Enterprise Linux 8 or newer.
+    :param path: path to os-release file
+    :return: True if DNF is used, False if it is not or distro is unknown
+    """
+    try:
+        os_release = read_os_release(path)
+
+    except POEMException:
+        return False
+
+    family = "{} {}".format(
+        os_release.get("ID", ""), os_release.get("ID_LIKE", "")
+    ).split()
+    if "fedora" in family and "rhel" not in family:
+        return True
+
+    if "rhel" not in family and "centos" not in family:
+        return False
+
+    try:
+        return int(os_release.get("VERSION_ID", "").split(".")[0]) >= 8
+
+    except ValueError:
+        return False
@@ -1,20 +1,87 @@
+import functools
 import subprocess
+import tempfile
 from re import compile
 
+from argo_poem_tools.backends import get_backend, split_command
 from argo_poem_tools.exceptions import PackageException
+from argo_poem_tools.repos import get_repo_ids
+from argo_poem_tools.rpmdb import InstalledPackages
+from argo_poem_tools.versionlock import VersionLocks
 
-_rpm_re = compile('(\S+)-(?:(\d*):)?(.*)-(~?\w+[\w.]*)')
+_segment_re = compile(r'~|\^|[0-9]+|[a-zA-Z]+')
 
 
-def _pop_arch(pkg_string):
+@functools.lru_cache(maxsize=None)
+def _version_key(version):
     """
-    Pop arch info from RPM package string.
-    :param pkg_string: string with arch info
-    :return: RPM package string without arch info
+    Builds sort key for RPM version or release string, following rpmvercmp
+    rules: string is split in numeric and alphabetic segments, other
+    characters being separators; numeric segments are newer than alphabetic
+    ones; '~' sorts before anything, even the end of the string, and '^'
+    sorts after the end of the string, but before any other segment.
+    :param version: version or release string
+    :return: tuple which can be compared with other keys
     """
-    pkg_string_split = pkg_string.split('.')
-    pkg = '.'.join(pkg_string_split[:-1])
-    return pkg
+    key = []
+    for segment in _segment_re.findall(version):
+        if segment == '~':
+            key.append((0,))
+
+        elif segment == '^':
+            key.append((2,))
+
+        elif segment.isdigit():
+            key.append((4, int(segment)))
+
+        else:
+            key.append((3, segment))
+
+    key.append((1,))
+
+    return tuple(key)
+
+
+@functools.lru_cache(maxsize=None)
+def _evr_key(version, release):
+    """
+    Builds sort key for RPM package's version and release. Epoch is taken
+    from the version, if given as epoch:version.
+    :param version: version string, optionally with epoch
+    :param release: release string
+    :return: tuple which can be compared with other keys
+    """
+    epoch = 0
+    if ':' in version:
+        epoch, version = version.split(':', 1)
+        epoch = int(epoch) if epoch.isdigit() else 0
+
+    return epoch, _version_key(version), _version_key(release)
+
+
+def _version_matches(requested, version):
+    """
+    Checks if version matches the requested one. Epoch is compared only if
+    it is given in the requested version, the same way yum matches package
+    specs; missing epoch in the version is epoch 0.
+    :param requested: requested version, optionally with epoch
+    :param version: version, optionally with epoch
+    :return: True if versions match
+    """
+    if ':' not in requested:
+        return version.split(':', 1)[-1] == requested
+
+    if ':' not in version:
+        version = f'0:{version}'
+
+    return requested == version
+
+
+def _vr_key(vr):
+    """
+    Sort key for (version, release) tuples.
+    """
+    return _evr_key(vr[0], vr[1])
 
 
 def _compare_versions(v1, v2):
@@ -24,55 +91,29 @@ def _compare_versions(v1, v2):
     :param v2: second string version
     :return: 1 if v1 is newer, 0 if they are equal, -1 if v2 is newer
     """
-    arr1 = v1.split('.')
-    arr2 = v2.split('.')
-
-    arr1 = [int(i) if i.isnumeric() else i for i in arr1]
-    arr2 = [int(i) if i.isnumeric() else i for i in arr2]
-
-    n = len(arr1)
-    m = len(arr2)
-
-    if n > m:
-        for i in range(m, n):
-            arr2.append(0)
-    elif m > n:
-        for i in range(n, m):
-            arr1.append(0)
+    key1 = _version_key(v1)
+    key2 = _version_key(v2)
 
-    for i in range(len(arr1)):
-        if arr1[i] > arr2[i]:
-            return 1
-        elif arr2[i] > arr1[i]:
-            return -1
-
-    return 0
+    return (key1 > key2) - (key1 < key2)
 
 
 def _compare_vr(vr1, vr2):
     """
-    Compares two RPM (version, release) tuples.
+    Compares two RPM (version, release) tuples, taking epoch into account.
     :param vr1: first (version, release) tuple
     :param vr2: second (version, release) tuple
     :return: 1 if vr1 is newer, 0 if equal, -1 if vr2 is newer
     """
-    v1, r1 = vr1
-    v2, r2 = vr2
-
-    if v1 == v2:
-        if r1 == r2:
-            return 0
+    key1 = _vr_key(vr1)
+    key2 = _vr_key(vr2)
 
-        else:
-            return _compare_versions(r1, r2)
-
-    else:
-        return _compare_versions(v1, v2)
+    return (key1 > key2) - (key1 < key2)
 
 
 class Packages:
-    def __init__(self, data):
+    def __init__(self, data, batch=False, backend=None):
         self.data = data
+        self.batch = batch
         self.package_list = self._list()
         self.versions_unlocked = False
         self.initially_locked_versions = []
@@ -80,6 +121,13 @@ class Packages:
         self.packages_different_version = None
         self.packages_not_found = None
         self.available_packages = None
+        self.versionlocks = VersionLocks()
+        self.backend = get_backend() if backend is None else backend
+        self.installed = InstalledPackages(
+            lambda: self._get_installed_packages(
+                [item[0] for item in self.package_list]
+            )
+        )
 
     def _list(self):
         list_packages = []
@@ -92,32 +140,58 @@ class Packages:
 
         return list_packages
 
+    def _query_locked(self, names):
+        """
+        Get names of packages with locked versions among the given names.
+        """
+        locked = self.versionlocks.names()
+        return [name for name in names if name in locked]
+
     def _get_locked_versions(self):
         """
         Get list of packages with locked versions among the packages requested.
         """
-        output = subprocess.check_output(['yum', 'versionlock', 'list']).decode(
-            'utf-8'
+        self.locked_versions = self._query_locked(
+            [item[0] for item in self._list()]
         )
-        locked_versions = [
-            item[0] for item in self._list() if item[0] in output
-        ]
-        self.locked_versions = locked_versions
+
+    def _versionlock(self, operation, names):
+        """
+        Adds or deletes version locks for all the given packages at once,
+        splitting the command only if it would exceed system's ARG_MAX.
+        Version lock list is checked afterwards, to determine which entries
+        were actually changed.
+        :param operation: versionlock operation, add or delete
+        :param names: list of package names
+        :return: tuple of lists of names which succeeded and which failed
+        """
+        if not names:
+            return [], []
+
+        for command in split_command(['yum', 'versionlock', operation], names):
+            subprocess.call(
+                command, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+            )
+
+        self.versionlocks.invalidate()
+        locked = set(self._query_locked(names))
+
+        succeeded = []
+        failed = []
+        for name in names:
+            if (name in locked) == (operation == 'add'):
+                succeeded.append(name)
+
+            else:
+                failed.append(name)
+
+        return succeeded, failed
 
     def _failsafe_lock_versions(self):
         """
         Locking the packages that have already been locked in case of exception.
         """
-        warn = []
-        for item in self.initially_locked_versions:
-            try:
-                subprocess.call(
-                    ['yum', 'versionlock', 'add', item],
-                    stdout=subprocess.PIPE, stderr=subprocess.PIPE
-                )
-
-            except subprocess.CalledProcessError:
-                warn.append(item)
+        locked, warn = self._versionlock('add', self.initially_locked_versions)
 
         if warn:
             return 'Packages not locked: {}'.format(', '.join(warn))
@@ -130,50 +204,60 @@ class Packages:
             self._get_locked_versions()
 
         if len(self.locked_versions) > 0:
-            for item in self.locked_versions:
-                try:
-                    subprocess.call(
-                        ['yum', 'versionlock', 'delete', item],
-                        stdout=subprocess.PIPE, stderr=subprocess.PIPE
-                    )
-                    self.initially_locked_versions.append(item)
-
-                except subprocess.CalledProcessError:
-                    continue
+            unlocked, _ = self._versionlock(
+                'delete', self.locked_versions
+            )
+            self.initially_locked_versions.extend(unlocked)
 
             self.versions_unlocked = True
 
+    def _repo_ids(self):
+        """
+        Get IDs of repositories from the repo files created from POEM data.
+        """
+        ids = []
+        for value in self.data.values():
+            for repo_id in get_repo_ids(value.get('content', '')):
+                if repo_id not in ids:
+                    ids.append(repo_id)
+
+        return ids
+
     def _get_available_packages(self):
-        if not self.versions_unlocked:
-            self._unlock_versions()
+        """
+        Lists available versions of the requested packages. Only repositories
+        created from POEM data are queried, and only for the requested
+        package names, so that metadata of the rest of the distro's
+        repositories is not loaded. Version locks are ignored, so that locked
+        packages' other versions are listed without touching the version
+        locks.
+        :return: iterable of dicts with keys name, version and release
+        """
+        names = sorted(set(item[0] for item in self.package_list))
+        if not names:
+            return []
 
-        output = subprocess.check_output(
-            ['yum', 'list', 'available', '--showduplicates']
-        )
-        output_list = output.decode('utf-8').split('\n')
-        pkg_index = output_list.index('Available Packages') + 1
-        pkgs = output_list[pkg_index:]
-        pkgs = ' '.join(pkgs)
-        pkg_list = list(filter(None, pkgs.split(' ')))
-
-        formatted_pkgs = []
-        for i in range(0, len(pkg_list), 3):
-            formatted_pkgs.append(pkg_list[i:i + 3])
-
-        pkgs_dicts = []
-        for pkg in formatted_pkgs:
-            pkg_list_split = pkg[1].split('-')
-            version = pkg_list_split[0]
-            release = pkg_list_split[1]
-            pkgs_dicts.append(
-                dict(
-                    name=_pop_arch(pkg[0]),
-                    version=version,
-                    release=release
+        return self.backend.available(names, self._repo_ids())
+
+    def _index_available_packages(self, pkgs):
+        """
+        Builds index of available packages which are requested, with package
+        names as keys and lists of (version, release) tuples, sorted from the
+        oldest to the newest, as values.
+        """
+        requested = set(item[0] for item in self.package_list)
+
+        index = dict()
+        for pkg in pkgs:
+            if pkg['name'] in requested:
+                index.setdefault(pkg['name'], []).append(
+                    (pkg['version'], pkg['release'])
                 )
-            )
 
-        return pkgs_dicts
+        for versions in index.values():
+            versions.sort(key=_vr_key)
+
+        return index
 
     def _get_exceptions(self):
         """
@@ -181,89 +265,70 @@ class Packages:
         them are found with different version and which one are not found at
         all.
         """
-        pkgs = self._get_available_packages()
-        self.available_packages = [
-            (pkg['name'], pkg['version'], pkg['release']) for pkg in pkgs
-        ]
-        available_vr = [(pkg['name'], pkg['version']) for pkg in pkgs]
+        self.available_packages = self._index_available_packages(
+            self._get_available_packages()
+        )
 
         wrong_version = []
         not_found = []
         for item in self.package_list:
-            if len(item) > 1 and item not in available_vr and \
-                    item[0] in [a[0] for a in self.available_packages]:
-                avail_versions = \
-                    [a for a in self.available_packages if a[0] == item[0]]
-                if len(avail_versions) > 1:
-                    max_version = avail_versions[0]
-                    for version in avail_versions:
-                        if _compare_vr(
-                                (version[1], 'mock'),
-                                (max_version[1], 'mock')
-                        ) > 0:
-                            max_version = version
-
-                    wrong_version.append(max_version)
-
-                else:
-                    wrong_version.append(
-                        [(a[0], a[1]) for a in self.available_packages if
-                         a[0] == item[0]][0]
-                    )
-
-            if item[0] not in [a[0] for a in self.available_packages]:
+            if item[0] not in self.available_packages:
                 not_found.append(item)
 
+            elif len(item) > 1 and not any(
+                _version_matches(item[1], v[0])
+                for v in self.available_packages[item[0]]
+            ):
+                wrong_version.append(self._get_max_version(item[0])[0:2])
+
         self.packages_different_version = wrong_version
         self.packages_not_found = not_found
 
-    @staticmethod
-    def _get_installed_packages():
-        output = subprocess.check_output(['rpm', '-qa'])
-        output_list = output.decode('utf-8').split('\n')
-        pkg_list = []
-        for item in output_list:
-            if item:
-                try:
-                    n, e, v, r = _rpm_re.match(_pop_arch(item.strip())).groups()
-                    pkg_list.append(dict(name=n, version=v, release=r))
-
-                except AttributeError:
-                    continue
-
-        return pkg_list
+    def _get_installed_packages(self, names=None):
+        """
+        Get installed packages.
+        :param names: if given, only packages with these names are queried;
+        names which are not installed are skipped
+        :return: list of dicts with keys name, version and release
+        """
+        return self.backend.installed(names)
 
-    @staticmethod
-    def _get_max_version(available_packages):
-        max_version = available_packages[0]
-        for version in available_packages:
-            if _compare_vr(
-                    (version[1], version[2]),
-                    (max_version[1], max_version[2])
-            ) > 0:
-                max_version = version
+    def _get_max_version(self, name, version=None):
+        """
+        Get the newest available package with the given name (and version).
+        :param name: package name
+        :param version: package version; if None, all versions are considered
+        :return: (name, version, release) tuple
+        """
+        versions = self.available_packages[name]
+        if version is not None:
+            versions = [
+                v for v in versions if _version_matches(version, v[0])
+            ]
 
-        return max_version
+        return (name,) + max(versions, key=_vr_key)
 
     def _get(self):
         if not self.packages_different_version:
             self._get_exceptions()
 
-        pkgs = self._get_installed_packages()
-        installed_packages = [
-            (pkg['name'], pkg['version'], pkg['release']) for pkg in pkgs
-        ]
+        # the newest installed version and release, indexed by name
+        installed_packages = dict(
+            (name, max(versions, key=_vr_key))
+            for name, versions in self.installed.index().items()
+        )
 
-        # list of installed packages' name
-        installed_names = [pkg[0] for pkg in installed_packages]
+        # names of packages which are available with different version
+        diff_versions_names = set(
+            p[0] for p in self.packages_different_version
+        )
 
-        # list of packages which are available with different version
-        diff_versions_names = [p[0] for p in self.packages_different_version]
+        not_found_packages = set(self.packages_not_found)
 
         # list of packages which are available in repos (both name and version)
         installable_packages = [
             pkg for pkg in self.package_list if
-            pkg not in self.packages_not_found and
+            pkg not in not_found_packages and
             pkg[0] not in diff_versions_names
         ]
 
@@ -271,31 +336,18 @@ class Packages:
         upgrade = []
         downgrade = []
         for item in installable_packages:
-            if item[0] in installed_names:
-                installed_ver = installed_packages[
-                    installed_names.index(item[0])
-                ][1]
-                installed_release = installed_packages[
-                    installed_names.index(item[0])
-                ][2]
-
-                # all the available packages with the given name and version
+            if item[0] in installed_packages:
+                installed_ver, installed_release = installed_packages[item[0]]
+
+                # the newest available package with the given name and version
                 if len(item) > 1:
-                    available_items = [
-                        pkg for pkg in self.available_packages
-                        if item[0] == pkg[0] and item[1] == pkg[1]
-                    ]
+                    max_version = self._get_max_version(item[0], item[1])
 
                 else:
-                    available_items = [
-                        pkg for pkg in self.available_packages
-                        if item[0] == pkg[0]
-                    ]
-
-                max_version = self._get_max_version(available_items)
+                    max_version = self._get_max_version(item[0])
 
                 if len(item) > 1:
-                    if item[1] == installed_ver:
+                    if _version_matches(item[1], installed_ver):
                         change_tuple = (item,)
                     else:
                         change_tuple = (
@@ -305,16 +357,15 @@ class Packages:
                 else:
                     change_tuple = (item,)
 
-                if _compare_vr(
-                        (max_version[1], max_version[2]),
-                        (installed_ver, installed_release)
-                ) > 0:
+                comparison = _compare_vr(
+                    (max_version[1], max_version[2]),
+                    (installed_ver, installed_release)
+                )
+
+                if comparison > 0:
                     upgrade.append(change_tuple)
 
-                elif _compare_vr(
-                        (max_version[1], max_version[2]),
-                        (installed_ver, installed_release)
-                ) < 0:
+                elif comparison < 0:
                     downgrade.append(change_tuple)
 
                 else:
@@ -323,12 +374,11 @@ class Packages:
             else:
                 install.append(item)
 
+        requested = dict((p[0], p) for p in self.package_list)
+
         diff_ver = []
         for item in self.packages_different_version:
-            orig_item = self.package_list[
-                [p[0] for p in self.package_list].index(item[0])
-            ]
-            diff_ver.append('-'.join(orig_item))
+            diff_ver.append('-'.join(requested[item[0]]))
 
         not_found = []
         for item in self.packages_not_found:
@@ -339,66 +389,174 @@ class Packages:
 
         return install, upgrade, downgrade, diff_ver, not_found
 
+    @staticmethod
+    def _plan(install, upgrade, downgrade):
+        """
+        Converts packages marked for installation, upgrade and downgrade into
+        list of YUM transactions.
+        :return: list of dicts with keys kind (install, upgrade or downgrade),
+        action (YUM command), spec (package given to YUM), name and version
+        (of the package which should end up installed), message (used when
+        transaction succeeds) and label (used when it fails)
+        """
+        transactions = []
+        for pkg in install:
+            pkgi = '-'.join(pkg)
+            transactions.append(dict(
+                kind='install', action='install', spec=pkgi, name=pkg[0],
+                version=pkg[1] if len(pkg) == 2 else None, message=pkgi,
+                label=pkgi
+            ))
+
+        for pkg in upgrade:
+            target = pkg[-1]
+            if len(pkg) == 2:
+                message = '{} -> {}'.format('-'.join(pkg[0]), '-'.join(pkg[1]))
+
+            else:
+                message = '-'.join(pkg[0])
+
+            transactions.append(dict(
+                kind='upgrade', action='install', spec='-'.join(target),
+                name=target[0],
+                version=target[1] if len(target) == 2 else None,
+                message=message, label='-'.join(pkg[0])
+            ))
+
+        for pkg in downgrade:
+            transactions.append(dict(
+                kind='downgrade', action='downgrade', spec='-'.join(pkg[1]),
+                name=pkg[1][0], version=pkg[1][1],
+                message='{} -> {}'.format('-'.join(pkg[0]), '-'.join(pkg[1])),
+                label='-'.join(pkg[0])
+            ))
+
+        return transactions
+
+    @staticmethod
+    def _apply_sequentially(transactions):
+        """
+        Runs separate YUM command for each transaction.
+        :return: set of specs of failed transactions
+        """
+        failed = set()
+        for transaction in transactions:
+            try:
+                subprocess.check_call(
+                    ['yum', '-y', transaction['action'], transaction['spec']]
+                )
+
+            except subprocess.CalledProcessError:
+                failed.add(transaction['spec'])
+
+        return failed
+
+    def _is_applied(self, transaction, installed):
+        """
+        Checks if package from transaction is installed in requested version.
+        :param transaction: transaction, as returned by _plan()
+        :param installed: dict with names of installed packages as keys and
+        lists of their (version, release) tuples as values
+        """
+        if transaction['name'] not in installed:
+            return False
+
+        versions = installed[transaction['name']]
+        if transaction['version']:
+            return any(
+                _version_matches(transaction['version'], v[0])
+                for v in versions
+            )
+
+        if transaction['kind'] == 'upgrade' and self.available_packages and \
+                transaction['name'] in self.available_packages:
+            max_version = self._get_max_version(transaction['name'])
+            return any(
+                _compare_vr(v, max_version[1:]) >= 0 for v in versions
+            )
+
+        return True
+
+    @staticmethod
+    def _run_yum_shell(transactions):
+        """
+        Runs the given transactions as a single YUM transaction, using YUM
+        shell script.
+        :return: YUM exit code
+        """
+        with tempfile.NamedTemporaryFile(
+                'w', prefix='argo-poem-tools-', suffix='.yumshell'
+        ) as f:
+            for transaction in transactions:
+                f.write(f"{transaction['action']} {transaction['spec']}\n")
+
+            f.write('run\n')
+            f.flush()
+
+            return subprocess.call(['yum', '-y', 'shell', f.name])
+
+    def _apply_batch(self, transactions):
+        """
+        Runs all the transactions in a single YUM transaction. Since YUM does
+        not report which package caused the failure, and dnf shell exits
+        with 0 even if the transaction fails, transactions are checked
+        against the RPM database afterwards, regardless of the exit code.
+        Transactions which were not applied are retried, split in halves
+        recursively if none of them was, so that only the offending packages
+        are left out.
+        :return: set of specs of failed transactions
+        """
+        if not transactions:
+            return set()
+
+        self._run_yum_shell(transactions)
+
+        installed = self.installed.index()
+        not_applied = [
+            transaction for transaction in transactions
+            if not self._is_applied(transaction, installed)
+        ]
+
+        if len(not_applied) == len(transactions) and len(transactions) > 1:
+            middle = len(transactions) // 2
+            return self._apply_batch(transactions[:middle]) | \
+                self._apply_batch(transactions[middle:])
+
+        if not_applied and len(not_applied) < len(transactions):
+            return self._apply_batch(not_applied)
+
+        return set(transaction['spec'] for transaction in not_applied)
+
     def install(self):
         try:
             install, upgrade, downgrade, diff_ver, not_found = self._get()
-            installed = []
-            not_installed = []
-            upgraded = []
-            not_upgraded = []
-            downgraded = []
-            not_downgraded = []
-            not_locked = []
-            if install:
-                for pkg in install:
-                    if len(pkg) == 2:
-                        pkgi = '-'.join(pkg)
-                    else:
-                        pkgi = pkg[0]
+            transactions = self._plan(install, upgrade, downgrade)
 
-                    try:
-                        subprocess.check_call(['yum', '-y', 'install', pkgi])
-                        installed.append(pkgi)
+            # locked packages cannot be upgraded or downgraded
+            if transactions and not self.versions_unlocked:
+                self._unlock_versions()
 
-                    except subprocess.CalledProcessError:
-                        not_installed.append(pkgi)
+            if self.batch:
+                failed = self._apply_batch(transactions)
 
-            if upgrade:
-                for pkg in upgrade:
-                    try:
-                        if len(pkg) == 2:
-                            subprocess.check_call(
-                                ['yum', '-y', 'install', '-'.join(pkg[1])]
-                            )
-                            upgraded.append(
-                                '{} -> {}'.format(
-                                    '-'.join(pkg[0]), '-'.join(pkg[1])
-                                )
-                            )
-
-                        else:
-                            subprocess.check_call(
-                                ['yum', '-y', 'install', '-'.join(pkg[0])]
-                            )
-                            upgraded.append('-'.join(pkg[0]))
+            else:
+                failed = self._apply_sequentially(transactions)
 
-                    except subprocess.CalledProcessError:
-                        not_upgraded.append('-'.join(pkg[0]))
+            results = dict(
+                install=([], []), upgrade=([], []), downgrade=([], [])
+            )
+            for transaction in transactions:
+                done, not_done = results[transaction['kind']]
+                if transaction['spec'] in failed:
+                    not_done.append(transaction['label'])
 
-            if downgrade:
-                for pkg in downgrade:
-                    try:
-                        subprocess.check_call(
-                            ['yum', '-y', 'downgrade', '-'.join(pkg[1])]
-                        )
-                        downgraded.append(
-                            '{} -> {}'.format(
-                                '-'.join(pkg[0]), '-'.join(pkg[1])
-                            )
-                        )
+                else:
+                    done.append(transaction['message'])
 
-                    except subprocess.CalledProcessError:
-                        not_downgraded.append('-'.join(pkg[0]))
+            installed, not_installed = results['install']
+            upgraded, not_upgraded = results['upgrade']
+            downgraded, not_downgraded = results['downgrade']
+            not_locked = []
 
             lock_msg = self._lock_versions()
 
@@ -458,8 +616,6 @@ class Packages:
         try:
             install, upgrade0, downgrade0, diff_ver, not_found = self._get()
 
-            self._lock_versions()
-
             info_msg = []
             warn_msg = []
 
@@ -520,24 +676,21 @@ class Packages:
     def _lock_versions(self):
         self._get_locked_versions()
 
-        installed_pkgs = self._get_installed_packages()
-        installed_names = [pkg['name'] for pkg in installed_pkgs]
-
-        warn = []
-        for item in self._list():
-            if len(item) > 1 and item[0] in installed_names and \
-                    not item[0] in self.locked_versions:
-                try:
-                    subprocess.call(
-                        ['yum', 'versionlock', 'add', item[0]],
-                        stdout=subprocess.PIPE, stderr=subprocess.PIPE
-                    )
+        installed_names = self.installed.names()
+
+        to_lock = [
+            item[0] for item in self._list() if len(item) > 1 and
+            item[0] in installed_names and
+            item[0] not in self.locked_versions
+        ]
 
-                except subprocess.CalledProcessError:
-                    warn.append(item[0])
+        locked, warn = self._versionlock('add', to_lock)
 
         if warn:
             return 'Packages not locked: {}'.format(', '.join(warn))
 
         else:
             return None
+
+    def close(self):
+        self.backend.close()
@@ -1,79 +1,113 @@
-import subprocess
+from concurrent.futures import ThreadPoolExecutor
 
 import requests
 from argo_poem_tools.exceptions import POEMException, MergingException
+from argo_poem_tools.osrelease import get_os
 
 
 def merge_tenants_data(data):
+    """
+    Merges YUM repos data of multiple tenants. Packages of each repo are
+    indexed by name, so that every package is looked up only once.
+    :param data: dict with tenant names as keys and POEM data as values
+    :return: merged data, with packages in each repo sorted by name
+    """
     merged_data = dict()
+    indexes = dict()
+    missing_packages = set()
+    conflicts = list()
 
     for tenant, repos in data.items():
         for name, info in repos.items():
-            if name not in merged_data:
-                merged_data.update({name: info})
-
-            else:
-                if name == "missing_packages":
-                    incoming_missing = set(repos[name])
-                    existing_missing = set(merged_data[name])
-                    merged_data["missing_packages"] = sorted(
-                        list(incoming_missing.union(existing_missing))
-                    )
-
-                else:
-                    existing_packages = merged_data[name]["packages"]
-                    existing_names = [
-                        item["name"] for item in existing_packages
-                    ]
-
-                    for package in info["packages"]:
-                        if package["name"] not in existing_names:
-                            existing_packages.append(package)
-
-                        if (
-                                package["name"] in existing_names and
-                                package not in existing_packages
-                        ):
-                            raise MergingException(
-                                f"Package '{package['name']}' must be the same "
-                                f"version across all tenants"
-                            )
-
-                    merged_data[name]["packages"] = sorted(
-                        existing_packages, key=lambda p: p["name"]
-                    )
+            if name == "missing_packages":
+                merged_data.setdefault(name, None)
+                missing_packages.update(info)
+                continue
+
+            if name not in indexes:
+                merged_data.update({name: dict(info)})
+                indexes.update({name: dict()})
+
+            index = indexes[name]
+            for package in info["packages"]:
+                existing = index.setdefault(package["name"], package)
+                if existing != package and package["name"] not in conflicts:
+                    conflicts.append(package["name"])
+
+    if conflicts:
+        raise MergingException(
+            "; ".join([
+                f"Package '{name}' must be the same version across all "
+                f"tenants" for name in conflicts
+            ])
+        )
+
+    for name, index in indexes.items():
+        merged_data[name]["packages"] = [
+            index[package] for package in sorted(index)
+        ]
+
+    if "missing_packages" in merged_data:
+        merged_data["missing_packages"] = sorted(missing_packages)
 
     return merged_data
 
 
+def fetch_tenants_data(poems, concurrency=1):
+    """
+    Fetches YUM repos data for all the tenants, running at most `concurrency`
+    requests at the same time.
+    :param poems: dict with tenant names as keys and POEM instances as values
+    :param concurrency: maximum number of simultaneous requests
+    :return: dict with tenant names as keys and fetched data as values, in the
+    same order as in `poems`
+    """
+    workers = max(1, min(concurrency, len(poems)))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = dict(
+            (tenant, executor.submit(poem.get_data))
+            for tenant, poem in poems.items()
+        )
+
+    data = dict()
+    errors = list()
+    for tenant, future in futures.items():
+        try:
+            data.update({tenant: future.result()})
+
+        except POEMException as e:
+            errors.append(f"{tenant}: {e.msg}")
+
+        except requests.exceptions.RequestException as e:
+            errors.append(f"{tenant}: {str(e)}")
+
+    if errors:
+        raise POEMException("; ".join(errors))
+
+    return data
+
+
 class POEM:
-    def __init__(self, hostname, token, profiles):
+    def __init__(
+            self, hostname, token, profiles, sessions=None, cache=None,
+            os_name=None
+    ):
         self.hostname = hostname
         self.token = token
         self.profiles = profiles
+        self.sessions = sessions
+        self.cache = cache
+        self.os_name = os_name
         self.missing_packages = None
+        self.stale = None
 
-    @staticmethod
-    def _get_os():
-        string = subprocess.check_output(["cat", "/etc/os-release"])
+    def _get_os(self):
+        if self.os_name:
+            return self.os_name
 
-        string = string.decode('utf-8')
+        return get_os()
 
-        string_list = string.split("\n")
-
-        name = [
-            line.split("=")[1].lower().split(" ")[0].replace('"', "") for line
-            in string_list if line.startswith("NAME")
-        ][0]
-
-        version = [
-            line.split("=")[1].split(".")[0].replace('"', "") for
-            line in string_list if line.startswith("VERSION_ID")
-        ][0]
-
-        return f"{name}{version}"
-
-    def _build_url(self):
+    def _get_hostname(self):
         hostname = self.hostname
         if hostname.startswith('https://'):
             hostname = hostname[8:]
@@ -84,32 +118,104 @@ class POEM:
         if hostname.endswith('/'):
             hostname = hostname[0:-1]
 
+        return hostname
+
+    def _build_url(self):
         repos = "repos"
 
-        return f"https://{hostname}/api/v2/{repos}/{self._get_os()}"
+        return (
+            f"https://{self._get_hostname()}/api/v2/{repos}/{self._get_os()}"
+        )
 
     def _refine_list_of_profiles(self):
         return f"[{', '.join(self.profiles)}]"
 
+    def _parse(self, data_json):
+        missing_packages_internal = list()
+
+        data = data_json["data"]
+
+        self.missing_packages = sorted(
+            list(set(
+                data_json['missing_packages'] + missing_packages_internal
+            ))
+        )
+
+        return data
+
+    def _serve_stale(self, cached, reason):
+        self.cache.stale_hit()
+        self.stale = reason
+
+        return self._parse(cached["body"])
+
     def get_data(self):
         headers = {
             'x-api-key': self.token,
             'profiles': self._refine_list_of_profiles()
         }
-        response = requests.get(self._build_url(), headers=headers, timeout=180)
+        if self.sessions:
+            session = self.sessions.get(self._get_hostname())
 
-        missing_packages_internal = list()
+        else:
+            session = requests
+
+        cache_key = None
+        cached = None
+        timeout = 180
+        if self.cache:
+            cache_key = self.cache.key(
+                self._get_hostname(), self._get_os(), self.profiles
+            )
+            cached = self.cache.get(cache_key)
+            if cached:
+                if cached.get("etag"):
+                    headers.update({'If-None-Match': cached["etag"]})
+
+                if cached.get("last_modified"):
+                    headers.update(
+                        {'If-Modified-Since': cached["last_modified"]}
+                    )
 
-        if response.status_code == 200:
-            data_json = response.json()
-            data = data_json["data"]
+        stale_usable = bool(self.cache and self.cache.usable_if_stale(cached))
+        if stale_usable:
+            timeout = self.cache.latency_budget
 
-            self.missing_packages = sorted(
-                list(set(
-                    data_json['missing_packages'] + missing_packages_internal
-                ))
+        try:
+            response = session.get(
+                self._build_url(), headers=headers, timeout=timeout
             )
 
+        except requests.exceptions.RequestException as e:
+            if stale_usable:
+                return self._serve_stale(cached, str(e))
+
+            raise
+
+        if response.status_code == 304 and cached:
+            self.cache.hit()
+            self.cache.store(
+                cache_key, cached["body"],
+                etag=response.headers.get('ETag', cached.get("etag")),
+                last_modified=response.headers.get(
+                    'Last-Modified', cached.get("last_modified")
+                )
+            )
+
+            return self._parse(cached["body"])
+
+        elif response.status_code == 200:
+            data_json = response.json()
+            data = self._parse(data_json)
+
+            if self.cache:
+                self.cache.miss()
+                self.cache.store(
+                    cache_key, data_json,
+                    etag=response.headers.get('ETag'),
+                    last_modified=response.headers.get('Last-Modified')
+                )
+
             return data
 
         else:
@@ -121,4 +227,7 @@ class POEM:
             except (ValueError, TypeError, KeyError):
                 pass
 
+            if stale_usable and response.status_code >= 500:
+                return self._serve_stale(cached, msg)
+
             raise POEMException(msg)
@@ -0,0 +1,277 @@
+import bz2
+import configparser
+import glob
+import gzip
+import lzma
+import os
+import sqlite3
+import time
+import xml.etree.ElementTree as ET
+from re import compile
+
+from argo_poem_tools.exceptions import MetadataException
+
+CACHE_DIRS = [
+    # dnf: <cachedir>/<repoid>-<hash>/repodata/repomd.xml
+    "/var/cache/dnf/{repo_id}-*/repodata/repomd.xml",
+    # yum: <cachedir>/<basearch>/<releasever>/<repoid>/repomd.xml
+    "/var/cache/yum/*/*/{repo_id}/repomd.xml"
+]
+
+_REPO_NS = "{http://linux.duke.edu/metadata/repo}"
+_COMMON_NS = "{http://linux.duke.edu/metadata/common}"
+
+_dnf_dir_re = compile(r'^(.+)-[0-9a-f]{16}$')
+_expire_re = compile(r'^(-?[0-9]+)\s*([dhms]?)$')
+
+_expire_units = {"": 1, "s": 1, "m": 60, "h": 60 * 60, "d": 24 * 60 * 60}
+
+# yum-plugin-priorities' and dnf's default repo priority
+DEFAULT_PRIORITY = 99
+
+_FILTER_OPTIONS = ["exclude", "excludepkgs", "includepkgs"]
+
+_openers = {
+    ".gz": gzip.open,
+    ".bz2": bz2.open,
+    ".xz": lzma.open
+}
+
+
+def _repo_dir_matches(repomd, repo_id):
+    """
+    Checks that repomd.xml found by glob belongs to the repo, and not to
+    another repo whose ID starts with the same string.
+    """
+    for part in repomd.split(os.sep):
+        match = _dnf_dir_re.match(part)
+        if match and part.startswith(f"{repo_id}-"):
+            return match.group(1) == repo_id
+
+    return True
+
+
+def parse_expire(value):
+    """
+    Parses metadata_expire option, given in seconds, or with d, h or m
+    suffix, or as never.
+    :param value: option value
+    :return: expire time in seconds, or None if metadata never expires
+    :raise: ValueError if the value cannot be parsed
+    """
+    value = value.strip().lower()
+    if value == "never":
+        return None
+
+    match = _expire_re.match(value)
+    if not match:
+        raise ValueError(f"Invalid metadata_expire value: {value}")
+
+    seconds = int(match.group(1)) * _expire_units[match.group(2)]
+    if seconds < 0:
+        return None
+
+    return seconds
+
+
+def read_repo_options(content, default_expire=None):
+    """
+    Reads options of repo or yum config file which decide what yum sees as
+    available: metadata_expire, priority and package filters (exclude,
+    excludepkgs, includepkgs). Options with invalid values get defaults.
+    :param content: content of the file
+    :param default_expire: expire time used if metadata_expire is not set
+    :return: dict with section names as keys and dicts with keys expire
+    (in seconds, None if metadata never expires), priority and filtered
+    (True if any package filter is set) as values, or None if the file
+    cannot be parsed
+    """
+    parser = configparser.ConfigParser(interpolation=None, strict=False)
+    try:
+        parser.read_string(content)
+
+    except configparser.Error:
+        return None
+
+    options = dict()
+    for section in parser.sections():
+        expire = default_expire
+        if parser.has_option(section, "metadata_expire"):
+            try:
+                expire = parse_expire(parser.get(section, "metadata_expire"))
+
+            except ValueError:
+                pass
+
+        try:
+            priority = int(parser.get(section, "priority"))
+
+        except (configparser.NoOptionError, ValueError):
+            priority = DEFAULT_PRIORITY
+
+        filtered = any(
+            parser.get(section, option, fallback="").strip()
+            for option in _FILTER_OPTIONS
+        )
+
+        options.update({
+            section: dict(expire=expire, priority=priority, filtered=filtered)
+        })
+
+    return options
+
+
+def find_repomd(repo_id, cache_dirs=None):
+    """
+    Finds repomd.xml of the repo in yum or dnf cache.
+    :param repo_id: repository ID
+    :param cache_dirs: list of glob patterns with {repo_id} placeholder
+    :return: path to the most recent repomd.xml, or None if not cached
+    """
+    if cache_dirs is None:
+        cache_dirs = CACHE_DIRS
+
+    found = []
+    for pattern in cache_dirs:
+        for path in glob.glob(pattern.format(repo_id=glob.escape(repo_id))):
+            if _repo_dir_matches(path, repo_id):
+                found.append(path)
+
+    if not found:
+        return None
+
+    return max(found, key=os.path.getmtime)
+
+
+def metadata_age(repomd):
+    """
+    Get age of cached metadata, i.e. time since yum last downloaded or
+    checked it.
+    :param repomd: path to repomd.xml
+    :return: age in seconds
+    """
+    checked = os.path.getmtime(repomd)
+    cookie = os.path.join(os.path.dirname(repomd), "cachecookie")
+    if os.path.exists(cookie):
+        checked = max(checked, os.path.getmtime(cookie))
+
+    return time.time() - checked
+
+
+def _primary_locations(repomd):
+    locations = dict()
+    tree = ET.parse(repomd)
+    for data in tree.getroot().iter(f"{_REPO_NS}data"):
+        location = data.find(f"{_REPO_NS}location")
+        if location is not None:
+            locations.update({data.get("type"): location.get("href")})
+
+    return locations
+
+
+def _candidates(repomd, kind, href):
+    repodir = os.path.dirname(repomd)
+    paths = [
+        # dnf keeps the repodata/ subdirectory, yum keeps just the file names
+        os.path.join(os.path.dirname(repodir), href),
+        os.path.join(repodir, os.path.basename(href))
+    ]
+    for path in list(paths):
+        base, ext = os.path.splitext(path)
+        if ext in _openers:
+            # older yum keeps decompressed copy next to the compressed file
+            paths.append(base)
+
+    if kind == "primary_db":
+        # yum on EL7 keeps decompressed database in gen/ subdirectory, and
+        # does not download the XML file at all
+        paths.insert(0, os.path.join(repodir, "gen", f"{kind}.sqlite"))
+
+    return paths
+
+
+def _read_sqlite(path, names):
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        pkgs = []
+        names = list(names)
+        for i in range(0, len(names), 500):
+            chunk = names[i:i + 500]
+            rows = conn.execute(
+                "SELECT name, epoch, version, release, arch FROM packages "
+                f"WHERE name IN ({', '.join('?' * len(chunk))})",
+                chunk
+            )
+            for name, epoch, version, release, arch in rows:
+                if arch == "src":
+                    continue
+
+                if epoch not in (None, "", "0"):
+                    version = f"{epoch}:{version}"
+
+                pkgs.append(dict(name=name, version=version, release=release))
+
+        return pkgs
+
+    finally:
+        conn.close()
+
+
+def _read_xml(path, names):
+    opener = _openers.get(os.path.splitext(path)[1], open)
+    pkgs = []
+    with opener(path, "rb") as f:
+        for event, elem in ET.iterparse(f):
+            if elem.tag != f"{_COMMON_NS}package":
+                continue
+
+            name = elem.findtext(f"{_COMMON_NS}name")
+            arch = elem.findtext(f"{_COMMON_NS}arch")
+            ver = elem.find(f"{_COMMON_NS}version")
+            if name in names and arch != "src" and ver is not None:
+                version = ver.get("ver")
+                if ver.get("epoch") not in (None, "", "0"):
+                    version = f"{ver.get('epoch')}:{version}"
+
+                pkgs.append(
+                    dict(name=name, version=version, release=ver.get("rel"))
+                )
+
+            # packages are not needed once read, so memory stays flat
+            elem.clear()
+
+    return pkgs
+
+
+def read_available(repomd, names):
+    """
+    Reads available versions of the given packages from the repo's cached
+    primary metadata, preferring the sqlite database over the XML file.
+    :param repomd: path to repomd.xml
+    :param names: set of package names
+    :return: list of dicts with keys name, version and release
+    """
+    try:
+        locations = _primary_locations(repomd)
+        for kind, reader in [
+            ("primary_db", _read_sqlite), ("primary", _read_xml)
+        ]:
+            if kind not in locations:
+                continue
+
+            for path in _candidates(repomd, kind, locations[kind]):
+                if not os.path.isfile(path):
+                    continue
+
+                if reader is _read_sqlite and \
+                        os.path.splitext(path)[1] in _openers:
+                    continue
+
+                return reader(path, names)
+
+    except (
+            OSError, EOFError, ET.ParseError, sqlite3.Error, lzma.LZMAError
+    ) as e:
+        raise MetadataException(f"Unable to read metadata of {repomd}: {e}")
+
+    raise MetadataException(f"No primary metadata cached for {repomd}")
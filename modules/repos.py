@@ -1,44 +1,364 @@
+import errno
+import hashlib
+import json
 import os
 import shutil
+import stat
 import subprocess
+import tempfile
+from re import compile
+
+_section_re = compile(r'^\s*\[([^\]]+)\]\s*$')
+
+
+def get_repo_ids(content):
+    """
+    Get IDs of repositories defined in repo file.
+    :param content: content of the repo file
+    :return: list of repo IDs, in order of appearance
+    """
+    ids = []
+    for line in content.split('\n'):
+        match = _section_re.match(line)
+        if match and match.group(1).strip() != 'main':
+            ids.append(match.group(1).strip())
+
+    return ids
+
+
+def _hash(content):
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+def _read(filename):
+    try:
+        with open(filename) as f:
+            return f.read()
+
+    except IOError:
+        return None
+
+
+def _fsync_dir(directory):
+    dir_fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+
+    finally:
+        os.close(dir_fd)
+
+
+def _write(filename, content):
+    """
+    Writes the file atomically: content is written to a temporary file in
+    the same directory, synced to disk, and renamed over the original, so
+    that YUM never sees a partially written repo file.
+    """
+    directory = os.path.dirname(filename)
+    fd, tmp = tempfile.mkstemp(
+        dir=directory, prefix='.' + os.path.basename(filename),
+        suffix='.tmp'
+    )
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+
+        try:
+            mode = stat.S_IMODE(os.stat(filename).st_mode)
+
+        except OSError:
+            mode = 0o644
+
+        os.chmod(tmp, mode)
+        os.replace(tmp, filename)
+
+    except Exception:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+        raise
+
+    _fsync_dir(directory)
+
+
+def _journal(backup_dir):
+    return os.path.join(backup_dir, 'journal.json')
+
+
+def _read_journal(backup_dir):
+    try:
+        with open(_journal(backup_dir)) as f:
+            files = json.load(f)['files']
+
+    except (IOError, ValueError, KeyError, TypeError):
+        return dict()
+
+    if not isinstance(files, dict):
+        return dict()
+
+    return files
+
+
+def _restore_file(backup, target):
+    """
+    Puts backup in place of the target file atomically, by renaming it, or,
+    if they are on different filesystems, by copying it next to the target
+    first.
+    """
+    try:
+        os.replace(backup, target)
+
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+
+        fd, tmp = tempfile.mkstemp(
+            dir=os.path.dirname(target),
+            prefix='.' + os.path.basename(target), suffix='.tmp'
+        )
+        os.close(fd)
+        try:
+            shutil.copy2(backup, tmp)
+            os.replace(tmp, target)
+
+        except Exception:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+            raise
+
+        os.remove(backup)
+
+    _fsync_dir(os.path.dirname(target))
+
+
+def restore_backup(backup_dir):
+    """
+    Restores repo files backed up by YUMRepos, as recorded in the backup
+    journal. Each file is replaced atomically, and restore can be repeated,
+    so a restore interrupted by a crash is finished by calling this again.
+    :param backup_dir: directory with backups and the journal
+    :return: sorted list of restored files
+    """
+    files = _read_journal(backup_dir)
+
+    restored = []
+    for target, name in sorted(files.items()):
+        backup = os.path.join(backup_dir, name)
+        if os.path.isfile(backup):
+            _restore_file(backup, target)
+            restored.append(target)
+
+    if os.path.isdir(backup_dir):
+        # journal goes last, anything else left is from interrupted backup
+        for name in os.listdir(backup_dir):
+            if name != os.path.basename(_journal(backup_dir)):
+                os.remove(os.path.join(backup_dir, name))
+
+        if os.path.exists(_journal(backup_dir)):
+            os.remove(_journal(backup_dir))
+
+    return restored
 
 
 class YUMRepos:
-    def __init__(self, data, repos_path='/etc/yum.repos.d', override=True):
+    def __init__(
+            self, data, repos_path='/etc/yum.repos.d', override=True,
+            manifest=None, backup_dir='/var/lib/argo-poem-tools/backup'
+    ):
+        """
+        :param data: merged POEM data
+        :param repos_path: directory with repo files
+        :param override: if False, existing repo files are backed up, and
+        restored by clean()
+        :param backup_dir: private directory in which repo files are backed
+        up, together with the journal of backed up files
+        :param manifest: file in which the repo files created by the tool are
+        recorded, together with their hashes; if None, no record is kept
+        """
         self.data = data
         self.path = repos_path
         self.override = override
+        self.manifest = manifest
+        self.backup_dir = backup_dir
         self.missing_packages = None
+        self.changed_repo_ids = []
+        self._owned = dict()
+
+    def _backup(self, filename):
+        """
+        Backs up the existing file as a hardlink in the backup directory, so
+        nothing is copied: the file itself is later replaced by rename, which
+        leaves the original inode intact. The file is recorded in the journal
+        before it is changed, so that it can be restored after a crash.
+        """
+        if not os.path.isfile(filename):
+            return
+
+        journal = _read_journal(self.backup_dir)
+        if filename in journal:
+            return
+
+        os.makedirs(self.backup_dir, mode=0o700, exist_ok=True)
+        os.chmod(self.backup_dir, 0o700)
+
+        name = '{}-{}'.format(
+            _hash(filename)[0:16], os.path.basename(filename)
+        )
+        backup = os.path.join(self.backup_dir, name)
+        if os.path.exists(backup):
+            os.remove(backup)
+
+        try:
+            os.link(filename, backup)
+
+        except OSError:
+            # different filesystem, or hardlinks not supported
+            fd, tmp = tempfile.mkstemp(dir=self.backup_dir, suffix='.tmp')
+            os.close(fd)
+            shutil.copy2(filename, tmp)
+            os.replace(tmp, backup)
+
+        _fsync_dir(self.backup_dir)
+
+        journal.update({filename: name})
+        _write(_journal(self.backup_dir), json.dumps({'files': journal}))
 
     def create_file(self):
-        files = []
+        """
+        Creates repo files from POEM data. Files whose content on disk is
+        already the same are not written at all.
+        :return: dict with keys created, changed and unchanged, and sorted
+        lists of file names as values
+        """
+        files = dict(created=[], changed=[], unchanged=[])
         for key, value in self.data.items():
             title = key
             filename = os.path.join(self.path, title + '.repo')
             content = value['content']
 
-            files.append(filename)
+            current = _read(filename)
+            if current is None:
+                status = 'created'
+
+            elif _hash(current) == _hash(content):
+                status = 'unchanged'
+
+            else:
+                status = 'changed'
+
+            files[status].append(filename)
+            self._owned.update({filename: _hash(content)})
+
+            if status == 'unchanged':
+                continue
 
             if not self.override:
-                os.makedirs('/tmp' + self.path, exist_ok=True)
-                if os.path.isfile(filename):
-                    shutil.copyfile(filename, '/tmp' + filename)
+                self._backup(filename)
+
+            for repo_id in get_repo_ids(content):
+                if repo_id not in self.changed_repo_ids:
+                    self.changed_repo_ids.append(repo_id)
+
+            _write(filename, content)
+
+        for status in files:
+            files[status].sort()
+
+        return files
+
+    def _read_manifest(self):
+        try:
+            with open(self.manifest) as f:
+                files = json.load(f)['files']
+
+        except (IOError, ValueError, KeyError, TypeError):
+            return dict()
+
+        if not isinstance(files, dict):
+            return dict()
+
+        return files
+
+    def prune(self, dry_run=False):
+        """
+        Removes repo files which were created by the tool on previous runs,
+        but are no longer in POEM data. Files which have been modified since
+        the tool wrote them are not removed, only forgotten. Manifest is
+        updated with the files created from the current data.
+        :param dry_run: if True, files are only reported, and manifest is
+        left as it is
+        :return: sorted list of removed (or to be removed) files
+        """
+        if not self.manifest or not self.override:
+            return []
+
+        recorded = self._read_manifest()
+        owned = dict(self._owned)
+
+        pruned = []
+        for filename, digest in sorted(recorded.items()):
+            if filename in owned or \
+                    os.path.dirname(filename) != self.path.rstrip(os.sep):
+                continue
+
+            current = _read(filename)
+            if current is None or _hash(current) != digest:
+                continue
+
+            if not dry_run:
+                os.remove(filename)
+
+            pruned.append(filename)
+
+        if dry_run:
+            return pruned
+
+        try:
+            os.makedirs(os.path.dirname(self.manifest), exist_ok=True)
+            _write(
+                self.manifest, json.dumps({'files': owned}, sort_keys=True)
+            )
+
+        except OSError:
+            # without manifest, stale files are just not pruned next time
+            pass
 
-            with open(filename, 'w') as f:
-                f.write(content)
+        return pruned
 
-        return sorted(files)
+    @staticmethod
+    def expire_cache(repo_ids):
+        """
+        Marks cached metadata of the given repos as expired, so that YUM
+        checks them again on next use. Cache of other repos is kept.
+        :param repo_ids: list of repo IDs
+        """
+        if repo_ids:
+            subprocess.call([
+                'yum', 'clean', 'expire-cache', '--disablerepo=*',
+                '--enablerepo={}'.format(','.join(sorted(set(repo_ids))))
+            ])
 
-    def clean(self):
+    def clean(self, clean_all=False):
+        """
+        Restores backed up repo files, if there are any, and expires cached
+        metadata of the restored repos.
+        :param clean_all: if True, whole YUM cache is cleaned instead
+        """
+        restored_repo_ids = []
         if not self.override:
-            tmp_dir = '/tmp' + self.path
-            if os.path.isdir(tmp_dir):
-                src_files = os.listdir(tmp_dir)
-                for file in src_files:
-                    full_filename = os.path.join(tmp_dir, file)
-                    if os.path.isfile(full_filename):
-                        shutil.copy(full_filename, self.path)
+            for filename in restore_backup(self.backup_dir):
+                restored_repo_ids.extend(get_repo_ids(_read(filename) or ''))
+                title = os.path.splitext(os.path.basename(filename))[0]
+                if title in self.data:
+                    restored_repo_ids.extend(
+                        get_repo_ids(self.data[title]['content'])
+                    )
 
-                shutil.rmtree(tmp_dir)
+        if clean_all:
+            subprocess.call(['yum', 'clean', 'all'])
 
-        subprocess.call(['yum', 'clean', 'all'])
+        else:
+            self.expire_cache(restored_repo_ids)
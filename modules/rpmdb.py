@@ -0,0 +1,77 @@
+import os
+
+RPMDB_PATH = "/var/lib/rpm"
+
+# database files proper: BerkeleyDB (EL7, EL8), sqlite (EL9) and ndb; lock,
+# region, shared memory and journal files are changed even by read-only
+# queries, so they are left out
+RPMDB_FILES = ["Packages", "rpmdb.sqlite", "Packages.db"]
+
+
+def rpmdb_cookie(path=RPMDB_PATH):
+    """
+    Builds cookie which changes whenever RPM database is modified, from the
+    names, modification times and sizes of the database files.
+    :param path: RPM database directory
+    :return: tuple which can be compared with the previous cookie, or None if
+    the database cannot be found
+    """
+    cookie = []
+    for name in RPMDB_FILES:
+        try:
+            stat = os.stat(os.path.join(path, name))
+
+        except OSError:
+            continue
+
+        cookie.append((name, stat.st_mtime_ns, stat.st_size))
+
+    if not cookie:
+        return None
+
+    return tuple(cookie)
+
+
+class InstalledPackages:
+    """
+    Snapshot of installed packages, indexed by name. The packages are loaded
+    once, and loaded again only when RPM database changes. If the database
+    cannot be found, the packages are loaded on every access.
+    """
+    def __init__(self, loader, rpmdb_path=RPMDB_PATH):
+        """
+        :param loader: callable returning list of dicts with keys name,
+        version and release of all the installed packages
+        :param rpmdb_path: RPM database directory
+        """
+        self.loader = loader
+        self.rpmdb_path = rpmdb_path
+        self._cookie = None
+        self._index = None
+
+    def _refresh(self):
+        cookie = rpmdb_cookie(self.rpmdb_path)
+        if self._index is None or cookie is None or cookie != self._cookie:
+            index = dict()
+            for pkg in self.loader():
+                index.setdefault(pkg['name'], []).append(
+                    (pkg['version'], pkg['release'])
+                )
+
+            self._index = index
+            self._cookie = cookie
+
+    def invalidate(self):
+        self._cookie = None
+        self._index = None
+
+    def index(self):
+        """
+        :return: dict with package names as keys and lists of installed
+        (version, release) tuples as values
+        """
+        self._refresh()
+        return self._index
+
+    def names(self):
+        return set(self.index().keys())
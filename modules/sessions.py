@@ -0,0 +1,44 @@
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class HTTPSessions:
+    """
+    Keep-alive HTTP sessions shared between POEM requests, one per host, so
+    that tenants on the same POEM host reuse the already opened connections.
+    """
+    def __init__(self, pool_size=10):
+        self.pool_size = pool_size
+        self._sessions = dict()
+        self._lock = threading.Lock()
+
+    def _create(self):
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=1, pool_maxsize=self.pool_size
+        )
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+
+        return session
+
+    def get(self, hostname):
+        """
+        Returns session for the given host, creating it if necessary.
+        :param hostname: POEM hostname
+        :return: requests.Session instance
+        """
+        with self._lock:
+            if hostname not in self._sessions:
+                self._sessions.update({hostname: self._create()})
+
+            return self._sessions[hostname]
+
+    def close(self):
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+
+            self._sessions = dict()
@@ -0,0 +1,124 @@
+import os
+import subprocess
+from re import compile
+
+VERSIONLOCK_LISTS = [
+    "/etc/dnf/plugins/versionlock.list",
+    "/etc/yum/pluginconf.d/versionlock.list"
+]
+
+# matches both yum (E:N-V-R.A) and dnf (N-E:V-R.A) style entries
+_entry_re = compile(
+    r'^(?:(\d+):)?(\S+)-(?:(\d+):)?([^-:\s]+)-([^-\s]+)\.([^.\s]+)$'
+)
+
+
+def parse_entry(line):
+    """
+    Parses single version lock entry.
+    :param line: entry from version lock list
+    :return: (name, epoch, version, release, arch) tuple, or None if the line
+    is not a version lock (comment, exclude or command output noise)
+    """
+    line = line.strip()
+    if not line or line.startswith('#') or line.startswith('!'):
+        return None
+
+    match = _entry_re.match(line)
+    if not match:
+        return None
+
+    epoch1, name, epoch2, version, release, arch = match.groups()
+
+    return name, epoch1 or epoch2 or '0', version, release, arch
+
+
+def find_list(paths=None):
+    """
+    Finds versionlock plugin's list file.
+    :param paths: candidate paths, VERSIONLOCK_LISTS by default
+    :return: path to the first existing list file, or None
+    """
+    for path in VERSIONLOCK_LISTS if paths is None else paths:
+        if os.path.isfile(path):
+            return path
+
+    return None
+
+
+def list_signature(paths=None):
+    """
+    Builds signature which changes whenever version locks are modified.
+    :param paths: candidate paths, VERSIONLOCK_LISTS by default
+    :return: (path, mtime_ns, size) tuple, or None if there is no list file
+    """
+    path = find_list(paths)
+    if not path:
+        return None
+
+    try:
+        stat = os.stat(path)
+
+    except OSError:
+        return None
+
+    return path, stat.st_mtime_ns, stat.st_size
+
+
+class VersionLocks:
+    """
+    Set of version lock entries, parsed from the versionlock plugin's list
+    file and reparsed only when the file changes. If there is no list file,
+    `yum versionlock list` output is parsed instead, and the entries are kept
+    until invalidate() is called.
+    """
+    def __init__(self, paths=None):
+        self.paths = VERSIONLOCK_LISTS if paths is None else paths
+        self._signature = None
+        self._entries = None
+        self._names = None
+
+    def _load(self, lines):
+        entries = set()
+        for line in lines:
+            entry = parse_entry(line)
+            if entry:
+                entries.add(entry)
+
+        self._entries = entries
+        self._names = set(entry[0] for entry in entries)
+
+    def _refresh(self):
+        signature = list_signature(self.paths)
+        if signature:
+            if signature != self._signature:
+                with open(signature[0]) as f:
+                    self._load(f)
+
+                self._signature = signature
+
+        elif self._entries is None or self._signature is not None:
+            output = subprocess.check_output(
+                ['yum', 'versionlock', 'list']
+            ).decode('utf-8')
+            self._load(output.split('\n'))
+            self._signature = None
+
+    def invalidate(self):
+        self._signature = None
+        self._entries = None
+        self._names = None
+
+    def entries(self):
+        """
+        :return: set of (name, epoch, version, release, arch) tuples
+        """
+        self._refresh()
+        return self._entries
+
+    def names(self):
+        """
+        :return: set of names of packages with locked versions
+        """
+        self._refresh()
+        return self._names
@@ -0,0 +1,120 @@
+import sys
+import unittest
+from unittest import mock
+
+from argo_poem_tools.backends import DNFBackend, MetadataBackend, \
+    SubprocessBackend, _repoquery_command, get_backend
+
+
+class FakeHeader(dict):
+    pass
+
+
+class BackendTests(unittest.TestCase):
+    @mock.patch('argo_poem_tools.backends.shutil.which')
+    @mock.patch('argo_poem_tools.backends.uses_dnf')
+    def test_repoquery_command(self, mock_dnf, mock_which):
+        mock_dnf.return_value = True
+        self.assertEqual(_repoquery_command()[0:2], ['dnf', 'repoquery'])
+        mock_dnf.return_value = False
+        mock_which.return_value = '/usr/bin/repoquery'
+        self.assertEqual(
+            _repoquery_command(), ['repoquery', '--show-duplicates']
+        )
+        mock_which.return_value = None
+        self.assertIsNone(_repoquery_command())
+
+    @mock.patch.dict(sys.modules, {'dnf': None, 'rpm': None})
+    def test_get_backend_without_bindings(self):
+        backend = get_backend()
+        self.assertIsInstance(backend, MetadataBackend)
+        self.assertIsInstance(backend.fallback, SubprocessBackend)
+
+    @mock.patch.dict(sys.modules, {'dnf': mock.Mock(), 'rpm': mock.Mock()})
+    def test_get_backend_with_bindings(self):
+        self.assertIsInstance(get_backend(), DNFBackend)
+
+
+class DNFBackendTests(unittest.TestCase):
+    def setUp(self):
+        self.dnf = mock.Mock()
+        self.rpm = mock.Mock()
+        with mock.patch.dict(sys.modules, {'dnf': self.dnf, 'rpm': self.rpm}):
+            self.backend = DNFBackend()
+
+    def test_installed(self):
+        ts = self.rpm.TransactionSet.return_value
+        ts.dbMatch.side_effect = [
+            [
+                FakeHeader(
+                    name=b'nagios-plugins-argo', epoch=None,
+                    version=b'0.1.12', release=b'1.el7'
+                )
+            ],
+            [
+                FakeHeader(
+                    name=b'nagios-plugins-http', epoch=1, version=b'2.3.3',
+                    release=b'2.el7'
+                )
+            ]
+        ]
+        self.assertEqual(
+            self.backend.installed(
+                ['nagios-plugins-argo', 'nagios-plugins-http']
+            ),
+            [
+                dict(name='nagios-plugins-argo', version='0.1.12',
+                     release='1.el7'),
+                dict(name='nagios-plugins-http', version='1:2.3.3',
+                     release='2.el7')
+            ]
+        )
+        self.assertEqual(ts.dbMatch.call_count, 2)
+        ts.dbMatch.assert_called_with('name', 'nagios-plugins-http')
+        ts.closeDB.assert_called_once()
+
+    def test_installed_nothing_requested(self):
+        self.assertEqual(self.backend.installed([]), [])
+        self.assertFalse(self.rpm.TransactionSet.called)
+
+    def test_available(self):
+        repo1 = mock.Mock(id='argo-devel')
+        repo2 = mock.Mock(id='base')
+        base = self.dnf.Base.return_value
+        base.repos.all.return_value = [repo1, repo2]
+        query = base.sack.query.return_value.available.return_value.filter
+        pkg1 = mock.Mock(epoch=0, version='0.1.12', release='1.el7')
+        pkg2 = mock.Mock(epoch=1, version='0.1.13', release='1.el7')
+        # name is Mock's own constructor argument, so it is set afterwards
+        pkg1.name = 'nagios-plugins-argo'
+        pkg2.name = 'nagios-plugins-argo'
+        query.return_value = [pkg1, pkg2]
+        self.assertEqual(
+            list(self.backend.available(
+                ['nagios-plugins-argo'], ['argo-devel']
+            )),
+            [
+                dict(name='nagios-plugins-argo', version='0.1.12',
+                     release='1.el7'),
+                dict(name='nagios-plugins-argo', version='1:0.1.13',
+                     release='1.el7')
+            ]
+        )
+        repo1.enable.assert_called_once()
+        repo2.disable.assert_called_once()
+        base.fill_sack.assert_called_once_with(load_system_repo=False)
+        query.assert_called_once_with(
+            name=['nagios-plugins-argo'], arch__neq='src'
+        )
+
+    def test_available_loads_sack_once(self):
+        base = self.dnf.Base.return_value
+        base.repos.all.return_value = []
+        query = base.sack.query.return_value.available.return_value.filter
+        query.return_value = []
+        list(self.backend.available(['nagios-plugins-argo'], ['argo-devel']))
+        list(self.backend.available(['nagios-plugins-http'], ['argo-devel']))
+        self.assertEqual(self.dnf.Base.call_count, 1)
+        self.assertEqual(base.fill_sack.call_count, 1)
+        self.backend.close()
+        base.close.assert_called_once()
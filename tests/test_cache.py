@@ -0,0 +1,99 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from argo_poem_tools.cache import ResponseCache
+
+from test_poem import mock_data
+
+
+class ResponseCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'cache')
+        self.cache = ResponseCache(path=self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_key(self):
+        key1 = ResponseCache.key(
+            'mock.url.com', 'rocky9', ['TEST_PROFILE1', 'TEST_PROFILE2']
+        )
+        key2 = ResponseCache.key(
+            'mock.url.com', 'rocky9', ['TEST_PROFILE2', 'TEST_PROFILE1']
+        )
+        key3 = ResponseCache.key('mock.url.com', 'centos7', ['TEST_PROFILE1'])
+        key4 = ResponseCache.key('mock2.url.com', 'rocky9', ['TEST_PROFILE1'])
+        self.assertEqual(key1, key2)
+        self.assertNotEqual(key1, key3)
+        self.assertNotEqual(key3, key4)
+
+    def test_get_missing(self):
+        self.assertIsNone(self.cache.get('mock-key'))
+
+    @mock.patch('argo_poem_tools.cache.time.time')
+    def test_store_and_get(self, mock_time):
+        mock_time.return_value = 1700000000.0
+        self.cache.store(
+            'mock-key', mock_data, etag='"abc"',
+            last_modified='Mon, 13 Nov 2023 10:00:00 GMT'
+        )
+        self.assertEqual(
+            self.cache.get('mock-key'), {
+                'etag': '"abc"',
+                'last_modified': 'Mon, 13 Nov 2023 10:00:00 GMT',
+                'timestamp': 1700000000.0,
+                'body': mock_data
+            }
+        )
+        self.assertEqual(os.listdir(self.path), ['mock-key.json'])
+
+    def test_get_corrupted(self):
+        os.makedirs(self.path)
+        with open(os.path.join(self.path, 'mock-key.json'), 'w') as f:
+            f.write('{"body": ')
+
+        self.assertIsNone(self.cache.get('mock-key'))
+
+        with open(os.path.join(self.path, 'mock-key.json'), 'w') as f:
+            json.dump({'etag': '"abc"'}, f)
+
+        self.assertIsNone(self.cache.get('mock-key'))
+
+    @mock.patch('argo_poem_tools.cache.os.makedirs')
+    def test_store_if_not_writable(self, mock_mkdir):
+        mock_mkdir.side_effect = PermissionError('Permission denied')
+        self.cache.store('mock-key', mock_data)
+        self.assertIsNone(self.cache.get('mock-key'))
+
+    @mock.patch('argo_poem_tools.cache.time.time')
+    def test_usable_if_stale(self, mock_time):
+        mock_time.return_value = 1700003600.0
+        entry = {
+            'etag': None,
+            'last_modified': None,
+            'timestamp': 1700000000.0,
+            'body': mock_data
+        }
+        self.assertFalse(self.cache.usable_if_stale(entry))
+
+        cache = ResponseCache(path=self.path, max_staleness=7200)
+        self.assertTrue(cache.usable_if_stale(entry))
+        self.assertFalse(cache.usable_if_stale(None))
+        self.assertFalse(cache.usable_if_stale({'body': mock_data}))
+
+        cache = ResponseCache(path=self.path, max_staleness=1800)
+        self.assertFalse(cache.usable_if_stale(entry))
+
+    def test_counters(self):
+        self.cache.hit()
+        self.cache.hit()
+        self.cache.miss()
+        self.cache.stale_hit()
+        self.assertEqual(self.cache.hits, 2)
+        self.assertEqual(self.cache.misses, 1)
+        self.assertEqual(self.cache.stale, 1)
@@ -51,6 +51,33 @@ Token = some-token-5678
 MetricProfiles = TEST_PROFILE3, TEST_PROFILE4
 """
 
+file_general = """
+[GENERAL]
+Concurrency = 8
+PoolSize = 2
+CacheDir = /tmp/argo-poem-tools
+StateDir = /tmp/argo-poem-tools-state
+MaxStaleness = 86400
+LatencyBudget = 5
+FingerprintMaxAge = 3600
+BatchTransaction = true
+
+[tenant1]
+Host = tenant1.example.com
+Token = some-token-1234
+MetricProfiles = TEST_PROFILE1, TEST_PROFILE2
+"""
+
+file_general_wrong_concurrency = """
+[GENERAL]
+Concurrency = many
+
+[tenant1]
+Host = tenant1.example.com
+Token = some-token-1234
+MetricProfiles = TEST_PROFILE1, TEST_PROFILE2
+"""
+
 
 class ConfigTests(unittest.TestCase):
     def tearDown(self):
@@ -121,6 +148,66 @@ class ConfigTests(unittest.TestCase):
             "tenant 'tenant1'"
         )
 
+    def test_get_general_defaults(self):
+        with open(mock_file_name, 'w') as f:
+            f.write(file_ok)
+
+        config = Config(file=mock_file_name)
+        self.assertEqual(
+            config.get_general(), {
+                "concurrency": 4,
+                "pool_size": 10,
+                "cache_dir": "/var/cache/argo-poem-tools",
+                "state_dir": "/var/lib/argo-poem-tools",
+                "max_staleness": 0,
+                "latency_budget": 10,
+                "fingerprint_max_age": 21600,
+                "batch_transaction": False
+            }
+        )
+
+    def test_get_general(self):
+        with open(mock_file_name, 'w') as f:
+            f.write(file_general)
+
+        config = Config(file=mock_file_name)
+        self.assertEqual(
+            config.get_general(), {
+                "concurrency": 8,
+                "pool_size": 2,
+                "cache_dir": "/tmp/argo-poem-tools",
+                "state_dir": "/tmp/argo-poem-tools-state",
+                "max_staleness": 86400,
+                "latency_budget": 5,
+                "fingerprint_max_age": 3600,
+                "batch_transaction": True
+            }
+        )
+        self.assertEqual(
+            config.get_configuration(), {
+                "tenant1": {
+                    "host": "tenant1.example.com",
+                    "token": "some-token-1234",
+                    "metricprofiles": ["TEST_PROFILE1", "TEST_PROFILE2"]
+                }
+            }
+        )
+
+    def test_get_general_wrong_concurrency(self):
+        with open(mock_file_name, 'w') as f:
+            f.write(file_general_wrong_concurrency)
+
+        config = Config(file=mock_file_name)
+
+        with self.assertRaises(ConfigException) as context:
+            config.get_general()
+
+        self.assertEqual(
+            context.exception.__str__(),
+            "Configuration file error: Entry 'concurrency' in section "
+            "'GENERAL' must be an integer"
+        )
+
 
 if __name__ == '__main__':
     unittest.main()
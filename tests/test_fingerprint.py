@@ -0,0 +1,95 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from argo_poem_tools.fingerprint import Fingerprint
+
+from test_poem import mock_data
+
+
+class FingerprintTests(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.rpmdb = os.path.join(self.tmpdir, 'rpm')
+        os.makedirs(self.rpmdb)
+        self._write(os.path.join(self.rpmdb, 'rpmdb.sqlite'), 'db')
+        self.versionlock = os.path.join(self.tmpdir, 'versionlock.list')
+        self._write(self.versionlock, 'nagios-plugins-argo-0:0.1.12-1.noarch')
+        self.repos_path = os.path.join(self.tmpdir, 'yum.repos.d')
+        os.makedirs(self.repos_path)
+        for title, value in mock_data['data'].items():
+            self._write(
+                os.path.join(self.repos_path, title + '.repo'),
+                value['content']
+            )
+
+        self.fingerprint = Fingerprint(
+            os.path.join(self.tmpdir, 'cache', 'fingerprint.json'),
+            rpmdb_path=self.rpmdb, versionlock_paths=[self.versionlock],
+            repos_path=self.repos_path, max_age=3600
+        )
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    @staticmethod
+    def _write(path, content):
+        with open(path, 'w') as f:
+            f.write(content)
+
+    def test_matches_after_record(self):
+        self.assertFalse(self.fingerprint.matches(mock_data['data']))
+        self.fingerprint.record(mock_data['data'])
+        self.assertTrue(self.fingerprint.matches(mock_data['data']))
+
+    def test_does_not_match_if_data_changed(self):
+        self.fingerprint.record(mock_data['data'])
+        self.assertFalse(
+            self.fingerprint.matches(
+                {'argo-devel': mock_data['data']['argo-devel']}
+            )
+        )
+
+    def test_does_not_match_if_rpmdb_changed(self):
+        self.fingerprint.record(mock_data['data'])
+        self._write(os.path.join(self.rpmdb, 'rpmdb.sqlite'), 'changed db')
+        self.assertFalse(self.fingerprint.matches(mock_data['data']))
+
+    def test_does_not_match_if_versionlock_changed(self):
+        self.fingerprint.record(mock_data['data'])
+        self._write(self.versionlock, '')
+        self.assertFalse(self.fingerprint.matches(mock_data['data']))
+
+    def test_does_not_match_if_repo_file_deleted(self):
+        self.fingerprint.record(mock_data['data'])
+        os.remove(os.path.join(self.repos_path, 'argo-devel.repo'))
+        self.assertFalse(self.fingerprint.matches(mock_data['data']))
+
+    def test_does_not_match_if_repo_file_edited(self):
+        self.fingerprint.record(mock_data['data'])
+        self._write(
+            os.path.join(self.repos_path, 'argo-devel.repo'),
+            '[argo-devel]\nenabled=0\n'
+        )
+        self.assertFalse(self.fingerprint.matches(mock_data['data']))
+
+    @mock.patch('argo_poem_tools.fingerprint.time.time')
+    def test_does_not_match_if_too_old(self, mock_time):
+        now = 1700000000.0
+        mock_time.return_value = now
+        self.fingerprint.record(mock_data['data'])
+        mock_time.return_value = now + 3599
+        self.assertTrue(self.fingerprint.matches(mock_data['data']))
+        mock_time.return_value = now + 3600
+        self.assertFalse(self.fingerprint.matches(mock_data['data']))
+        # clock went backwards
+        mock_time.return_value = now - 60
+        self.assertFalse(self.fingerprint.matches(mock_data['data']))
+
+    def test_no_fingerprint_without_versionlock_list(self):
+        os.remove(self.versionlock)
+        self.fingerprint.record(mock_data['data'])
+        self.assertFalse(os.path.exists(self.fingerprint.path))
+        self.assertFalse(self.fingerprint.matches(mock_data['data']))
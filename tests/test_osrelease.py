@@ -0,0 +1,129 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from argo_poem_tools.exceptions import POEMException
+from argo_poem_tools.osrelease import get_os, read_os_release, uses_dnf
+
+OS_RELEASE_EL7 = \
+    'NAME="CentOS Linux"\n' \
+    'VERSION="7 (Core)"\n' \
+    'ID="centos"\n' \
+    'ID_LIKE="rhel fedora"\n' \
+    'VERSION_ID="7"\n' \
+    'PRETTY_NAME="CentOS Linux 7 (Core)"\n' \
+    'ANSI_COLOR="0;31"\n' \
+    'CPE_NAME="cpe:/o:centos:centos:7"\n' \
+    'HOME_URL="https://www.centos.org/"\n' \
+    'BUG_REPORT_URL="https://bugs.centos.org/"\n\n' \
+    'CENTOS_MANTISBT_PROJECT="CentOS-7"\n' \
+    'CENTOS_MANTISBT_PROJECT_VERSION="7"\n' \
+    'REDHAT_SUPPORT_PRODUCT="centos"\n' \
+    'REDHAT_SUPPORT_PRODUCT_VERSION="7"\n\n'
+
+OS_RELEASE_EL9 = \
+    'NAME="Rocky Linux"\n' \
+    'VERSION="9.1 (Blue Onyx)"\n' \
+    'ID="rocky"\n' \
+    'ID_LIKE="rhel centos fedora"\n' \
+    'VERSION_ID="9.1"\n' \
+    'PLATFORM_ID="platform:el9"\n' \
+    'PRETTY_NAME="Rocky Linux 9.1 (Blue Onyx)"\n' \
+    'ANSI_COLOR="0;32"\n' \
+    'LOGO="fedora-logo-icon"\n' \
+    'CPE_NAME="cpe:/o:rocky:rocky:9::baseos"\n' \
+    'HOME_URL="https://rockylinux.org/"\n' \
+    'BUG_REPORT_URL="https://bugs.rockylinux.org/"\n' \
+    'ROCKY_SUPPORT_PRODUCT="Rocky-Linux-9"\n' \
+    'ROCKY_SUPPORT_PRODUCT_VERSION="9.1"\n' \
+    'REDHAT_SUPPORT_PRODUCT="Rocky Linux"\n' \
+    'REDHAT_SUPPORT_PRODUCT_VERSION="9.1"\n'
+
+
+OS_RELEASE_UNQUOTED = \
+    '# comment\n' \
+    'NAME=AlmaLinux\n' \
+    "VERSION_ID='8.9'\n" \
+    'PRETTY_NAME="AlmaLinux 8.9 (Midnight Oncilla)"\n'
+
+OS_RELEASE_MISSING_VERSION = \
+    'NAME="Rocky Linux"\n' \
+    'ID="rocky"\n'
+
+
+class OSReleaseTests(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+        read_os_release.cache_clear()
+        get_os.cache_clear()
+
+    def _write(self, name, content):
+        path = os.path.join(self.tmpdir, name)
+        with open(path, 'w') as f:
+            f.write(content)
+
+        return path
+
+    def test_read_os_release(self):
+        path = self._write('os-release', OS_RELEASE_EL9)
+        os_release = read_os_release(path)
+        self.assertEqual(os_release['NAME'], 'Rocky Linux')
+        self.assertEqual(os_release['VERSION_ID'], '9.1')
+        self.assertEqual(
+            os_release['PRETTY_NAME'], 'Rocky Linux 9.1 (Blue Onyx)'
+        )
+        self.assertEqual(
+            os_release['CPE_NAME'], 'cpe:/o:rocky:rocky:9::baseos'
+        )
+
+    def test_get_os_el7(self):
+        path = self._write('os-release', OS_RELEASE_EL7)
+        self.assertEqual(get_os(path), 'centos7')
+
+    def test_get_os_el9(self):
+        path = self._write('os-release', OS_RELEASE_EL9)
+        self.assertEqual(get_os(path), 'rocky9')
+
+    def test_get_os_unquoted_values_and_comments(self):
+        path = self._write('os-release', OS_RELEASE_UNQUOTED)
+        self.assertEqual(get_os(path), 'almalinux8')
+
+    def test_get_os_is_memoized(self):
+        path = self._write('os-release', OS_RELEASE_EL9)
+        self.assertEqual(get_os(path), 'rocky9')
+        self._write('os-release', OS_RELEASE_EL7)
+        self.assertEqual(get_os(path), 'rocky9')
+
+    def test_get_os_missing_key(self):
+        path = self._write('os-release', OS_RELEASE_MISSING_VERSION)
+        with self.assertRaises(POEMException) as err:
+            get_os(path)
+
+        self.assertEqual(
+            err.exception.__str__(),
+            f"Error fetching YUM repos: Unable to determine distro: missing "
+            f"VERSION_ID in {path}"
+        )
+
+    def test_get_os_missing_file(self):
+        path = os.path.join(self.tmpdir, 'nonexisting')
+        with self.assertRaises(POEMException) as err:
+            get_os(path)
+
+        self.assertEqual(
+            err.exception.__str__(),
+            f"Error fetching YUM repos: Unable to read {path}: "
+            f"No such file or directory"
+        )
+
+    def test_uses_dnf(self):
+        self.assertFalse(uses_dnf(self._write('el7', OS_RELEASE_EL7)))
+        self.assertTrue(uses_dnf(self._write('el9', OS_RELEASE_EL9)))
+        self.assertFalse(
+            uses_dnf(self._write('debian', 'ID=debian\nVERSION_ID="12"\n'))
+        )
+        self.assertFalse(uses_dnf(os.path.join(self.tmpdir, 'nonexisting')))
@@ -1,9 +1,13 @@
+import io
+import os
 import subprocess
 import unittest
 from unittest import mock
 
 from argo_poem_tools.exceptions import PackageException
+from argo_poem_tools.backends import SubprocessBackend
 from argo_poem_tools.packages import Packages, _compare_versions, _compare_vr
+from argo_poem_tools.versionlock import VersionLocks
 
 data = {
     "argo-devel": {
@@ -76,18 +80,37 @@ NetworkManager-dispatcher-routing-rules.noarch
 
 """.encode('utf-8')
 
+def mock_popen(stdout, returncode=0, stderr=b''):
+    def popen(*args, **kwargs):
+        kwargs['stderr'].write(stderr)
+        proc = mock.Mock()
+        proc.stdout = io.BytesIO(stdout)
+        proc.wait.return_value = returncode
+        return proc
+
+    return popen
+
+
 mock_rpm_qa = \
 """
-nagios-plugins-2.3.3-2.el7.x86_64
-nagios-plugins-file_age-2.3.3-2.el7.x86_64
-nagios-plugins-argo-0.1.13-20200901060701.5869b94.el7.noarch
-nagios-plugins-fedcloud-0.5.2-20200511071632.05e2501.el7.noarch
-nagios-plugins-igtf-1.4.0-20200713050846.f6ca58d.el7.noarch
-nagios-plugins-dummy-2.3.3-2.el7.x86_64
-nagios-common-4.4.5-7.el7.x86_64
-nagios-plugins-perl-2.3.3-2.el7.x86_64
-nagios-plugins-http-2.3.3-2.el7.x86_64
+nagios-plugins\t0\t2.3.3\t2.el7\tx86_64
+nagios-plugins-file_age\t0\t2.3.3\t2.el7\tx86_64
+nagios-plugins-argo\t0\t0.1.13\t20200901060701.5869b94.el7\tnoarch
+nagios-plugins-fedcloud\t0\t0.5.2\t20200511071632.05e2501.el7\tnoarch
+nagios-plugins-igtf\t0\t1.4.0\t20200713050846.f6ca58d.el7\tnoarch
+nagios-plugins-dummy\t0\t2.3.3\t2.el7\tx86_64
+nagios-common\t0\t4.4.5\t7.el7\tx86_64
+nagios-plugins-perl\t0\t2.3.3\t2.el7\tx86_64
+nagios-plugins-http\t0\t2.3.3\t2.el7\tx86_64
+""".encode('utf-8')
 
+mock_rpm_q = \
+"""
+nagios-plugins-fedcloud\t0\t0.5.2\t20200511071632.05e2501.el7\tnoarch
+nagios-plugins-igtf\t0\t1.4.0\t20200713050846.f6ca58d.el7\tnoarch
+package nagios-plugins-globus is not installed
+nagios-plugins-argo\t0\t0.1.13\t20200901060701.5869b94.el7\tnoarch
+nagios-plugins-http\t1\t2.3.3\t2.el7\tx86_64
 """.encode('utf-8')
 
 mock_yum_versionlock_list = \
@@ -98,6 +121,15 @@ Loaded plugins: fastestmirror, ovl, versionlock
 versionlock list done
 """.encode('utf-8')
 
+mock_yum_versionlock_list_after_lock = \
+"""
+Loaded plugins: fastestmirror, ovl, versionlock
+0:nagios-plugins-argo-0.1.12-20200811040245.d758e91.el7.*
+0:nagios-plugins-fedcloud-0.5.2-20201217023205.1b502c8.el7.*
+0:nagios-plugins-igtf-1.4.0-20200713050846.f6ca58d.el7.*
+versionlock list done
+""".encode('utf-8')
+
 mock_empty_versionlock_list = \
 """
 Loaded plugins: fastestmirror, ovl, versionlock
@@ -141,6 +173,40 @@ class RPMTests(unittest.TestCase):
             ), -1
         )
 
+    def test_compare_versions_rpmvercmp(self):
+        # cases from rpm's own rpmvercmp test suite
+        for v1, v2, result in [
+            ('1.0a', '1.0', 1),
+            ('1.0a', '1.0b', -1),
+            ('1.0', '1.0.0', -1),
+            ('2.0.1a', '2.0.1', 1),
+            ('5.5p1', '5.5p2', -1),
+            ('5.5p10', '5.5p1', 1),
+            ('10xyz', '10.1xyz', -1),
+            ('xyz10', 'xyz10.1', -1),
+            ('1.0', '1_0', 0),
+            ('1.1.a', '1.1', 1),
+            ('2a', '2.0', -1),
+            ('1.0010', '1.9', 1),
+            ('1.05', '1.5', 0),
+            ('6.0.rc1', '6.0', 1),
+            ('1.0~rc1', '1.0', -1),
+            ('1.0~rc1', '1.0~rc2', -1),
+            ('1.0~rc1~git123', '1.0~rc1', -1),
+            ('1.0^', '1.0', 1),
+            ('1.0^git1', '1.0^git2', -1),
+            ('1.0^git1', '1.01', -1),
+            ('1.0^20160101', '1.0.1', -1),
+            ('1.0~rc1^git1', '1.0~rc1', 1),
+            ('1.0^git1~pre', '1.0^git1', -1)
+        ]:
+            self.assertEqual(
+                _compare_versions(v1, v2), result, msg=f'{v1} vs {v2}'
+            )
+            self.assertEqual(
+                _compare_versions(v2, v1), -result, msg=f'{v2} vs {v1}'
+            )
+
     def test_compare_vr(self):
         self.assertEqual(
             _compare_vr(
@@ -169,11 +235,20 @@ class RPMTests(unittest.TestCase):
             _compare_vr(('0.0.1', '1.el7'), ('1.0.0', '2.el7')), -1
         )
         self.assertEqual(_compare_vr(('2.0.1', '1.el7'), ('1.0.0', '2.el7')), 1)
+        self.assertEqual(_compare_vr(('1:1.0', '1.el7'), ('2.0', '1.el7')), 1)
+        self.assertEqual(
+            _compare_vr(('0:1.0', '1.el7'), ('1.0', '1.el7')), 0
+        )
 
 
 class PackageTests(unittest.TestCase):
     def setUp(self):
-        self.pkgs = Packages(data)
+        self.pkgs = Packages(data, backend=SubprocessBackend())
+        self.pkgs.versionlocks = VersionLocks(paths=[])
+        self.pkgs.installed.rpmdb_path = os.path.join(
+            os.getcwd(), 'nonexisting-rpmdb'
+        )
+        self.pkgs.backend.repoquery = None
 
     def test_get_package_list(self):
         self.assertEqual(
@@ -187,12 +262,11 @@ class PackageTests(unittest.TestCase):
             }
         )
 
-    @mock.patch('argo_poem_tools.packages.subprocess.check_output')
+    @mock.patch('argo_poem_tools.packages.subprocess.Popen')
     def test_get_available_packages(self, mock_yumdb):
-        self.pkgs.versions_unlocked = True
-        mock_yumdb.return_value = mock_yum_list_available
+        mock_yumdb.side_effect = mock_popen(mock_yum_list_available)
         self.assertEqual(
-            self.pkgs._get_available_packages(),
+            list(self.pkgs._get_available_packages()),
             [
                 dict(name='nagios', version='4.4.5', release='7.el7'),
                 dict(name='nagios-contrib', version='4.4.5', release='7.el7'),
@@ -211,34 +285,100 @@ class PackageTests(unittest.TestCase):
                      version='1:1.18.4', release='3.el7')
             ]
         )
+        mock_yumdb.assert_called_once_with(
+            [
+                'yum', 'list', 'available', '--showduplicates',
+                '--disableplugin=versionlock', '--disablerepo=*',
+                '--enablerepo=argo-devel,epel', 'nagios-plugins-argo',
+                'nagios-plugins-fedcloud', 'nagios-plugins-globus',
+                'nagios-plugins-http', 'nagios-plugins-igtf'
+            ],
+            stdout=subprocess.PIPE, stderr=mock.ANY
+        )
 
-    @mock.patch('argo_poem_tools.packages.Packages._unlock_versions')
-    @mock.patch('argo_poem_tools.packages.subprocess.check_output')
-    def test_get_available_packages_if_versions_locked(
-            self, mock_yumdb, mock_unlock
-    ):
-        mock_yumdb.return_value = mock_yum_list_available
+    @mock.patch('argo_poem_tools.packages.subprocess.Popen')
+    def test_get_available_packages_wrapped_lines(self, mock_yumdb):
+        mock_yumdb.side_effect = mock_popen(
+            b'Available Packages\n'
+            b'nagios-plugins-argo.noarch\n'
+            b'                       0.1.12-20200716071827.5e1a5c8.el7\n'
+            b'                                               argo-devel\n'
+            b'nagios-plugins-http.x86_64   2.3.3-2.el7   epel\n'
+        )
         self.assertEqual(
-            self.pkgs._get_available_packages(),
+            list(self.pkgs._get_available_packages()),
             [
-                dict(name='nagios', version='4.4.5', release='7.el7'),
-                dict(name='nagios-contrib', version='4.4.5', release='7.el7'),
-                dict(name='nagios-devel', version='4.4.5', release='7.el7'),
-                dict(name='nagios-plugin-grnet-agora', version='0.3',
-                     release='20200731072952.4427855.el7'),
-                dict(name='nagios-plugins-activemq', version='1.0.0',
-                     release='20170401112243.00c5f1d.el7'),
-                dict(name='nagios-plugins-disk_smb', version='2.3.3',
-                     release='2.el7'),
-                dict(name='nagios-plugins-globus', version='0.1.5',
-                     release='20200713050450.eb1e7d8.el7'),
-                dict(name='nagios-plugins-gocdb', version='1.0.0',
-                     release='20200713050609.a481696.el7'),
-                dict(name='NetworkManager-dispatcher-routing-rules',
-                     version='1:1.18.4', release='3.el7')
+                dict(name='nagios-plugins-argo', version='0.1.12',
+                     release='20200716071827.5e1a5c8.el7'),
+                dict(name='nagios-plugins-http', version='2.3.3',
+                     release='2.el7')
             ]
         )
-        self.assertEqual(mock_unlock.call_count, 1)
+
+    @mock.patch('argo_poem_tools.packages.subprocess.Popen')
+    def test_get_available_packages_with_repoquery(self, mock_yumdb):
+        self.pkgs.backend.repoquery = [
+            'dnf', 'repoquery', '--quiet', '--available',
+            '--disableplugin=versionlock'
+        ]
+        mock_yumdb.side_effect = mock_popen(
+            b'nagios-plugins-argo\t0\t0.1.12\t'
+            b'20200716071827.5e1a5c8.el7\tnoarch\n'
+            b'nagios-plugins-argo\t0\t0.1.12\t'
+            b'20200716071827.5e1a5c8.el7\tsrc\n'
+            b'nagios-plugins-http\t2\t2.3.3\t2.el7\tx86_64\n'
+        )
+        self.assertEqual(
+            list(self.pkgs._get_available_packages()),
+            [
+                dict(name='nagios-plugins-argo', version='0.1.12',
+                     release='20200716071827.5e1a5c8.el7'),
+                dict(name='nagios-plugins-http', version='2:2.3.3',
+                     release='2.el7')
+            ]
+        )
+        mock_yumdb.assert_called_once_with(
+            [
+                'dnf', 'repoquery', '--quiet', '--available',
+                '--disableplugin=versionlock', '--disablerepo=*',
+                '--enablerepo=argo-devel,epel', '--queryformat',
+                '%{name}\t%{epoch}\t%{version}\t%{release}\t%{arch}',
+                'nagios-plugins-argo', 'nagios-plugins-fedcloud',
+                'nagios-plugins-globus', 'nagios-plugins-http',
+                'nagios-plugins-igtf'
+            ],
+            stdout=subprocess.PIPE, stderr=mock.ANY
+        )
+
+    @mock.patch('argo_poem_tools.packages.subprocess.Popen')
+    def test_get_available_packages_if_none_available(self, mock_yumdb):
+        mock_yumdb.side_effect = mock_popen(
+            b'Loaded plugins: fastestmirror, ovl\n', returncode=1,
+            stderr=b'Error: No matching Packages to list\n'
+        )
+        self.assertEqual(list(self.pkgs._get_available_packages()), [])
+
+    @mock.patch('argo_poem_tools.packages.subprocess.Popen')
+    def test_get_available_packages_if_yum_fails(self, mock_yumdb):
+        mock_yumdb.side_effect = mock_popen(
+            b'', returncode=1,
+            stderr=b'Error: Cannot retrieve repository metadata\n'
+        )
+        with self.assertRaises(subprocess.CalledProcessError):
+            list(self.pkgs._get_available_packages())
+
+    @mock.patch('argo_poem_tools.packages.subprocess.call')
+    @mock.patch('argo_poem_tools.packages.Packages._unlock_versions')
+    @mock.patch('argo_poem_tools.packages.subprocess.Popen')
+    def test_get_available_packages_does_not_unlock_versions(
+            self, mock_yumdb, mock_unlock, mock_call
+    ):
+        mock_yumdb.side_effect = mock_popen(mock_yum_list_available)
+        self.assertEqual(len(list(self.pkgs._get_available_packages())), 9)
+        self.assertFalse(mock_unlock.called)
+        self.assertFalse(mock_call.called)
+        self.assertFalse(self.pkgs.versions_unlocked)
+        self.assertEqual(self.pkgs.initially_locked_versions, [])
 
     @mock.patch('argo_poem_tools.packages.subprocess.check_output')
     def test_get_locked_versions(self, mock_versionlock):
@@ -249,56 +389,107 @@ class PackageTests(unittest.TestCase):
             ['nagios-plugins-argo', 'nagios-plugins-fedcloud']
         )
 
+    @mock.patch('argo_poem_tools.packages.subprocess.check_output')
+    def test_get_locked_versions_no_false_positives(self, mock_versionlock):
+        mock_versionlock.return_value = \
+            """
+            Loaded plugins: fastestmirror, ovl, versionlock
+            0:nagios-plugins-http-extra-2.3.3-2.el7.*
+            0:nagios-plugins-argo-0.1.12-20200811040245.d758e91.el7.*
+            versionlock list done
+            """.encode('utf-8')
+        self.pkgs._get_locked_versions()
+        self.assertEqual(self.pkgs.locked_versions, ['nagios-plugins-argo'])
+
+    @mock.patch('argo_poem_tools.packages.subprocess.check_output')
     @mock.patch('argo_poem_tools.packages.subprocess.call')
-    def test_unlock_versions(self, mock_call):
+    def test_unlock_versions(self, mock_call, mock_versionlock):
         self.pkgs.locked_versions = [
             'nagios-plugins-argo', 'nagios-plugins-fedcloud'
         ]
         self.assertEqual(self.pkgs.initially_locked_versions, [])
         mock_call.side_effect = mock_func
+        mock_versionlock.return_value = mock_empty_versionlock_list
         self.pkgs._unlock_versions()
-        self.assertEqual(mock_call.call_count, 2)
-        mock_call.assert_has_calls([
-            mock.call(
-                ['yum', 'versionlock', 'delete', 'nagios-plugins-argo'],
-                stdout=subprocess.PIPE, stderr=subprocess.PIPE
-            ),
-            mock.call(
-                ['yum', 'versionlock', 'delete', 'nagios-plugins-fedcloud'],
-                stdout=subprocess.PIPE, stderr=subprocess.PIPE
-            )
-        ], any_order=True)
+        mock_call.assert_called_once_with(
+            [
+                'yum', 'versionlock', 'delete', 'nagios-plugins-argo',
+                'nagios-plugins-fedcloud'
+            ],
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        )
         self.assertEqual(
             self.pkgs.initially_locked_versions,
             ['nagios-plugins-argo', 'nagios-plugins-fedcloud']
         )
+        self.assertTrue(self.pkgs.versions_unlocked)
 
+    @mock.patch('argo_poem_tools.packages.subprocess.check_output')
     @mock.patch('argo_poem_tools.packages.subprocess.call')
-    def test_failsafe_lock_versions(self, mock_call):
+    def test_unlock_versions_partially_failed(self, mock_call, mock_versionlock):
+        self.pkgs.locked_versions = [
+            'nagios-plugins-argo', 'nagios-plugins-fedcloud'
+        ]
         mock_call.side_effect = mock_func
+        mock_versionlock.return_value = \
+            """
+            Loaded plugins: fastestmirror, ovl, versionlock
+            0:nagios-plugins-fedcloud-0.5.2-20201217023205.1b502c8.el7.*
+            versionlock list done
+            """.encode('utf-8')
+        self.pkgs._unlock_versions()
+        self.assertEqual(mock_call.call_count, 1)
+        self.assertEqual(
+            self.pkgs.initially_locked_versions, ['nagios-plugins-argo']
+        )
+
+    @mock.patch('argo_poem_tools.packages.subprocess.check_output')
+    @mock.patch('argo_poem_tools.packages.subprocess.call')
+    def test_failsafe_lock_versions(self, mock_call, mock_versionlock):
+        mock_call.side_effect = mock_func
+        mock_versionlock.return_value = mock_yum_versionlock_list
         self.pkgs.initially_locked_versions = [
             'nagios-plugins-argo', 'nagios-plugins-fedcloud',
             'nagios-plugins-globus'
         ]
         self.pkgs.locked_versions = ['nagios-plugins-argo']
-        self.pkgs._failsafe_lock_versions()
-        self.assertEqual(mock_call.call_count, 3)
-        mock_call.assert_has_calls(
+        warn = self.pkgs._failsafe_lock_versions()
+        mock_call.assert_called_once_with(
             [
-                mock.call(
-                    ['yum', 'versionlock', 'add', 'nagios-plugins-argo'],
-                    stdout=subprocess.PIPE, stderr=subprocess.PIPE
-                ),
-                mock.call(
-                    ['yum', 'versionlock', 'add', 'nagios-plugins-fedcloud'],
-                    stdout=subprocess.PIPE, stderr=subprocess.PIPE
-                ),
-                mock.call(
-                    ['yum', 'versionlock', 'add', 'nagios-plugins-globus'],
-                    stdout=subprocess.PIPE, stderr=subprocess.PIPE
-                )
-            ], any_order=True
+                'yum', 'versionlock', 'add', 'nagios-plugins-argo',
+                'nagios-plugins-fedcloud', 'nagios-plugins-globus'
+            ],
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE
         )
+        self.assertEqual(warn, 'Packages not locked: nagios-plugins-globus')
+
+    @mock.patch('argo_poem_tools.backends.os.sysconf')
+    @mock.patch('argo_poem_tools.packages.subprocess.check_output')
+    @mock.patch('argo_poem_tools.packages.subprocess.call')
+    def test_versionlock_split_by_arg_max(
+            self, mock_call, mock_versionlock, mock_sysconf
+    ):
+        mock_call.side_effect = mock_func
+        mock_versionlock.return_value = mock_yum_versionlock_list
+        mock_sysconf.return_value = 200
+        locked, failed = self.pkgs._versionlock(
+            'add', ['nagios-plugins-argo', 'nagios-plugins-fedcloud']
+        )
+        self.assertEqual(mock_call.call_count, 2)
+        mock_call.assert_has_calls([
+            mock.call(
+                ['yum', 'versionlock', 'add', 'nagios-plugins-argo'],
+                stdout=subprocess.PIPE, stderr=subprocess.PIPE
+            ),
+            mock.call(
+                ['yum', 'versionlock', 'add', 'nagios-plugins-fedcloud'],
+                stdout=subprocess.PIPE, stderr=subprocess.PIPE
+            )
+        ])
+        self.assertEqual(
+            locked, ['nagios-plugins-argo', 'nagios-plugins-fedcloud']
+        )
+        self.assertEqual(failed, [])
 
     @mock.patch('argo_poem_tools.packages.subprocess.check_output')
     @mock.patch('argo_poem_tools.packages.subprocess.call')
@@ -331,9 +522,53 @@ class PackageTests(unittest.TestCase):
             }
         )
 
-    @mock.patch('argo_poem_tools.packages.subprocess.check_output')
+    @mock.patch('argo_poem_tools.packages.Packages._get_available_packages')
+    def test_get_exceptions_available_packages_index(self, mock_yumdb):
+        mock_yumdb.return_value = [
+            dict(name='nagios-plugins-fedcloud', version='0.6.0',
+                 release='20200511071632.05e2501.el7'),
+            dict(name='nagios-plugins-igtf', version='1.4.0', release='3.el7'),
+            dict(name='nagios-plugins-fedcloud', version='0.10.0',
+                 release='1.el7'),
+            dict(name='nagios-plugins-igtf', version='1.4.0', release='10.el7'),
+            dict(name='nagios-plugins-igtf', version='1.3.0', release='1.el7'),
+            dict(name='nagios-plugins-http', version='2.3.3', release='1.el7'),
+            dict(name='nagios', version='4.4.5', release='7.el7')
+        ]
+        self.pkgs._get_exceptions()
+        self.assertEqual(
+            self.pkgs.available_packages,
+            {
+                'nagios-plugins-fedcloud': [
+                    ('0.6.0', '20200511071632.05e2501.el7'),
+                    ('0.10.0', '1.el7')
+                ],
+                'nagios-plugins-igtf': [
+                    ('1.3.0', '1.el7'),
+                    ('1.4.0', '3.el7'),
+                    ('1.4.0', '10.el7')
+                ],
+                'nagios-plugins-http': [('2.3.3', '1.el7')]
+            }
+        )
+        self.assertEqual(
+            self.pkgs.packages_different_version,
+            [('nagios-plugins-fedcloud', '0.10.0')]
+        )
+        self.assertEqual(
+            self.pkgs._get_max_version('nagios-plugins-igtf'),
+            ('nagios-plugins-igtf', '1.4.0', '10.el7')
+        )
+        self.assertEqual(
+            self.pkgs._get_max_version('nagios-plugins-igtf', '1.3.0'),
+            ('nagios-plugins-igtf', '1.3.0', '1.el7')
+        )
+
+    @mock.patch('argo_poem_tools.packages.subprocess.run')
     def test_get_installed_packages(self, mock_rpm):
-        mock_rpm.return_value = mock_rpm_qa
+        mock_rpm.return_value = subprocess.CompletedProcess(
+            args=[], returncode=0, stdout=mock_rpm_qa, stderr=b''
+        )
         self.assertEqual(
             self.pkgs._get_installed_packages(),
             [
@@ -355,6 +590,58 @@ class PackageTests(unittest.TestCase):
                      release='2.el7')
             ]
         )
+        mock_rpm.assert_called_once_with(
+            [
+                'rpm', '-qa', '--queryformat',
+                '%{NAME}\\t%{EPOCHNUM}\\t%{VERSION}\\t%{RELEASE}\\t%{ARCH}\\n'
+            ],
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        )
+
+    @mock.patch('argo_poem_tools.packages.subprocess.run')
+    def test_get_installed_packages_by_name(self, mock_rpm):
+        names = [
+            'nagios-plugins-fedcloud', 'nagios-plugins-igtf',
+            'nagios-plugins-globus', 'nagios-plugins-argo',
+            'nagios-plugins-http'
+        ]
+        mock_rpm.return_value = subprocess.CompletedProcess(
+            args=[], returncode=1, stdout=mock_rpm_q, stderr=b''
+        )
+        self.assertEqual(
+            self.pkgs._get_installed_packages(names),
+            [
+                dict(name='nagios-plugins-fedcloud', version='0.5.2',
+                     release='20200511071632.05e2501.el7'),
+                dict(name='nagios-plugins-igtf', version='1.4.0',
+                     release='20200713050846.f6ca58d.el7'),
+                dict(name='nagios-plugins-argo', version='0.1.13',
+                     release='20200901060701.5869b94.el7'),
+                dict(name='nagios-plugins-http', version='1:2.3.3',
+                     release='2.el7')
+            ]
+        )
+        mock_rpm.assert_called_once_with(
+            [
+                'rpm', '-q', '--queryformat',
+                '%{NAME}\\t%{EPOCHNUM}\\t%{VERSION}\\t%{RELEASE}\\t%{ARCH}\\n'
+            ] + names,
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        )
+
+    @mock.patch('argo_poem_tools.packages.subprocess.run')
+    def test_get_installed_packages_if_rpm_fails(self, mock_rpm):
+        mock_rpm.return_value = subprocess.CompletedProcess(
+            args=[], returncode=1, stdout=b'',
+            stderr=b'error: rpmdb: BDB0113 Thread/process failed'
+        )
+        with self.assertRaises(subprocess.CalledProcessError):
+            self.pkgs._get_installed_packages(['nagios-plugins-argo'])
+
+    @mock.patch('argo_poem_tools.packages.subprocess.run')
+    def test_get_installed_packages_nothing_requested(self, mock_rpm):
+        self.assertEqual(self.pkgs._get_installed_packages([]), [])
+        self.assertFalse(mock_rpm.called)
 
     @mock.patch('argo_poem_tools.packages.Packages._get_available_packages')
     @mock.patch('argo_poem_tools.packages.Packages._get_installed_packages')
@@ -459,6 +746,51 @@ class PackageTests(unittest.TestCase):
         self.assertEqual(diff_ver, ['nagios-plugins-globus-0.1.5'])
         self.assertEqual(not_found, ['nagios-plugins-argo-0.1.12'])
 
+    @mock.patch('argo_poem_tools.packages.Packages._get_available_packages')
+    @mock.patch('argo_poem_tools.packages.Packages._get_installed_packages')
+    def test_get_analyzed_packages_multiple_installed_versions(
+            self, mock_rpmdb, mock_yumdb
+    ):
+        mock_rpmdb.return_value = [
+            dict(name='nagios-plugins-fedcloud', version='0.5.0',
+                 release='20191003144427.7acfd49.el7'),
+            dict(name='nagios-plugins-fedcloud', version='0.4.0',
+                 release='20190925233153.c3b9fdd.el7'),
+            dict(name='nagios-plugins-igtf', version='1.4.0',
+                 release='20200713050846.f6ca58d.el7'),
+            dict(name='nagios-plugins-igtf', version='1.5.0', release='3.el7')
+        ]
+        mock_yumdb.return_value = [
+            dict(name='nagios-plugins-fedcloud', version='0.5.0',
+                 release='20191003144427.7acfd49.el7'),
+            dict(name='nagios-plugins-igtf', version='1.4.0',
+                 release='20200713050846.f6ca58d.el7'),
+            dict(name='nagios-plugins-globus', version='0.1.5',
+                 release='20200713050450.eb1e7d8.el7'),
+            dict(name='nagios-plugins-http', version='2.3.3', release='1.el7'),
+            dict(name='nagios-plugins-argo', version='0.1.12',
+                 release='20200716071827.5b8b5d6.el7')
+        ]
+        install, upgrade, downgrade, diff_ver, not_found = self.pkgs._get()
+        self.assertEqual(
+            set(install),
+            {
+                ('nagios-plugins-globus', '0.1.5'),
+                ('nagios-plugins-argo', '0.1.12'),
+                ('nagios-plugins-http',)
+            }
+        )
+        self.assertEqual(upgrade, [])
+        self.assertEqual(
+            downgrade,
+            [
+                (
+                    ('nagios-plugins-igtf', '1.5.0'),
+                    ('nagios-plugins-igtf', '1.4.0')
+                )
+            ]
+        )
+
     @mock.patch('argo_poem_tools.packages.subprocess.check_call')
     @mock.patch('argo_poem_tools.packages.Packages._get_available_packages')
     @mock.patch('argo_poem_tools.packages.Packages._get_installed_packages')
@@ -554,10 +886,13 @@ class PackageTests(unittest.TestCase):
         self.assertEqual(diff_ver, ['nagios-plugins-globus-0.1.5'])
         self.assertEqual(not_found, [])
 
+    @mock.patch('argo_poem_tools.packages.Packages._unlock_versions')
     @mock.patch('argo_poem_tools.packages.Packages._lock_versions')
     @mock.patch('argo_poem_tools.packages.subprocess.check_call')
     @mock.patch('argo_poem_tools.packages.Packages._get')
-    def test_install_packages(self, mock_get, mock_check_call, mock_lock):
+    def test_install_packages(
+            self, mock_get, mock_check_call, mock_lock, mock_unlock
+    ):
         mock_get.return_value = (
             [('nagios-plugins-http',)],
             [
@@ -589,6 +924,7 @@ class PackageTests(unittest.TestCase):
             mock.call(['yum', '-y', 'install', 'nagios-plugins-argo-0.1.12']),
         ], any_order=True)
         self.assertEqual(mock_lock.call_count, 1)
+        self.assertEqual(mock_unlock.call_count, 1)
         self.assertEqual(
             info,
             [
@@ -602,11 +938,12 @@ class PackageTests(unittest.TestCase):
         )
         self.assertEqual(warn, [])
 
+    @mock.patch('argo_poem_tools.packages.Packages._unlock_versions')
     @mock.patch('argo_poem_tools.packages.Packages._lock_versions')
     @mock.patch('argo_poem_tools.packages.subprocess.check_call')
     @mock.patch('argo_poem_tools.packages.Packages._get')
     def test_install_packages_if_installed_and_wrong_version_available(
-            self, mock_get, mock_check_call, mock_lock
+            self, mock_get, mock_check_call, mock_lock, mock_unlock
     ):
         mock_get.return_value = (
             [('nagios-plugins-argo', '0.1.12')],
@@ -631,6 +968,7 @@ class PackageTests(unittest.TestCase):
         info, warn = self.pkgs.install()
         self.assertEqual(mock_check_call.call_count, 4)
         self.assertEqual(mock_lock.call_count, 1)
+        self.assertEqual(mock_unlock.call_count, 1)
         mock_check_call.assert_has_calls([
             mock.call(
                 ['yum', '-y', 'install', 'nagios-plugins-fedcloud-0.5.0']
@@ -658,11 +996,12 @@ class PackageTests(unittest.TestCase):
             ]
         )
 
+    @mock.patch('argo_poem_tools.packages.Packages._unlock_versions')
     @mock.patch('argo_poem_tools.packages.Packages._lock_versions')
     @mock.patch('argo_poem_tools.packages.subprocess.check_call')
     @mock.patch('argo_poem_tools.packages.Packages._get')
     def test_install_if_packages_not_found(
-            self, mock_get, mock_check_call, mock_lock
+            self, mock_get, mock_check_call, mock_lock, mock_unlock
     ):
         mock_get.return_value = (
             [('nagios-plugins-igtf', '1.4.0')],
@@ -677,6 +1016,7 @@ class PackageTests(unittest.TestCase):
         info, warn = self.pkgs.install()
         self.assertEqual(mock_check_call.call_count, 1)
         self.assertEqual(mock_lock.call_count, 1)
+        self.assertEqual(mock_unlock.call_count, 1)
         mock_check_call.assert_has_calls([
             mock.call(['yum', '-y', 'install', 'nagios-plugins-igtf-1.4.0']),
         ], any_order=True)
@@ -694,11 +1034,12 @@ class PackageTests(unittest.TestCase):
             ]
         )
 
+    @mock.patch('argo_poem_tools.packages.Packages._unlock_versions')
     @mock.patch('argo_poem_tools.packages.Packages._lock_versions')
     @mock.patch('argo_poem_tools.packages.subprocess.check_call')
     @mock.patch('argo_poem_tools.packages.Packages._get')
     def test_install_if_packages_marked_for_upgrade_and_same_version_avail(
-            self, mock_get, mock_check_call, mock_lock
+            self, mock_get, mock_check_call, mock_lock, mock_unlock
     ):
         mock_get.return_value = (
             [('nagios-plugins-http', )],
@@ -722,6 +1063,7 @@ class PackageTests(unittest.TestCase):
             mock.call(['yum', '-y', 'install', 'nagios-plugins-argo-0.1.12'])
         ], any_order=True)
         self.assertEqual(mock_lock.call_count, 1)
+        self.assertEqual(mock_unlock.call_count, 1)
         self.assertEqual(
             info,
             [
@@ -739,6 +1081,210 @@ class PackageTests(unittest.TestCase):
             ]
         )
 
+    @mock.patch('argo_poem_tools.packages.Packages._get_installed_packages')
+    @mock.patch('argo_poem_tools.packages.Packages._unlock_versions')
+    @mock.patch('argo_poem_tools.packages.Packages._lock_versions')
+    @mock.patch('argo_poem_tools.packages.subprocess.check_call')
+    @mock.patch('argo_poem_tools.packages.subprocess.call')
+    @mock.patch('argo_poem_tools.packages.Packages._get')
+    def test_install_packages_batch(
+            self, mock_get, mock_call, mock_check_call, mock_lock, mock_unlock,
+            mock_rpmdb
+    ):
+        scripts = []
+
+        def read_script(*args, **kwargs):
+            with open(args[0][3]) as f:
+                scripts.append(f.read())
+
+            return 0
+
+        self.pkgs.batch = True
+        mock_get.return_value = (
+            [('nagios-plugins-http',)],
+            [
+                (
+                    ('nagios-plugins-fedcloud', '0.4.0'),
+                    ('nagios-plugins-fedcloud', '0.5.0'),
+                ),
+                (('nagios-plugins-argo', '0.1.12'),)
+            ],
+            [
+                (
+                    ('nagios-plugins-igtf', '1.5.0'),
+                    ('nagios-plugins-igtf', '1.4.0')
+                )
+            ],
+            [],
+            []
+        )
+        mock_call.side_effect = read_script
+        mock_lock.side_effect = mock_func
+        mock_rpmdb.return_value = [
+            dict(name='nagios-plugins-http', version='2.3.3', release='1.el7'),
+            dict(name='nagios-plugins-fedcloud', version='0.5.0',
+                 release='20191003144427.7acfd49.el7'),
+            dict(name='nagios-plugins-argo', version='0.1.12',
+                 release='20200716071827.5b8b5d6.el7'),
+            dict(name='nagios-plugins-igtf', version='1.5.0', release='3.el7')
+        ]
+        info, warn = self.pkgs.install()
+        self.assertFalse(mock_check_call.called)
+        self.assertEqual(mock_call.call_count, 2)
+        self.assertEqual(mock_call.call_args[0][0][0:3], ['yum', '-y', 'shell'])
+        self.assertEqual(
+            scripts,
+            [
+                'install nagios-plugins-http\n'
+                'install nagios-plugins-fedcloud-0.5.0\n'
+                'install nagios-plugins-argo-0.1.12\n'
+                'downgrade nagios-plugins-igtf-1.4.0\n'
+                'run\n',
+                'downgrade nagios-plugins-igtf-1.4.0\n'
+                'run\n'
+            ]
+        )
+        self.assertEqual(mock_lock.call_count, 1)
+        self.assertEqual(mock_unlock.call_count, 1)
+        self.assertEqual(
+            info,
+            [
+                'Packages installed: nagios-plugins-http',
+                'Packages upgraded: '
+                'nagios-plugins-fedcloud-0.4.0 -> '
+                'nagios-plugins-fedcloud-0.5.0; nagios-plugins-argo-0.1.12'
+            ]
+        )
+        self.assertEqual(
+            warn, ['Packages not downgraded: nagios-plugins-igtf-1.5.0']
+        )
+
+    @mock.patch('argo_poem_tools.packages.Packages._get_installed_packages')
+    @mock.patch('argo_poem_tools.packages.subprocess.call')
+    def test_apply_batch_present_package_upgrade(self, mock_call, mock_rpmdb):
+        self.pkgs.available_packages = {
+            'nagios-plugins-http': [('2.3.2', '1.el7'), ('2.3.3', '1.el7')]
+        }
+        transactions = self.pkgs._plan(
+            [], [(('nagios-plugins-http',),)], []
+        )
+        mock_call.return_value = 0
+        mock_rpmdb.return_value = [
+            dict(name='nagios-plugins-http', version='2.3.2', release='1.el7')
+        ]
+        self.assertEqual(
+            self.pkgs._apply_batch(transactions), {'nagios-plugins-http'}
+        )
+        mock_rpmdb.return_value = [
+            dict(name='nagios-plugins-http', version='2.3.3', release='1.el7')
+        ]
+        self.assertEqual(self.pkgs._apply_batch(transactions), set())
+
+    @mock.patch('argo_poem_tools.packages.Packages._get_installed_packages')
+    @mock.patch('argo_poem_tools.packages.subprocess.call')
+    def test_apply_batch_bisect_if_transaction_fails(
+            self, mock_call, mock_rpmdb
+    ):
+        scripts = []
+        rpmdb = {
+            'nagios-plugins-fedcloud': ('0.4.0', '20191003144427.7acfd49.el7'),
+            'nagios-plugins-igtf': ('1.5.0', '3.el7')
+        }
+        new_versions = {
+            'nagios-plugins-http': ('2.3.3', '1.el7'),
+            'nagios-plugins-globus': ('0.1.5', '20200713050450.eb1e7d8.el7'),
+            'nagios-plugins-fedcloud': ('0.5.0', '20191003144427.7acfd49.el7')
+        }
+
+        def run_script(*args, **kwargs):
+            with open(args[0][3]) as f:
+                script = f.read()
+
+            scripts.append(script)
+            # failed transaction leaves RPM database as it was
+            if 'nagios-plugins-igtf-1.4.0' in script:
+                return 1
+
+            for name, version in new_versions.items():
+                if name in script:
+                    rpmdb.update({name: version})
+
+            return 0
+
+        transactions = self.pkgs._plan(
+            [('nagios-plugins-http',), ('nagios-plugins-globus', '0.1.5')],
+            [
+                (
+                    ('nagios-plugins-fedcloud', '0.4.0'),
+                    ('nagios-plugins-fedcloud', '0.5.0')
+                )
+            ],
+            [
+                (
+                    ('nagios-plugins-igtf', '1.5.0'),
+                    ('nagios-plugins-igtf', '1.4.0')
+                )
+            ]
+        )
+        mock_call.side_effect = run_script
+        mock_rpmdb.side_effect = lambda names=None: [
+            dict(name=name, version=version, release=release)
+            for name, (version, release) in rpmdb.items()
+        ]
+        self.assertEqual(
+            self.pkgs._apply_batch(transactions),
+            {'nagios-plugins-igtf-1.4.0'}
+        )
+        self.assertEqual(mock_call.call_count, 5)
+        self.assertEqual(
+            scripts,
+            [
+                'install nagios-plugins-http\n'
+                'install nagios-plugins-globus-0.1.5\n'
+                'install nagios-plugins-fedcloud-0.5.0\n'
+                'downgrade nagios-plugins-igtf-1.4.0\n'
+                'run\n',
+                'install nagios-plugins-http\n'
+                'install nagios-plugins-globus-0.1.5\n'
+                'run\n',
+                'install nagios-plugins-fedcloud-0.5.0\n'
+                'downgrade nagios-plugins-igtf-1.4.0\n'
+                'run\n',
+                'install nagios-plugins-fedcloud-0.5.0\n'
+                'run\n',
+                'downgrade nagios-plugins-igtf-1.4.0\n'
+                'run\n'
+            ]
+        )
+
+    @mock.patch('argo_poem_tools.packages.Packages._get_installed_packages')
+    @mock.patch('argo_poem_tools.packages.subprocess.call')
+    def test_apply_batch_bisect_if_nothing_applied_with_exit_code_0(
+            self, mock_call, mock_rpmdb
+    ):
+        transactions = self.pkgs._plan(
+            [
+                ('nagios-plugins-http',), ('nagios-plugins-globus', '0.1.5'),
+                ('nagios-plugins-argo', '0.1.12')
+            ], [], []
+        )
+        # dnf shell exits with 0 even if the transaction fails
+        mock_call.return_value = 0
+        mock_rpmdb.return_value = []
+        self.assertEqual(
+            self.pkgs._apply_batch(transactions),
+            {
+                'nagios-plugins-http', 'nagios-plugins-globus-0.1.5',
+                'nagios-plugins-argo-0.1.12'
+            }
+        )
+        self.assertEqual(mock_call.call_count, 5)
+
+    @mock.patch('argo_poem_tools.packages.subprocess.call')
+    def test_apply_batch_nothing_to_do(self, mock_call):
+        self.assertEqual(self.pkgs._apply_batch([]), set())
+        self.assertFalse(mock_call.called)
+
     @mock.patch('argo_poem_tools.packages.Packages._failsafe_lock_versions')
     @mock.patch('argo_poem_tools.packages.subprocess.check_call')
     @mock.patch('argo_poem_tools.packages.Packages._get')
@@ -787,7 +1333,7 @@ class PackageTests(unittest.TestCase):
         )
         mock_lock.side_effect = mock_func
         info, warn = self.pkgs.no_op()
-        self.assertEqual(mock_lock.call_count, 1)
+        self.assertFalse(mock_lock.called)
         self.assertEqual(
             info,
             [
@@ -827,7 +1373,7 @@ class PackageTests(unittest.TestCase):
             []
         )
         info, warn = self.pkgs.no_op()
-        self.assertEqual(mock_lock.call_count, 1)
+        self.assertFalse(mock_lock.called)
         self.assertEqual(
             info,
             [
@@ -860,7 +1406,7 @@ class PackageTests(unittest.TestCase):
         )
         mock_lock.side_effect = mock_func
         info, warn = self.pkgs.no_op()
-        self.assertEqual(mock_lock.call_count, 1)
+        self.assertFalse(mock_lock.called)
         self.assertEqual(
             info,
             [
@@ -897,7 +1443,7 @@ class PackageTests(unittest.TestCase):
         )
         mock_lock.side_effect = mock_func
         info, warn = self.pkgs.no_op()
-        self.assertEqual(mock_lock.call_count, 1)
+        self.assertFalse(mock_lock.called)
         self.assertEqual(
             info,
             [
@@ -936,10 +1482,16 @@ class PackageTests(unittest.TestCase):
         self.assertFalse(mock_check_call.called)
         self.assertEqual(mock_lock.call_count, 1)
 
+    @mock.patch('argo_poem_tools.packages.subprocess.run')
     @mock.patch('argo_poem_tools.packages.subprocess.call')
     @mock.patch('argo_poem_tools.packages.subprocess.check_output')
-    def test_lock_unlocked_versions(self, mock_subprocess, mock_call):
-        mock_subprocess.side_effect = [mock_yum_versionlock_list, mock_rpm_qa]
+    def test_lock_unlocked_versions(self, mock_subprocess, mock_call, mock_rpm):
+        mock_subprocess.side_effect = [
+            mock_yum_versionlock_list, mock_yum_versionlock_list_after_lock
+        ]
+        mock_rpm.return_value = subprocess.CompletedProcess(
+            args=[], returncode=1, stdout=mock_rpm_q, stderr=b''
+        )
         mock_call.side_effect = mock_func
         warn = self.pkgs._lock_versions()
         self.assertFalse(warn)
@@ -951,34 +1503,42 @@ class PackageTests(unittest.TestCase):
             )
         ], any_order=True)
 
+    @mock.patch('argo_poem_tools.packages.subprocess.run')
     @mock.patch('argo_poem_tools.packages.subprocess.call')
     @mock.patch('argo_poem_tools.packages.subprocess.check_output')
     def test_lock_unlocked_versions_if_package_not_installed(
-            self, mock_subprocess, mock_call
+            self, mock_subprocess, mock_call, mock_rpm
     ):
-        mock_rpm_qa1 = \
+        mock_rpm_q1 = \
             """
-            nagios-plugins-2.3.3-2.el7.x86_64
-            nagios-plugins-file_age-2.3.3-2.el7.x86_64
-            nagios-plugins-argo-0.1.13-20200901060701.5869b94.el7.noarch
-            nagios-plugins-fedcloud-0.5.2-20200511071632.05e2501.el7.noarch
-            nagios-plugins-dummy-2.3.3-2.el7.x86_64
-            nagios-common-4.4.5-7.el7.x86_64
-            nagios-plugins-perl-2.3.3-2.el7.x86_64
-            nagios-plugins-http-2.3.3-2.el7.x86_64
-    
+            nagios-plugins-fedcloud\t0\t0.5.2\t20200511071632.05e2501.el7\tnoarch
+            package nagios-plugins-igtf is not installed
+            package nagios-plugins-globus is not installed
+            nagios-plugins-argo\t0\t0.1.13\t20200901060701.5869b94.el7\tnoarch
+            nagios-plugins-http\t0\t2.3.3\t2.el7\tx86_64
             """.encode('utf-8')
-        mock_subprocess.side_effect = [mock_yum_versionlock_list, mock_rpm_qa1]
+        mock_subprocess.side_effect = [mock_yum_versionlock_list]
+        mock_rpm.return_value = subprocess.CompletedProcess(
+            args=[], returncode=2, stdout=mock_rpm_q1, stderr=b''
+        )
         mock_call.side_effect = mock_func
         warn = self.pkgs._lock_versions()
         self.assertFalse(warn)
         self.assertEqual(mock_call.call_count, 0)
 
+    @mock.patch('argo_poem_tools.packages.subprocess.run')
     @mock.patch('argo_poem_tools.packages.subprocess.call')
     @mock.patch('argo_poem_tools.packages.subprocess.check_output')
-    def test_lock_unlocked_versions_exception(self, mock_subprocess, mock_call):
-        mock_subprocess.side_effect = [mock_yum_versionlock_list, mock_rpm_qa]
-        mock_call.side_effect = mock_func_exception
+    def test_lock_unlocked_versions_exception(
+            self, mock_subprocess, mock_call, mock_rpm
+    ):
+        mock_subprocess.side_effect = [
+            mock_yum_versionlock_list, mock_yum_versionlock_list
+        ]
+        mock_rpm.return_value = subprocess.CompletedProcess(
+            args=[], returncode=1, stdout=mock_rpm_q, stderr=b''
+        )
+        mock_call.return_value = 1
         warn = self.pkgs._lock_versions()
         self.assertEqual(mock_call.call_count, 1)
         mock_call.assert_has_calls([
@@ -988,3 +1548,124 @@ class PackageTests(unittest.TestCase):
             )
         ], any_order=True)
         self.assertEqual(warn, 'Packages not locked: nagios-plugins-igtf')
+
+
+class FakeBackend:
+    def __init__(self, installed, available):
+        self.installed_packages = installed
+        self.available_packages = available
+        self.closed = False
+
+    def installed(self, names=None):
+        return [
+            pkg for pkg in self.installed_packages
+            if names is None or pkg['name'] in names
+        ]
+
+    def available(self, names, repo_ids=None):
+        return [
+            pkg for pkg in self.available_packages if pkg['name'] in names
+        ]
+
+    def close(self):
+        self.closed = True
+
+
+class PackageFakeBackendTests(unittest.TestCase):
+    def setUp(self):
+        self.backend = FakeBackend(
+            installed=[
+                dict(name='nagios-plugins-fedcloud', version='0.4.0',
+                     release='1.el7'),
+                dict(name='nagios-plugins-igtf', version='1.5.0',
+                     release='1.el7'),
+                dict(name='nagios-plugins-http', version='2.3.3',
+                     release='1.el7'),
+                dict(name='nagios-common', version='4.4.5', release='7.el7')
+            ],
+            available=[
+                dict(name='nagios-plugins-fedcloud', version='0.4.0',
+                     release='1.el7'),
+                dict(name='nagios-plugins-fedcloud', version='0.5.0',
+                     release='1.el7'),
+                dict(name='nagios-plugins-igtf', version='1.5.0',
+                     release='1.el7'),
+                dict(name='nagios-plugins-igtf', version='1.4.0',
+                     release='1.el7'),
+                dict(name='nagios-plugins-argo', version='0.1.12',
+                     release='1.el7'),
+                dict(name='nagios-plugins-http', version='2.3.3',
+                     release='1.el7'),
+                dict(name='nagios-plugins-http', version='2.3.10',
+                     release='1.el7')
+            ]
+        )
+        self.pkgs = Packages(data, backend=self.backend)
+        self.pkgs.installed.rpmdb_path = os.path.join(
+            os.getcwd(), 'nonexisting-rpmdb'
+        )
+
+    def test_no_op(self):
+        info, warn = self.pkgs.no_op()
+        self.assertEqual(
+            info,
+            [
+                'Packages to be installed: nagios-plugins-argo-0.1.12',
+                'Packages to be upgraded: '
+                'nagios-plugins-fedcloud-0.4.0 -> '
+                'nagios-plugins-fedcloud-0.5.0; nagios-plugins-http',
+                'Packages to be downgraded: '
+                'nagios-plugins-igtf-1.5.0 -> nagios-plugins-igtf-1.4.0'
+            ]
+        )
+        self.assertEqual(
+            warn, ['Packages not found: nagios-plugins-globus-0.1.5']
+        )
+
+    def test_installed_packages_only_requested(self):
+        self.assertEqual(
+            self.pkgs.installed.names(),
+            {
+                'nagios-plugins-fedcloud', 'nagios-plugins-igtf',
+                'nagios-plugins-http'
+            }
+        )
+
+    def test_close(self):
+        self.pkgs.close()
+        self.assertTrue(self.backend.closed)
+
+    def test_epoch(self):
+        epoch_data = {
+            "argo-devel": {
+                "content": data["argo-devel"]["content"],
+                "packages": [
+                    {"name": "foo", "version": "present"},
+                    {"name": "bar", "version": "2.0"}
+                ]
+            }
+        }
+        backend = FakeBackend(
+            installed=[
+                dict(name='foo', version='1:1.0', release='1'),
+                dict(name='bar', version='1:2.0', release='1')
+            ],
+            available=[
+                dict(name='foo', version='1:1.0', release='1'),
+                dict(name='foo', version='1.1', release='1'),
+                dict(name='bar', version='1:2.0', release='1')
+            ]
+        )
+        pkgs = Packages(epoch_data, batch=True, backend=backend)
+        pkgs.installed.rpmdb_path = os.path.join(
+            os.getcwd(), 'nonexisting-rpmdb'
+        )
+        self.assertEqual(pkgs.no_op(), ([], []))
+        self.assertTrue(pkgs._is_applied(
+            dict(kind='upgrade', name='bar', version='2.0'),
+            pkgs.installed.index()
+        ))
+        self.assertFalse(pkgs._is_applied(
+            dict(kind='upgrade', name='bar', version='2:2.0'),
+            pkgs.installed.index()
+        ))
@@ -1,8 +1,12 @@
+import copy
 import unittest
 from unittest import mock
 
+import requests
+
 from argo_poem_tools.exceptions import POEMException, MergingException
-from argo_poem_tools.poem import POEM, merge_tenants_data
+from argo_poem_tools.poem import POEM, fetch_tenants_data, \
+    merge_tenants_data
 
 mock_data = {
     "data": {
@@ -56,45 +60,11 @@ mock_data = {
     ]
 }
 
-OS_RELEASE_EL7 = \
-    b'NAME="CentOS Linux"\n' \
-    b'VERSION="7 (Core)"\n' \
-    b'ID="centos"\n' \
-    b'ID_LIKE="rhel fedora"\n' \
-    b'VERSION_ID="7"\n' \
-    b'PRETTY_NAME="CentOS Linux 7 (Core)"\n' \
-    b'ANSI_COLOR="0;31"\n' \
-    b'CPE_NAME="cpe:/o:centos:centos:7"\n' \
-    b'HOME_URL="https://www.centos.org/"\n' \
-    b'BUG_REPORT_URL="https://bugs.centos.org/"\n\n' \
-    b'CENTOS_MANTISBT_PROJECT="CentOS-7"\n' \
-    b'CENTOS_MANTISBT_PROJECT_VERSION="7"\n' \
-    b'REDHAT_SUPPORT_PRODUCT="centos"\n' \
-    b'REDHAT_SUPPORT_PRODUCT_VERSION="7"\n\n'
-
-OS_RELEASE_EL9 = \
-    b'NAME="Rocky Linux"\n' \
-    b'VERSION="9.1 (Blue Onyx)"\n' \
-    b'ID="rocky"\n' \
-    b'ID_LIKE="rhel centos fedora"\n' \
-    b'VERSION_ID="9.1"\n' \
-    b'PLATFORM_ID="platform:el9"\n' \
-    b'PRETTY_NAME="Rocky Linux 9.1 (Blue Onyx)"\n' \
-    b'ANSI_COLOR="0;32"\n' \
-    b'LOGO="fedora-logo-icon"\n' \
-    b'CPE_NAME="cpe:/o:rocky:rocky:9::baseos"\n' \
-    b'HOME_URL="https://rockylinux.org/"\n' \
-    b'BUG_REPORT_URL="https://bugs.rockylinux.org/"\n' \
-    b'ROCKY_SUPPORT_PRODUCT="Rocky-Linux-9"\n' \
-    b'ROCKY_SUPPORT_PRODUCT_VERSION="9.1"\n' \
-    b'REDHAT_SUPPORT_PRODUCT="Rocky Linux"\n' \
-    b'REDHAT_SUPPORT_PRODUCT_VERSION="9.1"\n'
-
-
 class MockResponse:
-    def __init__(self, dat, status_code):
+    def __init__(self, dat, status_code, headers=None):
         self.data = dat
         self.status_code = status_code
+        self.headers = headers if headers else dict()
         if status_code == 404:
             self.reason = 'Not Found'
 
@@ -107,6 +77,9 @@ class MockResponse:
         elif status_code == 500:
             self.reason = 'Server Error'
 
+        elif status_code == 304:
+            self.reason = 'Not Modified'
+
     def json(self):
         return self.data
 
@@ -390,6 +363,52 @@ class MergeDataTests(unittest.TestCase):
             "the same version across all tenants"
         )
 
+    def test_merge_data_reports_all_conflicts(self):
+        data = copy.deepcopy(self.data_different_versions)
+        data["tenant2"]["argo"]["packages"].append(
+            {"name": "argo-probe-cert", "version": "2.0.2"}
+        )
+        data["tenant3"] = {
+            "argo": {
+                "content": self.argo_content,
+                "packages": [
+                    {"name": "argo-probe-argo-tools", "version": "0.2.2"}
+                ]
+            }
+        }
+        with self.assertRaises(MergingException) as context:
+            merge_tenants_data(data=data)
+        self.assertEqual(
+            context.exception.__str__(),
+            "Error merging POEM data: Package 'argo-probe-argo-tools' must be "
+            "the same version across all tenants; Package 'argo-probe-cert' "
+            "must be the same version across all tenants"
+        )
+
+    def test_merge_data_does_not_modify_input(self):
+        data = copy.deepcopy(self.data_ok)
+        merge_tenants_data(data=data)
+        self.assertEqual(data, self.data_ok)
+
+    def test_merge_data_single_tenant_sorted(self):
+        merged_data = merge_tenants_data(
+            data={"tenant1": self.data_ok["tenant1"]}
+        )
+        self.assertEqual(
+            [p["name"] for p in merged_data["argo"]["packages"]],
+            [
+                "argo-probe-ams", "argo-probe-argo-tools", "argo-probe-cert",
+                "argo-probe-poem"
+            ]
+        )
+        self.assertEqual(
+            merged_data["missing_packages"],
+            [
+                "argo-probe-grnet-agora (0.4)",
+                "nagios-plugins-egi-notebooks (0.2.3)"
+            ]
+        )
+
 
 class POEMTests(unittest.TestCase):
     def setUp(self):
@@ -419,11 +438,11 @@ class POEMTests(unittest.TestCase):
             profiles=['TEST_PROFILE1', 'TEST_PROFILE2']
         )
 
-    @mock.patch('argo_poem_tools.poem.subprocess.check_output')
+    @mock.patch('argo_poem_tools.poem.get_os')
     @mock.patch('argo_poem_tools.poem.requests.get')
-    def test_get_data_el7(self, mock_request, mock_sp):
+    def test_get_data_el7(self, mock_request, mock_os):
         mock_request.side_effect = mock_request_ok
-        mock_sp.return_value = OS_RELEASE_EL7
+        mock_os.return_value = 'centos7'
         data = self.poem1.get_data()
         mock_request.assert_called_once_with(
             'https://mock.url.com/api/v2/repos/centos7',
@@ -440,11 +459,11 @@ class POEMTests(unittest.TestCase):
             ]
         )
 
-    @mock.patch('argo_poem_tools.poem.subprocess.check_output')
+    @mock.patch('argo_poem_tools.poem.get_os')
     @mock.patch('argo_poem_tools.poem.requests.get')
-    def test_get_data_el9(self, mock_request, mock_sp):
+    def test_get_data_el9(self, mock_request, mock_os):
         mock_request.side_effect = mock_request_ok
-        mock_sp.return_value = OS_RELEASE_EL9
+        mock_os.return_value = 'rocky9'
         data = self.poem1.get_data()
         mock_request.assert_called_once_with(
             'https://mock.url.com/api/v2/repos/rocky9',
@@ -461,11 +480,31 @@ class POEMTests(unittest.TestCase):
             ]
         )
 
-    @mock.patch('argo_poem_tools.poem.subprocess.check_output')
+    @mock.patch('argo_poem_tools.poem.get_os')
+    @mock.patch('argo_poem_tools.poem.requests.get')
+    def test_get_data_with_os_override(self, mock_request, mock_os):
+        mock_request.side_effect = mock_request_ok
+        poem = POEM(
+            hostname='mock.url.com',
+            token='some-token-1234',
+            profiles=['TEST_PROFILE1'],
+            os_name='almalinux8'
+        )
+        data = poem.get_data()
+        self.assertFalse(mock_os.called)
+        mock_request.assert_called_once_with(
+            'https://mock.url.com/api/v2/repos/almalinux8',
+            headers={'x-api-key': 'some-token-1234',
+                     'profiles': '[TEST_PROFILE1]'},
+            timeout=180
+        )
+        self.assertEqual(data, mock_data['data'])
+
+    @mock.patch('argo_poem_tools.poem.get_os')
     @mock.patch('argo_poem_tools.poem.requests.get')
-    def test_get_data_if_hostname_http(self, mock_request, mock_sp):
+    def test_get_data_if_hostname_http(self, mock_request, mock_os):
         mock_request.side_effect = mock_request_ok
-        mock_sp.return_value = OS_RELEASE_EL9
+        mock_os.return_value = 'rocky9'
         data = self.poem2.get_data()
         mock_request.assert_called_once_with(
             'https://mock.url.com/api/v2/repos/rocky9',
@@ -482,11 +521,11 @@ class POEMTests(unittest.TestCase):
             ]
         )
 
-    @mock.patch('argo_poem_tools.poem.subprocess.check_output')
+    @mock.patch('argo_poem_tools.poem.get_os')
     @mock.patch('argo_poem_tools.poem.requests.get')
-    def test_get_data_if_hostname_https(self, mock_request, mock_sp):
+    def test_get_data_if_hostname_https(self, mock_request, mock_os):
         mock_request.side_effect = mock_request_ok
-        mock_sp.return_value = OS_RELEASE_EL9
+        mock_os.return_value = 'rocky9'
         data = self.poem3.get_data()
         mock_request.assert_called_once_with(
             'https://mock.url.com/api/v2/repos/rocky9',
@@ -503,11 +542,185 @@ class POEMTests(unittest.TestCase):
             ]
         )
 
-    @mock.patch('argo_poem_tools.poem.subprocess.check_output')
+    @mock.patch('argo_poem_tools.poem.get_os')
+    @mock.patch('argo_poem_tools.poem.requests.get')
+    def test_get_data_with_sessions(self, mock_request, mock_os):
+        mock_os.return_value = 'rocky9'
+        mock_sessions = mock.Mock()
+        mock_sessions.get.return_value.get.side_effect = mock_request_ok
+        poem = POEM(
+            hostname='https://mock.url.com/',
+            token='some-token-1234',
+            profiles=['TEST_PROFILE1'],
+            sessions=mock_sessions
+        )
+        data = poem.get_data()
+        self.assertFalse(mock_request.called)
+        mock_sessions.get.assert_called_once_with('mock.url.com')
+        mock_sessions.get.return_value.get.assert_called_once_with(
+            'https://mock.url.com/api/v2/repos/rocky9',
+            headers={'x-api-key': 'some-token-1234',
+                     'profiles': '[TEST_PROFILE1]'},
+            timeout=180
+        )
+        self.assertEqual(data, mock_data['data'])
+
+    @mock.patch('argo_poem_tools.poem.get_os')
+    @mock.patch('argo_poem_tools.poem.requests.get')
+    def test_get_data_cache_miss(self, mock_request, mock_os):
+        mock_request.return_value = MockResponse(
+            mock_data, 200, headers={
+                'ETag': '"abc"',
+                'Last-Modified': 'Mon, 13 Nov 2023 10:00:00 GMT'
+            }
+        )
+        mock_os.return_value = 'rocky9'
+        mock_cache = mock.Mock()
+        mock_cache.key.return_value = 'mock-key'
+        mock_cache.get.return_value = None
+        mock_cache.usable_if_stale.return_value = False
+        self.poem1.cache = mock_cache
+        data = self.poem1.get_data()
+        mock_cache.key.assert_called_once_with(
+            'mock.url.com', 'rocky9', ['TEST_PROFILE1', 'TEST_PROFILE2']
+        )
+        mock_request.assert_called_once_with(
+            'https://mock.url.com/api/v2/repos/rocky9',
+            headers={'x-api-key': 'some-token-1234',
+                     'profiles': '[TEST_PROFILE1, TEST_PROFILE2]'},
+            timeout=180
+        )
+        mock_cache.store.assert_called_once_with(
+            'mock-key', mock_data, etag='"abc"',
+            last_modified='Mon, 13 Nov 2023 10:00:00 GMT'
+        )
+        self.assertEqual(mock_cache.miss.call_count, 1)
+        self.assertFalse(mock_cache.hit.called)
+        self.assertEqual(data, mock_data['data'])
+
+    @mock.patch('argo_poem_tools.poem.get_os')
     @mock.patch('argo_poem_tools.poem.requests.get')
-    def test_get_data_if_server_error(self, mock_request, mock_sp):
+    def test_get_data_cache_hit(self, mock_request, mock_os):
+        mock_request.return_value = MockResponse(None, 304)
+        mock_os.return_value = 'rocky9'
+        mock_cache = mock.Mock()
+        mock_cache.key.return_value = 'mock-key'
+        mock_cache.get.return_value = {
+            'etag': '"abc"',
+            'last_modified': 'Mon, 13 Nov 2023 10:00:00 GMT',
+            'timestamp': 1700000000.0,
+            'body': mock_data
+        }
+        mock_cache.usable_if_stale.return_value = False
+        self.poem1.cache = mock_cache
+        data = self.poem1.get_data()
+        mock_request.assert_called_once_with(
+            'https://mock.url.com/api/v2/repos/rocky9',
+            headers={'x-api-key': 'some-token-1234',
+                     'profiles': '[TEST_PROFILE1, TEST_PROFILE2]',
+                     'If-None-Match': '"abc"',
+                     'If-Modified-Since': 'Mon, 13 Nov 2023 10:00:00 GMT'},
+            timeout=180
+        )
+        mock_cache.store.assert_called_once_with(
+            'mock-key', mock_data, etag='"abc"',
+            last_modified='Mon, 13 Nov 2023 10:00:00 GMT'
+        )
+        self.assertEqual(mock_cache.hit.call_count, 1)
+        self.assertFalse(mock_cache.miss.called)
+        self.assertEqual(data, mock_data['data'])
+        self.assertEqual(
+            self.poem1.missing_packages,
+            [
+                'nagios-plugins-bdii (1.0.14)',
+                'nagios-plugins-egi-notebooks (0.2.3)'
+            ]
+        )
+
+    def _mock_stale_cache(self, usable):
+        mock_cache = mock.Mock()
+        mock_cache.key.return_value = 'mock-key'
+        mock_cache.latency_budget = 5
+        mock_cache.get.return_value = {
+            'etag': None,
+            'last_modified': None,
+            'timestamp': 1700000000.0,
+            'body': mock_data
+        }
+        mock_cache.usable_if_stale.return_value = usable
+        return mock_cache
+
+    @mock.patch('argo_poem_tools.poem.get_os')
+    @mock.patch('argo_poem_tools.poem.requests.get')
+    def test_get_data_stale_if_connection_error(self, mock_request, mock_os):
+        mock_request.side_effect = requests.exceptions.ConnectTimeout(
+            'Connection timed out'
+        )
+        mock_os.return_value = 'rocky9'
+        self.poem1.cache = self._mock_stale_cache(usable=True)
+        data = self.poem1.get_data()
+        mock_request.assert_called_once_with(
+            'https://mock.url.com/api/v2/repos/rocky9',
+            headers={'x-api-key': 'some-token-1234',
+                     'profiles': '[TEST_PROFILE1, TEST_PROFILE2]'},
+            timeout=5
+        )
+        self.assertEqual(data, mock_data['data'])
+        self.assertEqual(self.poem1.stale, 'Connection timed out')
+        self.assertEqual(self.poem1.cache.stale_hit.call_count, 1)
+        self.assertFalse(self.poem1.cache.store.called)
+
+    @mock.patch('argo_poem_tools.poem.get_os')
+    @mock.patch('argo_poem_tools.poem.requests.get')
+    def test_get_data_stale_if_server_error(self, mock_request, mock_os):
         mock_request.side_effect = mock_request_server_error
-        mock_sp.return_value = OS_RELEASE_EL9
+        mock_os.return_value = 'rocky9'
+        self.poem1.cache = self._mock_stale_cache(usable=True)
+        data = self.poem1.get_data()
+        self.assertEqual(data, mock_data['data'])
+        self.assertEqual(self.poem1.stale, '500 Server Error')
+        self.assertEqual(self.poem1.cache.stale_hit.call_count, 1)
+
+    @mock.patch('argo_poem_tools.poem.get_os')
+    @mock.patch('argo_poem_tools.poem.requests.get')
+    def test_get_data_not_stale_if_client_error(self, mock_request, mock_os):
+        mock_request.side_effect = mock_request_wrong_token
+        mock_os.return_value = 'rocky9'
+        self.poem1.cache = self._mock_stale_cache(usable=True)
+        with self.assertRaises(POEMException) as err:
+            self.poem1.get_data()
+        self.assertEqual(
+            err.exception.__str__(),
+            "Error fetching YUM repos: 403 Forbidden: "
+            "Authentication credentials were not provided."
+        )
+        self.assertIsNone(self.poem1.stale)
+        self.assertFalse(self.poem1.cache.stale_hit.called)
+
+    @mock.patch('argo_poem_tools.poem.get_os')
+    @mock.patch('argo_poem_tools.poem.requests.get')
+    def test_get_data_if_cache_too_stale(self, mock_request, mock_os):
+        mock_request.side_effect = requests.exceptions.ConnectionError(
+            'Connection refused'
+        )
+        mock_os.return_value = 'rocky9'
+        self.poem1.cache = self._mock_stale_cache(usable=False)
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            self.poem1.get_data()
+        mock_request.assert_called_once_with(
+            'https://mock.url.com/api/v2/repos/rocky9',
+            headers={'x-api-key': 'some-token-1234',
+                     'profiles': '[TEST_PROFILE1, TEST_PROFILE2]'},
+            timeout=180
+        )
+        self.assertIsNone(self.poem1.stale)
+        self.assertFalse(self.poem1.cache.stale_hit.called)
+
+    @mock.patch('argo_poem_tools.poem.get_os')
+    @mock.patch('argo_poem_tools.poem.requests.get')
+    def test_get_data_if_server_error(self, mock_request, mock_os):
+        mock_request.side_effect = mock_request_server_error
+        mock_os.return_value = 'rocky9'
         with self.assertRaises(POEMException) as err:
             self.poem1.get_data()
         self.assertEqual(
@@ -515,11 +728,11 @@ class POEMTests(unittest.TestCase):
             "Error fetching YUM repos: 500 Server Error"
         )
 
-    @mock.patch('argo_poem_tools.poem.subprocess.check_output')
+    @mock.patch('argo_poem_tools.poem.get_os')
     @mock.patch('argo_poem_tools.poem.requests.get')
-    def test_get_data_if_wrong_url(self, mock_request, mock_sp):
+    def test_get_data_if_wrong_url(self, mock_request, mock_os):
         mock_request.side_effect = mock_request_wrong_url
-        mock_sp.return_value = OS_RELEASE_EL9
+        mock_os.return_value = 'rocky9'
         with self.assertRaises(POEMException) as err:
             self.poem1.get_data()
         self.assertEqual(
@@ -527,11 +740,11 @@ class POEMTests(unittest.TestCase):
             "Error fetching YUM repos: 404 Not Found"
         )
 
-    @mock.patch('argo_poem_tools.poem.subprocess.check_output')
+    @mock.patch('argo_poem_tools.poem.get_os')
     @mock.patch('argo_poem_tools.poem.requests.get')
-    def test_get_data_if_wrong_token(self, mock_request, mock_sp):
+    def test_get_data_if_wrong_token(self, mock_request, mock_os):
         mock_request.side_effect = mock_request_wrong_token
-        mock_sp.return_value = OS_RELEASE_EL9
+        mock_os.return_value = 'rocky9'
         with self.assertRaises(POEMException) as err:
             self.poem1.get_data()
         self.assertEqual(
@@ -540,11 +753,11 @@ class POEMTests(unittest.TestCase):
             "Authentication credentials were not provided."
         )
 
-    @mock.patch('argo_poem_tools.poem.subprocess.check_output')
+    @mock.patch('argo_poem_tools.poem.get_os')
     @mock.patch('argo_poem_tools.poem.requests.get')
-    def test_get_data_if_no_profiles(self, mock_request, mock_sp):
+    def test_get_data_if_no_profiles(self, mock_request, mock_os):
         mock_request.side_effect = mock_request_wrong_profiles
-        mock_sp.return_value = OS_RELEASE_EL9
+        mock_os.return_value = 'rocky9'
         with self.assertRaises(POEMException) as err:
             self.poem1.get_data()
         self.assertEqual(
@@ -553,16 +766,62 @@ class POEMTests(unittest.TestCase):
             "You must define profile!"
         )
 
-    @mock.patch('argo_poem_tools.poem.subprocess.check_output')
+    @mock.patch('argo_poem_tools.poem.get_os')
     @mock.patch('argo_poem_tools.poem.requests.get')
     def test_get_data_if_json_without_details(
-            self, mock_request, mock_sp
+            self, mock_request, mock_os
     ):
         mock_request.side_effect = mock_request_json_without_details_key
-        mock_sp.return_value = OS_RELEASE_EL9
+        mock_os.return_value = 'rocky9'
         with self.assertRaises(POEMException) as err:
             self.poem1.get_data()
         self.assertEqual(
             err.exception.__str__(),
             "Error fetching YUM repos: 400 Bad Request"
         )
+
+
+class FetchTenantsDataTests(unittest.TestCase):
+    def setUp(self):
+        self.poems = dict()
+        for tenant in ["tenant1", "tenant2", "tenant3"]:
+            self.poems.update({
+                tenant: POEM(
+                    hostname=f"{tenant}.mock.url.com",
+                    token="some-token-1234",
+                    profiles=["TEST_PROFILE1"]
+                )
+            })
+
+    @mock.patch('argo_poem_tools.poem.POEM.get_data')
+    def test_fetch_tenants_data(self, mock_get_data):
+        mock_get_data.return_value = mock_data["data"]
+        data = fetch_tenants_data(self.poems, concurrency=2)
+        self.assertEqual(mock_get_data.call_count, 3)
+        self.assertEqual(list(data.keys()), ["tenant1", "tenant2", "tenant3"])
+        for tenant in ["tenant1", "tenant2", "tenant3"]:
+            self.assertEqual(data[tenant], mock_data["data"])
+
+    def test_fetch_tenants_data_reports_all_errors(self):
+        def get_data(poem):
+            if poem.hostname == "tenant1.mock.url.com":
+                raise POEMException("500 Server Error")
+
+            if poem.hostname == "tenant3.mock.url.com":
+                raise requests.exceptions.ConnectionError("Connection refused")
+
+            return mock_data["data"]
+
+        with mock.patch(
+                'argo_poem_tools.poem.POEM.get_data', autospec=True
+        ) as mock_get_data:
+            mock_get_data.side_effect = get_data
+            with self.assertRaises(POEMException) as err:
+                fetch_tenants_data(self.poems, concurrency=3)
+
+        self.assertEqual(mock_get_data.call_count, 3)
+        self.assertEqual(
+            err.exception.__str__(),
+            "Error fetching YUM repos: tenant1: 500 Server Error; "
+            "tenant3: Connection refused"
+        )
@@ -1,8 +1,12 @@
+import errno
+import json
 import os
+import shutil
+import tempfile
 import unittest
 from unittest import mock
 
-from argo_poem_tools.repos import YUMRepos
+from argo_poem_tools.repos import YUMRepos, get_repo_ids, restore_backup
 
 from test_poem import mock_data
 
@@ -13,13 +17,17 @@ class YUMReposTests(unittest.TestCase):
             data=mock_data["data"],
             repos_path=os.getcwd()
         )
+        self.backup_dir = os.path.join(tempfile.mkdtemp(), 'backup')
         self.repos2 = YUMRepos(
             data=mock_data["data"],
             repos_path=os.getcwd(),
-            override=False
+            override=False,
+            backup_dir=self.backup_dir
         )
 
     def tearDown(self):
+        shutil.rmtree(os.path.dirname(self.backup_dir))
+
         if os.path.exists('argo-devel.repo'):
             os.remove('argo-devel.repo')
 
@@ -30,11 +38,20 @@ class YUMReposTests(unittest.TestCase):
         files = self.repos1.create_file()
         self.assertEqual(
             files,
-            [os.path.join(os.getcwd(), 'argo-devel.repo'),
-             os.path.join(os.getcwd(), 'nordugrid-updates.repo')]
+            {
+                'created': [
+                    os.path.join(os.getcwd(), 'argo-devel.repo'),
+                    os.path.join(os.getcwd(), 'nordugrid-updates.repo')
+                ],
+                'changed': [],
+                'unchanged': []
+            }
         )
         self.assertTrue(os.path.exists('argo-devel.repo'))
         self.assertTrue(os.path.exists('nordugrid-updates.repo'))
+        self.assertEqual(
+            oct(os.stat('argo-devel.repo').st_mode & 0o777), oct(0o644)
+        )
 
         with open('argo-devel.repo', 'r') as f:
             content1 = f.read()
@@ -64,8 +81,13 @@ class YUMReposTests(unittest.TestCase):
         self.assertFalse(mock_cp.called)
         self.assertEqual(
             files,
-            [os.path.join(os.getcwd(), 'argo-devel.repo'),
-             os.path.join(os.getcwd(), 'nordugrid-updates.repo')]
+            {
+                'created': [
+                    os.path.join(os.getcwd(), 'nordugrid-updates.repo')
+                ],
+                'changed': [os.path.join(os.getcwd(), 'argo-devel.repo')],
+                'unchanged': []
+            }
         )
         self.assertTrue(os.path.exists('argo-devel.repo'))
         self.assertTrue(os.path.exists('nordugrid-updates.repo'))
@@ -83,33 +105,31 @@ class YUMReposTests(unittest.TestCase):
             content2, mock_data['data']['nordugrid-updates']['content']
         )
 
-    @mock.patch('argo_poem_tools.repos.shutil.copyfile')
-    @mock.patch('argo_poem_tools.repos.os.path.isfile')
-    @mock.patch('argo_poem_tools.repos.os.makedirs')
-    def test_do_not_override_file_which_already_exists(
-            self, mock_mkdir, mock_isfile, mock_copy
-    ):
-        mock_isfile.return_value = True
+    def test_do_not_override_file_which_already_exists(self):
         with open('argo-devel.repo', 'w') as f:
             f.write('test')
 
+        inode = os.stat('argo-devel.repo').st_ino
         files = self.repos2.create_file()
-        self.assertEqual(mock_mkdir.call_count, 2)
-        mock_mkdir.assert_called_with('/tmp' + os.getcwd(), exist_ok=True)
         file1 = os.path.join(os.getcwd(), 'argo-devel.repo')
         file2 = os.path.join(os.getcwd(), 'nordugrid-updates.repo')
-        self.assertEqual(mock_isfile.call_count, 2)
-        mock_isfile.assert_has_calls(
-            [mock.call(file1), mock.call(file2)], any_order=True
-        )
-        self.assertEqual(mock_copy.call_count, 2)
-        mock_copy.assert_has_calls([
-            mock.call(file1, '/tmp' + file1),
-            mock.call(file2, '/tmp' + file2)
-        ], any_order=True)
-        self.assertEqual(files, [file1, file2])
-        self.assertTrue(os.path.exists('argo-devel.repo'))
-        self.assertTrue(os.path.exists('nordugrid-updates.repo'))
+        self.assertEqual(
+            files, {'created': [file2], 'changed': [file1], 'unchanged': []}
+        )
+        self.assertEqual(
+            oct(os.stat(self.backup_dir).st_mode & 0o777), oct(0o700)
+        )
+
+        with open(os.path.join(self.backup_dir, 'journal.json')) as f:
+            journal = json.load(f)['files']
+
+        self.assertEqual(list(journal.keys()), [file1])
+        backup = os.path.join(self.backup_dir, journal[file1])
+
+        # backup is the original file, hardlinked rather than copied
+        self.assertEqual(os.stat(backup).st_ino, inode)
+        with open(backup, 'r') as f:
+            self.assertEqual(f.read(), 'test')
 
         with open('argo-devel.repo', 'r') as f:
             content1 = f.read()
@@ -125,40 +145,71 @@ class YUMReposTests(unittest.TestCase):
         )
 
     @mock.patch('argo_poem_tools.repos.subprocess.call')
-    @mock.patch('argo_poem_tools.repos.shutil.rmtree')
-    @mock.patch('argo_poem_tools.repos.shutil.copy')
-    @mock.patch('argo_poem_tools.repos.os.path.isfile')
-    @mock.patch('argo_poem_tools.repos.os.listdir')
-    @mock.patch('argo_poem_tools.repos.os.path.isdir')
-    def test_clean(
-            self, mock_isdir, mock_ls, mock_isfile, mock_cp, mock_rm, mock_call
-    ):
-        mock_isdir.return_value = True
-        mock_ls.return_value = [
-            'argo-devel.repo', 'nordugrid-updates.repo'
-        ]
-        mock_isfile.return_value = True
-        file1 = os.path.join(os.getcwd(), 'argo-devel.repo')
-        file2 = os.path.join(os.getcwd(), 'nordugrid-updates.repo')
+    def test_clean(self, mock_call):
+        with open('argo-devel.repo', 'w') as f:
+            f.write('[argo-prod]\nname=test\n')
+
+        self.repos2.create_file()
         self.repos2.clean()
-        self.assertEqual(mock_isdir.call_count, 1)
-        mock_isdir.assert_called_with('/tmp' + os.getcwd())
-        self.assertEqual(mock_ls.call_count, 1)
-        mock_ls.assert_called_with('/tmp' + os.getcwd())
-        self.assertEqual(mock_isfile.call_count, 2)
-        mock_isfile.assert_has_calls([
-            mock.call('/tmp' + file1),
-            mock.call('/tmp' + file2)
-        ], any_order=True)
-        self.assertEqual(mock_cp.call_count, 2)
-        mock_cp.assert_has_calls([
-            mock.call('/tmp' + file1, os.getcwd()),
-            mock.call('/tmp' + file2, os.getcwd())
-        ], any_order=True)
-        self.assertEqual(mock_rm.call_count, 1)
-        mock_rm.assert_called_with('/tmp' + os.getcwd())
+
+        with open('argo-devel.repo', 'r') as f:
+            self.assertEqual(f.read(), '[argo-prod]\nname=test\n')
+
+        self.assertEqual(os.listdir(self.backup_dir), [])
         self.assertEqual(mock_call.call_count, 1)
-        mock_call.assert_called_with(['yum', 'clean', 'all'])
+        mock_call.assert_called_with([
+            'yum', 'clean', 'expire-cache', '--disablerepo=*',
+            '--enablerepo=argo-devel,argo-prod'
+        ])
+
+    def test_restore_backup_after_crash(self):
+        with open('argo-devel.repo', 'w') as f:
+            f.write('test')
+
+        self.repos2.create_file()
+
+        # restore interrupted right after the file is renamed back
+        with mock.patch(
+                'argo_poem_tools.repos._fsync_dir',
+                side_effect=OSError('Interrupted')
+        ):
+            with self.assertRaises(OSError):
+                restore_backup(self.backup_dir)
+
+        self.assertEqual(
+            restore_backup(self.backup_dir), []
+        )
+        with open('argo-devel.repo', 'r') as f:
+            self.assertEqual(f.read(), 'test')
+
+        self.assertEqual(os.listdir(self.backup_dir), [])
+        self.assertEqual(restore_backup(self.backup_dir), [])
+
+    def test_restore_backup_across_filesystems(self):
+        with open('argo-devel.repo', 'w') as f:
+            f.write('test')
+
+        self.repos2.create_file()
+        replace = os.replace
+
+        def cross_device(src, dst):
+            if src.startswith(self.backup_dir):
+                raise OSError(errno.EXDEV, 'Invalid cross-device link')
+
+            replace(src, dst)
+
+        with mock.patch(
+                'argo_poem_tools.repos.os.replace', side_effect=cross_device
+        ):
+            self.assertEqual(
+                restore_backup(self.backup_dir),
+                [os.path.join(os.getcwd(), 'argo-devel.repo')]
+            )
+
+        with open('argo-devel.repo', 'r') as f:
+            self.assertEqual(f.read(), 'test')
+
+        self.assertEqual(os.listdir(self.backup_dir), [])
 
     @mock.patch('argo_poem_tools.repos.subprocess.call')
     @mock.patch('argo_poem_tools.repos.shutil.copy')
@@ -167,5 +218,204 @@ class YUMReposTests(unittest.TestCase):
         self.repos1.clean()
         self.assertEqual(mock_rmdir.call_count, 0)
         self.assertEqual(mock_copy.call_count, 0)
-        self.assertEqual(mock_call.call_count, 1)
-        mock_call.assert_called_with(['yum', 'clean', 'all'])
+        self.assertEqual(mock_call.call_count, 0)
+
+    @mock.patch('argo_poem_tools.repos.subprocess.call')
+    def test_clean_all(self, mock_call):
+        self.repos1.clean(clean_all=True)
+        mock_call.assert_called_once_with(['yum', 'clean', 'all'])
+
+    def test_create_file_skips_unchanged_files(self):
+        with open('argo-devel.repo', 'w') as f:
+            f.write(mock_data['data']['argo-devel']['content'])
+
+        os.utime('argo-devel.repo', (1000000000, 1000000000))
+        files = self.repos1.create_file()
+        self.assertEqual(
+            files,
+            {
+                'created': [
+                    os.path.join(os.getcwd(), 'nordugrid-updates.repo')
+                ],
+                'changed': [],
+                'unchanged': [os.path.join(os.getcwd(), 'argo-devel.repo')]
+            }
+        )
+        self.assertEqual(os.path.getmtime('argo-devel.repo'), 1000000000)
+        self.assertEqual(
+            [f for f in os.listdir(os.getcwd()) if f.endswith('.tmp')], []
+        )
+
+    def test_create_file_keeps_mode(self):
+        with open('argo-devel.repo', 'w') as f:
+            f.write('test')
+
+        os.chmod('argo-devel.repo', 0o600)
+        self.repos1.create_file()
+        self.assertEqual(
+            oct(os.stat('argo-devel.repo').st_mode & 0o777), oct(0o600)
+        )
+
+    @mock.patch('argo_poem_tools.repos.os.replace')
+    def test_create_file_does_not_truncate_on_error(self, mock_replace):
+        mock_replace.side_effect = OSError('No space left on device')
+        with open('argo-devel.repo', 'w') as f:
+            f.write('test')
+
+        with self.assertRaises(OSError):
+            self.repos1.create_file()
+
+        with open('argo-devel.repo') as f:
+            self.assertEqual(f.read(), 'test')
+
+        self.assertEqual(
+            [f for f in os.listdir(os.getcwd()) if f.endswith('.tmp')], []
+        )
+
+    def test_create_file_tracks_changed_repos(self):
+        with open('argo-devel.repo', 'w') as f:
+            f.write(mock_data['data']['argo-devel']['content'])
+
+        self.repos1.create_file()
+        self.assertEqual(self.repos1.changed_repo_ids, ['nordugrid-updates'])
+
+    @mock.patch('argo_poem_tools.repos.subprocess.call')
+    def test_expire_cache(self, mock_call):
+        self.repos1.expire_cache(['nordugrid-updates', 'argo-devel'])
+        mock_call.assert_called_once_with([
+            'yum', 'clean', 'expire-cache', '--disablerepo=*',
+            '--enablerepo=argo-devel,nordugrid-updates'
+        ])
+
+    @mock.patch('argo_poem_tools.repos.subprocess.call')
+    def test_expire_cache_if_nothing_changed(self, mock_call):
+        self.repos1.expire_cache([])
+        self.assertFalse(mock_call.called)
+
+
+class YUMReposManifestTests(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.repos_path = os.path.join(self.tmpdir, 'yum.repos.d')
+        os.makedirs(self.repos_path)
+        self.manifest = os.path.join(self.tmpdir, 'state', 'repos.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _repos(self, data):
+        return YUMRepos(
+            data=data, repos_path=self.repos_path, manifest=self.manifest
+        )
+
+    def _path(self, name):
+        return os.path.join(self.repos_path, name)
+
+    def test_prune_files_no_longer_in_data(self):
+        repos = self._repos(mock_data['data'])
+        repos.create_file()
+        self.assertEqual(repos.prune(), [])
+
+        repos = self._repos(
+            {'argo-devel': mock_data['data']['argo-devel']}
+        )
+        repos.create_file()
+        self.assertEqual(
+            repos.prune(), [self._path('nordugrid-updates.repo')]
+        )
+        self.assertTrue(os.path.exists(self._path('argo-devel.repo')))
+        self.assertFalse(
+            os.path.exists(self._path('nordugrid-updates.repo'))
+        )
+
+        with open(self.manifest) as f:
+            self.assertEqual(
+                list(json.load(f)['files'].keys()),
+                [self._path('argo-devel.repo')]
+            )
+
+    def test_prune_dry_run(self):
+        repos = self._repos(mock_data['data'])
+        repos.create_file()
+        repos.prune()
+
+        for i in range(2):
+            repos = self._repos(
+                {'argo-devel': mock_data['data']['argo-devel']}
+            )
+            repos.create_file()
+            self.assertEqual(
+                repos.prune(dry_run=True),
+                [self._path('nordugrid-updates.repo')]
+            )
+            self.assertTrue(
+                os.path.exists(self._path('nordugrid-updates.repo'))
+            )
+
+    def test_prune_dry_run_keeps_manifest(self):
+        repos = self._repos(mock_data['data'])
+        repos.create_file()
+        repos.prune()
+        with open(self.manifest) as f:
+            manifest = f.read()
+
+        with open(self._path('nordugrid-updates.repo'), 'a') as f:
+            f.write('# local change\n')
+
+        repos = self._repos({'argo-devel': mock_data['data']['argo-devel']})
+        repos.create_file()
+        self.assertEqual(repos.prune(dry_run=True), [])
+        with open(self.manifest) as f:
+            self.assertEqual(f.read(), manifest)
+
+        # local change is reverted, so the file is still managed
+        with open(self._path('nordugrid-updates.repo'), 'w') as f:
+            f.write(mock_data['data']['nordugrid-updates']['content'])
+
+        self.assertEqual(
+            repos.prune(), [self._path('nordugrid-updates.repo')]
+        )
+
+    def test_do_not_prune_modified_or_foreign_files(self):
+        repos = self._repos(mock_data['data'])
+        repos.create_file()
+        repos.prune()
+
+        with open(self._path('nordugrid-updates.repo'), 'a') as f:
+            f.write('# local change\n')
+
+        with open(self._path('local.repo'), 'w') as f:
+            f.write('[local]\n')
+
+        repos = self._repos({})
+        repos.create_file()
+        self.assertEqual(repos.prune(), [self._path('argo-devel.repo')])
+        self.assertTrue(
+            os.path.exists(self._path('nordugrid-updates.repo'))
+        )
+        self.assertTrue(os.path.exists(self._path('local.repo')))
+
+        # modified file is forgotten, and not pruned even if changed back
+        with open(self._path('nordugrid-updates.repo'), 'w') as f:
+            f.write(mock_data['data']['nordugrid-updates']['content'])
+
+        self.assertEqual(self._repos({}).prune(), [])
+
+    def test_no_manifest(self):
+        repos = YUMRepos(data=mock_data['data'], repos_path=self.repos_path)
+        repos.create_file()
+        self.assertEqual(repos.prune(), [])
+        self.assertFalse(os.path.exists(self.manifest))
+
+
+class RepoIdsTests(unittest.TestCase):
+    def test_get_repo_ids(self):
+        self.assertEqual(
+            get_repo_ids(mock_data['data']['argo-devel']['content']),
+            ['argo-devel']
+        )
+
+    def test_get_repo_ids_multiple_sections(self):
+        content = '[main]\ngpgcheck=0\n\n[repo1]\nname=Repo 1\n\n' \
+                  '# [commented]\n [repo2] \nname=Repo 2\n'
+        self.assertEqual(get_repo_ids(content), ['repo1', 'repo2'])
@@ -0,0 +1,302 @@
+import gzip
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from argo_poem_tools.backends import MetadataBackend
+from argo_poem_tools.exceptions import MetadataException
+from argo_poem_tools.repodata import find_repomd, parse_expire, \
+    read_available, read_repo_options
+
+repomd_xml = \
+    '<?xml version="1.0" encoding="UTF-8"?>\n' \
+    '<repomd xmlns="http://linux.duke.edu/metadata/repo" ' \
+    'xmlns:rpm="http://linux.duke.edu/metadata/rpm">\n' \
+    '  <revision>1605517210</revision>\n' \
+    '  <data type="primary">\n' \
+    '    <location href="repodata/abc-primary.xml.gz"/>\n' \
+    '  </data>\n' \
+    '  <data type="primary_db">\n' \
+    '    <location href="repodata/def-primary.sqlite.bz2"/>\n' \
+    '  </data>\n' \
+    '</repomd>\n'
+
+primary_xml = \
+    '<?xml version="1.0" encoding="UTF-8"?>\n' \
+    '<metadata xmlns="http://linux.duke.edu/metadata/common" ' \
+    'xmlns:rpm="http://linux.duke.edu/metadata/rpm" packages="4">\n' \
+    '<package type="rpm"><name>nagios-plugins-argo</name>' \
+    '<arch>noarch</arch><version epoch="0" ver="0.1.12" ' \
+    'rel="20200716071827.5e1a5c8.el7"/></package>\n' \
+    '<package type="rpm"><name>nagios-plugins-argo</name>' \
+    '<arch>src</arch><version epoch="0" ver="0.1.12" ' \
+    'rel="20200716071827.5e1a5c8.el7"/></package>\n' \
+    '<package type="rpm"><name>nagios-plugins-http</name>' \
+    '<arch>x86_64</arch><version epoch="1" ver="2.3.3" rel="2.el7"/>' \
+    '</package>\n' \
+    '<package type="rpm"><name>nagios</name>' \
+    '<arch>x86_64</arch><version epoch="0" ver="4.4.5" rel="7.el7"/>' \
+    '</package>\n' \
+    '</metadata>\n'
+
+requested = {'nagios-plugins-argo', 'nagios-plugins-http'}
+
+expected = [
+    dict(name='nagios-plugins-argo', version='0.1.12',
+         release='20200716071827.5e1a5c8.el7'),
+    dict(name='nagios-plugins-http', version='1:2.3.3', release='2.el7')
+]
+
+
+class RepoCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.cache_dirs = [
+            os.path.join(self.tmpdir, 'dnf', '{repo_id}-*', 'repodata',
+                         'repomd.xml'),
+            os.path.join(self.tmpdir, 'yum', '*', '*', '{repo_id}',
+                         'repomd.xml')
+        ]
+        self.repodata = self._cache('argo-devel')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _cache(self, repo_id, suffix='0123456789abcdef'):
+        repodata = os.path.join(
+            self.tmpdir, 'dnf', f'{repo_id}-{suffix}', 'repodata'
+        )
+        os.makedirs(repodata)
+        with open(os.path.join(repodata, 'repomd.xml'), 'w') as f:
+            f.write(repomd_xml)
+
+        with gzip.open(os.path.join(repodata, 'abc-primary.xml.gz'), 'wt') \
+                as f:
+            f.write(primary_xml)
+
+        return repodata
+
+
+class RepoDataTests(RepoCacheTestCase):
+    def test_find_repomd(self):
+        self._cache('argo-devel-testing')
+        self.assertEqual(
+            find_repomd('argo-devel', self.cache_dirs),
+            os.path.join(self.repodata, 'repomd.xml')
+        )
+        self.assertIsNone(find_repomd('epel', self.cache_dirs))
+
+    def test_read_available_from_xml(self):
+        self.assertEqual(
+            read_available(
+                os.path.join(self.repodata, 'repomd.xml'), requested
+            ),
+            expected
+        )
+
+    def test_read_available_from_sqlite(self):
+        # yum on EL7: <cachedir>/<basearch>/<releasever>/<repoid>/, with
+        # decompressed database in gen/ and no primary XML downloaded
+        repodir = os.path.join(self.tmpdir, 'yum', 'x86_64', '7', 'epel')
+        os.makedirs(os.path.join(repodir, 'gen'))
+        with open(os.path.join(repodir, 'repomd.xml'), 'w') as f:
+            f.write(repomd_xml)
+
+        with open(os.path.join(repodir, 'def-primary.sqlite.bz2'), 'wb'):
+            pass
+
+        conn = sqlite3.connect(
+            os.path.join(repodir, 'gen', 'primary_db.sqlite')
+        )
+        conn.execute(
+            'CREATE TABLE packages (name TEXT, arch TEXT, epoch TEXT, '
+            'version TEXT, release TEXT)'
+        )
+        conn.executemany(
+            'INSERT INTO packages VALUES (?, ?, ?, ?, ?)', [
+                ('nagios-plugins-argo', 'noarch', '0', '0.1.12',
+                 '20200716071827.5e1a5c8.el7'),
+                ('nagios-plugins-http', 'x86_64', '1', '2.3.3', '2.el7'),
+                ('nagios', 'x86_64', '0', '4.4.5', '7.el7')
+            ]
+        )
+        conn.commit()
+        conn.close()
+        repomd = find_repomd('epel', self.cache_dirs)
+        self.assertEqual(repomd, os.path.join(repodir, 'repomd.xml'))
+        self.assertEqual(read_available(repomd, requested), expected)
+
+    def test_read_available_if_primary_missing(self):
+        os.remove(os.path.join(self.repodata, 'abc-primary.xml.gz'))
+        with self.assertRaises(MetadataException):
+            read_available(
+                os.path.join(self.repodata, 'repomd.xml'), requested
+            )
+
+
+    def test_parse_expire(self):
+        self.assertEqual(parse_expire('90'), 90)
+        self.assertEqual(parse_expire('90m'), 5400)
+        self.assertEqual(parse_expire('6h'), 21600)
+        self.assertEqual(parse_expire('2d'), 172800)
+        self.assertIsNone(parse_expire('never'))
+        self.assertIsNone(parse_expire('-1'))
+        with self.assertRaises(ValueError):
+            parse_expire('soon')
+
+    def test_read_repo_options(self):
+        self.assertEqual(
+            read_repo_options(
+                '[argo-devel]\nmetadata_expire=1h\npriority=1\n'
+                'exclude=\nincludepkgs=\n\n'
+                '[epel]\nbaseurl=http://example.com/\nexclude=nagios*\n\n'
+                '[base]\nmetadata_expire=soon\npriority=high\n'
+                'includepkgs=kernel\n',
+                default_expire=60
+            ),
+            {
+                'argo-devel': dict(expire=3600, priority=1, filtered=False),
+                'epel': dict(expire=60, priority=99, filtered=True),
+                'base': dict(expire=60, priority=99, filtered=True)
+            }
+        )
+        self.assertIsNone(read_repo_options('metadata_expire=1h\n'))
+
+
+class MetadataBackendTests(RepoCacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self.fallback = mock.Mock()
+        self.fallback.available.return_value = [
+            dict(name='nagios-plugins-http', version='2.3.3', release='2.el7')
+        ]
+        self.repos_path = os.path.join(self.tmpdir, 'yum.repos.d')
+        os.makedirs(self.repos_path)
+        self.yum_conf = os.path.join(self.tmpdir, 'yum.conf')
+        self.backend = MetadataBackend(
+            self.fallback, repos_path=self.repos_path,
+            cache_dirs=self.cache_dirs, yum_conf=self.yum_conf
+        )
+
+    def test_available_from_cache(self):
+        self.assertEqual(
+            list(self.backend.available(
+                sorted(requested), ['argo-devel', 'epel']
+            )),
+            expected + [
+                dict(name='nagios-plugins-http', version='2.3.3',
+                     release='2.el7')
+            ]
+        )
+        self.fallback.available.assert_called_once_with(
+            sorted(requested), ['epel']
+        )
+
+    def test_available_if_cache_expired(self):
+        old = time.time() - 2 * self.backend.max_age
+        os.utime(os.path.join(self.repodata, 'repomd.xml'), (old, old))
+        list(self.backend.available(sorted(requested), ['argo-devel']))
+        self.fallback.available.assert_called_once_with(
+            sorted(requested), ['argo-devel']
+        )
+
+    def test_available_if_repo_file_changed(self):
+        old = time.time() - 60
+        os.utime(os.path.join(self.repodata, 'repomd.xml'), (old, old))
+        with open(os.path.join(self.repos_path, 'argo.repo'), 'w') as f:
+            f.write('[argo-devel]\nbaseurl=http://example.com/\n')
+
+        list(self.backend.available(sorted(requested), ['argo-devel']))
+        self.fallback.available.assert_called_once_with(
+            sorted(requested), ['argo-devel']
+        )
+
+    def test_available_if_repo_expire_shorter(self):
+        old = time.time() - 120
+        os.utime(os.path.join(self.repodata, 'repomd.xml'), (old, old))
+        repo_file = os.path.join(self.repos_path, 'argo.repo')
+        with open(repo_file, 'w') as f:
+            f.write('[argo-devel]\nmetadata_expire=1m\n')
+
+        os.utime(repo_file, (old - 60, old - 60))
+        list(self.backend.available(sorted(requested), ['argo-devel']))
+        self.fallback.available.assert_called_once_with(
+            sorted(requested), ['argo-devel']
+        )
+
+    def test_available_if_repo_never_expires(self):
+        old = time.time() - 2 * self.backend.max_age
+        os.utime(os.path.join(self.repodata, 'repomd.xml'), (old, old))
+        repo_file = os.path.join(self.repos_path, 'argo.repo')
+        with open(repo_file, 'w') as f:
+            f.write('[argo-devel]\nmetadata_expire=never\n')
+
+        os.utime(repo_file, (old - 60, old - 60))
+        self.assertEqual(
+            list(self.backend.available(sorted(requested), ['argo-devel'])),
+            expected
+        )
+        self.assertFalse(self.fallback.available.called)
+
+    def test_max_age_from_yum_conf(self):
+        with open(self.yum_conf, 'w') as f:
+            f.write('[main]\ncachedir=/var/cache/yum\nmetadata_expire=90m\n')
+
+        backend = MetadataBackend(
+            self.fallback, repos_path=self.repos_path,
+            cache_dirs=self.cache_dirs, yum_conf=self.yum_conf
+        )
+        self.assertEqual(backend.max_age, 5400)
+        self.assertEqual(self.backend.max_age, 6 * 60 * 60)
+
+    def _write_repo_file(self, content):
+        repo_file = os.path.join(self.repos_path, 'argo.repo')
+        with open(repo_file, 'w') as f:
+            f.write(content)
+
+        old = time.time() - 3600
+        os.utime(repo_file, (old, old))
+
+    def test_available_from_cache_if_filters_empty(self):
+        self._write_repo_file(
+            '[argo-devel]\npriority=99\nexclude=\nincludepkgs=\n'
+        )
+        self.assertEqual(
+            list(self.backend.available(sorted(requested), ['argo-devel'])),
+            expected
+        )
+        self.assertFalse(self.fallback.available.called)
+
+    def test_available_if_repo_filtered(self):
+        self._write_repo_file('[argo-devel]\nexclude=nagios-plugins-http\n')
+        list(self.backend.available(sorted(requested), ['argo-devel']))
+        self.fallback.available.assert_called_once_with(
+            sorted(requested), ['argo-devel']
+        )
+
+    def test_available_if_priorities_differ(self):
+        self._cache('epel', suffix='fedcba9876543210')
+        self._write_repo_file(
+            '[argo-devel]\npriority=1\n\n[epel]\nbaseurl=http://a.b/\n'
+        )
+        list(self.backend.available(sorted(requested), ['argo-devel', 'epel']))
+        self.fallback.available.assert_called_once_with(
+            sorted(requested), ['argo-devel', 'epel']
+        )
+
+    def test_available_if_yum_conf_filtered(self):
+        with open(self.yum_conf, 'w') as f:
+            f.write('[main]\nexclude=kernel*\n')
+
+        backend = MetadataBackend(
+            self.fallback, repos_path=self.repos_path,
+            cache_dirs=self.cache_dirs, yum_conf=self.yum_conf
+        )
+        list(backend.available(sorted(requested), ['argo-devel']))
+        self.fallback.available.assert_called_once_with(
+            sorted(requested), ['argo-devel']
+        )
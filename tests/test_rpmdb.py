@@ -0,0 +1,97 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from argo_poem_tools.rpmdb import InstalledPackages, rpmdb_cookie
+
+
+class RPMDBTests(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.db = os.path.join(self.tmpdir, 'rpmdb.sqlite')
+        with open(self.db, 'w') as f:
+            f.write('db')
+
+        self.loader = mock.Mock()
+        self.loader.return_value = [
+            dict(name='nagios-plugins-argo', version='0.1.13',
+                 release='20200901060701.5869b94.el7'),
+            dict(name='kernel', version='3.10.0', release='1160.el7'),
+            dict(name='kernel', version='3.10.0', release='1062.el7')
+        ]
+        self.installed = InstalledPackages(self.loader, rpmdb_path=self.tmpdir)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_rpmdb_cookie(self):
+        cookie1 = rpmdb_cookie(self.tmpdir)
+        self.assertEqual(cookie1, rpmdb_cookie(self.tmpdir))
+        with open(self.db, 'a') as f:
+            f.write('changed')
+
+        self.assertNotEqual(cookie1, rpmdb_cookie(self.tmpdir))
+
+    def test_rpmdb_cookie_ignores_other_files(self):
+        cookie1 = rpmdb_cookie(self.tmpdir)
+        for name in ['rpmdb.sqlite-shm', 'rpmdb.sqlite-wal', '.rpm.lock']:
+            with open(os.path.join(self.tmpdir, name), 'w') as f:
+                f.write('changed')
+
+        self.assertEqual(cookie1, rpmdb_cookie(self.tmpdir))
+
+    def test_rpmdb_cookie_missing_database(self):
+        os.remove(self.db)
+        self.assertIsNone(rpmdb_cookie(self.tmpdir))
+        self.assertIsNone(
+            rpmdb_cookie(os.path.join(self.tmpdir, 'nonexisting'))
+        )
+
+    def test_index(self):
+        self.assertEqual(
+            self.installed.index(),
+            {
+                'nagios-plugins-argo': [
+                    ('0.1.13', '20200901060701.5869b94.el7')
+                ],
+                'kernel': [
+                    ('3.10.0', '1160.el7'), ('3.10.0', '1062.el7')
+                ]
+            }
+        )
+        self.assertEqual(
+            self.installed.names(), {'nagios-plugins-argo', 'kernel'}
+        )
+
+    def test_loaded_once_if_rpmdb_unchanged(self):
+        self.installed.index()
+        self.installed.names()
+        self.installed.index()
+        self.assertEqual(self.loader.call_count, 1)
+
+    def test_reloaded_if_rpmdb_changed(self):
+        self.installed.index()
+        with open(self.db, 'a') as f:
+            f.write('changed')
+
+        self.loader.return_value = [
+            dict(name='kernel', version='3.10.0', release='1160.el7')
+        ]
+        self.assertEqual(self.installed.names(), {'kernel'})
+        self.assertEqual(self.loader.call_count, 2)
+
+    def test_reloaded_if_invalidated(self):
+        self.installed.index()
+        self.installed.invalidate()
+        self.installed.index()
+        self.assertEqual(self.loader.call_count, 2)
+
+    def test_reloaded_every_time_if_no_rpmdb(self):
+        installed = InstalledPackages(
+            self.loader, rpmdb_path=os.path.join(self.tmpdir, 'nonexisting')
+        )
+        installed.index()
+        installed.index()
+        self.assertEqual(self.loader.call_count, 2)
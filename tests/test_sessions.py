@@ -0,0 +1,46 @@
+import threading
+import unittest
+
+from argo_poem_tools.sessions import HTTPSessions
+
+
+class HTTPSessionsTests(unittest.TestCase):
+    def setUp(self):
+        self.sessions = HTTPSessions(pool_size=3)
+
+    def tearDown(self):
+        self.sessions.close()
+
+    def test_same_session_for_same_host(self):
+        session1 = self.sessions.get('mock1.url.com')
+        session2 = self.sessions.get('mock1.url.com')
+        session3 = self.sessions.get('mock2.url.com')
+        self.assertIs(session1, session2)
+        self.assertIsNot(session1, session3)
+
+    def test_pool_size(self):
+        session = self.sessions.get('mock1.url.com')
+        adapter = session.get_adapter('https://mock1.url.com/api/v2/repos')
+        self.assertEqual(adapter._pool_maxsize, 3)
+        self.assertEqual(adapter._pool_connections, 1)
+
+    def test_same_session_across_threads(self):
+        sessions = []
+
+        def get_session():
+            sessions.append(self.sessions.get('mock1.url.com'))
+
+        threads = [threading.Thread(target=get_session) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(set(id(s) for s in sessions)), 1)
+
+    def test_close(self):
+        session1 = self.sessions.get('mock1.url.com')
+        self.sessions.close()
+        session2 = self.sessions.get('mock1.url.com')
+        self.assertIsNot(session1, session2)
@@ -0,0 +1,130 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from argo_poem_tools.versionlock import VersionLocks, parse_entry
+
+mock_versionlock_list_yum = \
+"""
+# Added locks on Mon Nov 13 10:00:00 2023
+0:nagios-plugins-argo-0.1.12-20200811040245.d758e91.el7.*
+0:nagios-plugins-http-extra-2.3.3-2.el7.*
+!0:nagios-plugins-igtf-1.4.0-3.el7.*
+"""
+
+mock_versionlock_list_dnf = \
+"""
+# Added lock on Mon Nov 13 10:00:00 2023
+nagios-plugins-argo-0:0.1.12-20200811040245.d758e91.el9.*
+argo-probe-cert-1:2.0.1-1.el9.noarch
+"""
+
+mock_yum_versionlock_list = \
+"""
+Loaded plugins: fastestmirror, ovl, versionlock
+0:nagios-plugins-argo-0.1.12-20200811040245.d758e91.el7.*
+0:nagios-plugins-fedcloud-0.5.2-20201217023205.1b502c8.el7.*
+versionlock list done
+""".encode('utf-8')
+
+
+class ParseEntryTests(unittest.TestCase):
+    def test_parse_yum_entry(self):
+        self.assertEqual(
+            parse_entry(
+                '0:nagios-plugins-argo-0.1.12-20200811040245.d758e91.el7.*'
+            ),
+            (
+                'nagios-plugins-argo', '0', '0.1.12',
+                '20200811040245.d758e91.el7', '*'
+            )
+        )
+
+    def test_parse_dnf_entry(self):
+        self.assertEqual(
+            parse_entry('argo-probe-cert-1:2.0.1-1.el9.noarch'),
+            ('argo-probe-cert', '1', '2.0.1', '1.el9', 'noarch')
+        )
+
+    def test_parse_entry_without_epoch(self):
+        self.assertEqual(
+            parse_entry('nagios-plugins-http-2.3.3-2.el7.x86_64'),
+            ('nagios-plugins-http', '0', '2.3.3', '2.el7', 'x86_64')
+        )
+
+    def test_parse_not_entries(self):
+        self.assertIsNone(parse_entry(''))
+        self.assertIsNone(parse_entry('# Added lock'))
+        self.assertIsNone(parse_entry('!0:nagios-plugins-igtf-1.4.0-3.el7.*'))
+        self.assertIsNone(
+            parse_entry('Loaded plugins: fastestmirror, ovl, versionlock')
+        )
+        self.assertIsNone(parse_entry('versionlock list done'))
+
+
+class VersionLocksTests(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'versionlock.list')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _write(self, content):
+        with open(self.path, 'w') as f:
+            f.write(content)
+
+    @mock.patch('argo_poem_tools.versionlock.subprocess.check_output')
+    def test_read_file(self, mock_sp):
+        self._write(mock_versionlock_list_yum)
+        versionlocks = VersionLocks(paths=[self.path])
+        self.assertEqual(
+            versionlocks.names(),
+            {'nagios-plugins-argo', 'nagios-plugins-http-extra'}
+        )
+        self.assertEqual(
+            versionlocks.entries(),
+            {
+                (
+                    'nagios-plugins-argo', '0', '0.1.12',
+                    '20200811040245.d758e91.el7', '*'
+                ),
+                ('nagios-plugins-http-extra', '0', '2.3.3', '2.el7', '*')
+            }
+        )
+        self.assertFalse(mock_sp.called)
+
+    @mock.patch('argo_poem_tools.versionlock.open', create=True)
+    def test_file_cached_by_mtime(self, mock_open):
+        self._write(mock_versionlock_list_yum)
+        mock_open.side_effect = open
+        versionlocks = VersionLocks(paths=[self.path])
+        versionlocks.names()
+        versionlocks.names()
+        versionlocks.entries()
+        self.assertEqual(mock_open.call_count, 1)
+
+        self._write(mock_versionlock_list_dnf)
+        os.utime(self.path, ns=(1, 1))
+        self.assertEqual(
+            versionlocks.names(), {'nagios-plugins-argo', 'argo-probe-cert'}
+        )
+        self.assertEqual(mock_open.call_count, 2)
+
+    @mock.patch('argo_poem_tools.versionlock.subprocess.check_output')
+    def test_command_output_if_no_file(self, mock_sp):
+        mock_sp.return_value = mock_yum_versionlock_list
+        versionlocks = VersionLocks(paths=[self.path])
+        self.assertEqual(
+            versionlocks.names(),
+            {'nagios-plugins-argo', 'nagios-plugins-fedcloud'}
+        )
+        versionlocks.names()
+        self.assertEqual(mock_sp.call_count, 1)
+        mock_sp.assert_called_with(['yum', 'versionlock', 'list'])
+
+        versionlocks.invalidate()
+        versionlocks.names()
+        self.assertEqual(mock_sp.call_count, 2)